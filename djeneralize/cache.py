@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Caching of specialized model instances and of their specialization types"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from weakref import WeakSet
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache import caches
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+
+from djeneralize.utils import get_general_model
+
+__all__ = [
+    'SpecializationTypeCache', 'get_cache_key', 'get_cached_instance',
+    'register_cache_alias', 'set_cached_instance',
+    ]
+
+
+_specialization_type_caches = WeakSet()
+"""The specialization type caches to invalidate"""
+
+_cache_aliases = set()
+"""
+The aliases of the caches in which the specialized instances are stored by
+this process, besides those in the ``DJENERALIZE_CACHE_ALIASES`` setting
+"""
+
+
+class SpecializationTypeCache(object):
+    """
+    Bounded, in-process cache of the specialization types of the general model
+    instances, keyed by their general model and their primary key, so that the
+    specialization of an instance doesn't have to be looked up in the database.
+
+    The least recently used entries are evicted once ``maxsize`` entries are
+    stored.
+
+    """
+
+    def __init__(self, maxsize=10000, timeout=None):
+        """
+        :param maxsize: The maximum number of entries
+        :type maxsize: :class:`int`
+        :param timeout: The number of seconds after which the entries expire,
+            or ``None`` if they don't expire
+        :type timeout: :class:`float`
+        :raises ValueError: If ``maxsize`` is less than 1
+
+        """
+
+        if maxsize < 1:
+            raise ValueError("The maximum size must be a positive number")
+
+        super(SpecializationTypeCache, self).__init__()
+
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        _specialization_type_caches.add(self)
+
+    def get(self, model, pk):
+        """
+        Get the specialization type of the instance of ``model`` with ``pk``.
+
+        :param model: The general model or one of its specializations
+        :param pk: The primary key of the instance
+        :return: The specialization type, or ``None`` if it isn't cached
+
+        """
+
+        key = (get_general_model(model), pk)
+
+        with self._lock:
+            try:
+                specialization_type, expiry_time = self._entries.pop(key)
+            except KeyError:
+                return None
+
+            if expiry_time is not None and expiry_time <= time():
+                return None
+
+            # Mark the entry as the most recently used one:
+            self._entries[key] = (specialization_type, expiry_time)
+
+        return specialization_type
+
+    def set(self, model, pk, specialization_type):
+        """
+        Store the ``specialization_type`` of the instance of ``model`` with
+        ``pk``.
+
+        :param model: The general model or one of its specializations
+        :param pk: The primary key of the instance
+        :param specialization_type: The specialization type of the instance
+        :type specialization_type: :class:`basestring`
+
+        """
+
+        key = (get_general_model(model), pk)
+
+        if self.timeout is None:
+            expiry_time = None
+        else:
+            expiry_time = time() + self.timeout
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (specialization_type, expiry_time)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, model, pk):
+        """
+        Remove the specialization type of the instance of ``model`` with
+        ``pk``, if any.
+
+        """
+
+        with self._lock:
+            self._entries.pop((get_general_model(model), pk), None)
+
+    def clear(self):
+        """Remove all the entries."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_cache_key(model, pk):
+    """
+    Get the key of the specialized instance of ``model`` with ``pk`` in the
+    cache, which is shared by all the models in the hierarchy of ``model``.
+
+    :param model: The general model or one of its specializations
+    :param pk: The primary key of the instance
+    :rtype: :class:`str`
+
+    """
+
+    general_model_meta = get_general_model(model)._meta
+
+    return 'djeneralize:%s.%s:%s' % (
+        general_model_meta.app_label, general_model_meta.model_name, pk,
+        )
+
+
+def register_cache_alias(cache_alias):
+    """
+    Invalidate the specialized instances in the cache called ``cache_alias``
+    when they're saved or deleted, in addition to the caches in the
+    ``DJENERALIZE_CACHE_ALIASES`` setting.
+
+    This is done by :meth:`~djeneralize.query.SpecializedQuerySet.cached` for
+    the cache it uses.
+
+    :param cache_alias: The alias of the cache
+    :type cache_alias: :class:`str`
+
+    """
+
+    _cache_aliases.add(cache_alias)
+
+
+def get_cached_instance(model, pk, cache_alias):
+    """
+    Get the final specialized instance of ``model`` with ``pk`` from the cache.
+
+    :param model: The general model or one of its specializations
+    :param pk: The primary key of the instance
+    :param cache_alias: The alias of the cache to use
+    :type cache_alias: :class:`str`
+    :return: The specialized instance, or ``None`` if it isn't cached
+
+    """
+
+    return caches[cache_alias].get(get_cache_key(model, pk))
+
+
+def set_cached_instance(instance, cache_alias, timeout):
+    """
+    Store ``instance`` in the cache, unless it's not the final specialization.
+
+    :param instance: The specialized instance
+    :param cache_alias: The alias of the cache to use
+    :type cache_alias: :class:`str`
+    :param timeout: The timeout of the cache entry, as for
+        :meth:`django.core.cache.backends.base.BaseCache.set`
+
+    """
+
+    if instance.specialization_type != instance.__class__.model_specialization:
+        return
+
+    caches[cache_alias].set(
+        get_cache_key(instance.__class__, instance.pk), instance, timeout,
+        )
+
+
+#{ Signal handlers
+
+
+def invalidate_cached_instance(sender, instance, **kwargs):
+    """
+    Remove the specialized instance corresponding to ``instance`` from the
+    caches in the ``DJENERALIZE_CACHE_ALIASES`` setting (the default cache
+    unless it's set) and from those registered with
+    :func:`register_cache_alias` when any of the models in its hierarchy is
+    saved or deleted.
+
+    The caches in the setting are always invalidated, so that the instances
+    cached by other processes are invalidated even if this process doesn't use
+    the cache itself.
+
+    """
+
+    cache_aliases = set(
+        getattr(settings, 'DJENERALIZE_CACHE_ALIASES', [DEFAULT_CACHE_ALIAS])
+        )
+    cache_aliases.update(_cache_aliases)
+
+    cache_key = get_cache_key(instance.__class__, instance.pk)
+    for cache_alias in cache_aliases:
+        caches[cache_alias].delete(cache_key)
+
+
+def discard_specialization_type(sender, instance, **kwargs):
+    """
+    Remove the specialization type of ``instance`` from the specialization type
+    caches when any of the models in its hierarchy is saved (as it may have
+    been re-specialized) or deleted.
+
+    """
+
+    for specialization_type_cache in list(_specialization_type_caches):
+        specialization_type_cache.discard(instance.__class__, instance.pk)
+
+
+def connect_invalidation_handlers(sender, **kwargs):
+    """
+    Connect the handlers which invalidate the caches to the signals sent when
+    the instances of the generalized or specialized model ``sender`` are saved
+    or deleted.
+
+    """
+
+    if sender._meta.abstract:
+        return
+
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_cached_instance, sender=sender)
+        signal.connect(discard_specialization_type, sender=sender)
+
+
+#}
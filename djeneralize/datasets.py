@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Generation of large datasets of specialized model instances"""
+
+from collections import OrderedDict
+from datetime import date
+from datetime import time
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.db.models import AutoField
+from django.db.models import Max
+from django.utils.timezone import now
+
+from djeneralize.query import SpecializedQuerySet
+from djeneralize.registry import get_hierarchy
+
+__all__ = ['generate_instances', 'get_default_field_values']
+
+
+_TEXT_FIELD_TYPES = frozenset([
+    'CharField', 'EmailField', 'FilePathField', 'SlugField', 'TextField',
+    'URLField',
+    ])
+
+_INTEGER_FIELD_TYPES = frozenset([
+    'BigIntegerField', 'IntegerField', 'PositiveIntegerField',
+    'PositiveSmallIntegerField', 'SmallIntegerField',
+    ])
+
+
+def generate_instances(
+    distribution, count, batch_size=1000, get_field_values=None, using=None):
+    """
+    Generate ``count`` instances of the models in ``distribution`` and write
+    them to the tables of the general model and of the specializations,
+    ``batch_size`` rows per query.
+
+    The instances of the different models are interleaved, as they would be
+    if they had been created over time. As the primary keys of the general
+    model are allocated upfront, no other instances should be created in the
+    meantime.
+
+    :param distribution: The relative weight of each model, e.g.,
+        ``{Pencil: 1, FountainPen: 2, BallPointPen: 7}``; the models must be
+        in the same hierarchy
+    :type distribution: :class:`dict`
+    :param count: The total number of instances to generate
+    :type count: :class:`int`
+    :param batch_size: The number of instances to write at a time
+    :type batch_size: :class:`int`
+    :param get_field_values: The callable which returns the values of the
+        fields of the instance of the model it's passed with the index it's
+        passed, as keyword arguments for the model; by default,
+        :func:`get_default_field_values`
+    :param using: The alias of the database to write to
+    :type using: :class:`str`
+    :return: The number of instances generated, keyed by model
+    :rtype: :class:`~collections.OrderedDict`
+    :raises ValueError: If the models aren't in the same hierarchy or if a
+        weight isn't positive
+
+    """
+
+    if not distribution:
+        raise ValueError("At least one model must be given")
+
+    hierarchy = get_hierarchy(next(iter(distribution)))
+    for model, weight in distribution.items():
+        if model not in hierarchy:
+            raise ValueError(
+                "%s is not in the hierarchy of %s" % (
+                    model._meta.object_name,
+                    hierarchy.general_model._meta.object_name,
+                    )
+                )
+        if weight <= 0:
+            raise ValueError(
+                "The weight of %s must be positive" % model._meta.object_name
+                )
+
+    general_model = hierarchy.general_model
+    get_field_values = get_field_values or get_default_field_values
+    using = using or router.db_for_write(general_model)
+    queryset = SpecializedQuerySet(general_model, using=using)
+
+    counts = _split_count(count, distribution)
+
+    with transaction.atomic(using=using):
+        pk_field = general_model._meta.pk
+        allocates_pks = isinstance(pk_field, AutoField)
+        if allocates_pks:
+            next_pk = 1 + (
+                general_model._base_manager.using(using)
+                .aggregate(max_pk=Max('pk'))['max_pk'] or 0
+                )
+
+        instances = []
+        for index, model in enumerate(_iter_interleaved_models(counts)):
+            instance = model(**get_field_values(model, index))
+            if allocates_pks:
+                setattr(instance, pk_field.attname, next_pk)
+                next_pk += 1
+            instances.append(instance)
+
+            if len(instances) == batch_size:
+                queryset._insert_specialized_instances(instances, batch_size)
+                instances = []
+
+        queryset._insert_specialized_instances(instances, batch_size)
+
+        if allocates_pks:
+            # The sequence of the primary key must be moved past the
+            # allocated values:
+            connection = connections[using]
+            sequence_reset_statements = connection.ops.sequence_reset_sql(
+                no_style(), [general_model],
+                )
+            with connection.cursor() as cursor:
+                for statement in sequence_reset_statements:
+                    cursor.execute(statement)
+
+    return counts
+
+
+def get_default_field_values(model, index):
+    """
+    Get placeholder values for the required fields of ``model`` which don't
+    have a default value.
+
+    :param model: The model to be instantiated
+    :param index: The index of the instance being generated
+    :type index: :class:`int`
+    :return: The values of the fields, keyed by their name
+    :rtype: :class:`dict`
+    :raises ValueError: If a field requires a value which can't be made up,
+        e.g., a foreign key
+
+    """
+
+    field_values = {}
+    for field in model._meta.concrete_fields:
+        if field.primary_key or field.null or field.has_default() or \
+            field.name == 'specialization_type' or \
+            getattr(field, 'auto_now', False) or \
+            getattr(field, 'auto_now_add', False):
+            continue
+
+        if field.choices:
+            field_values[field.name] = field.choices[0][0]
+            continue
+
+        internal_type = field.get_internal_type()
+        if field.rel:
+            raise ValueError(
+                "A value for %s.%s must be provided" % (
+                    model._meta.object_name, field.name,
+                    )
+                )
+        elif internal_type in _TEXT_FIELD_TYPES:
+            value = u'%s %s' % (model._meta.object_name, index)
+            field_values[field.name] = value[:field.max_length]
+        elif internal_type in _INTEGER_FIELD_TYPES:
+            field_values[field.name] = index % 32768
+        elif internal_type == 'DecimalField':
+            field_values[field.name] = Decimal(0)
+        elif internal_type == 'FloatField':
+            field_values[field.name] = float(index)
+        elif internal_type in ('BooleanField', 'NullBooleanField'):
+            field_values[field.name] = False
+        elif internal_type == 'DateTimeField':
+            field_values[field.name] = now()
+        elif internal_type == 'DateField':
+            field_values[field.name] = date.today()
+        elif internal_type == 'TimeField':
+            field_values[field.name] = time()
+        else:
+            raise ValueError(
+                "A value for %s.%s must be provided" % (
+                    model._meta.object_name, field.name,
+                    )
+                )
+
+    return field_values
+
+
+def _split_count(count, distribution):
+    """
+    Split ``count`` between the models in ``distribution`` in proportion to
+    their weights, giving the remainder to the largest fractional parts.
+
+    """
+
+    total_weight = float(sum(distribution.values()))
+
+    counts = OrderedDict()
+    remainders = []
+    for model, weight in distribution.items():
+        share = count * weight / total_weight
+        counts[model] = int(share)
+        remainders.append((share - int(share), model))
+
+    remaining_count = count - sum(counts.values())
+    for _, model in sorted(remainders, key=lambda item: -item[0]):
+        if not remaining_count:
+            break
+        counts[model] += 1
+        remaining_count -= 1
+
+    return counts
+
+
+def _iter_interleaved_models(counts):
+    """
+    Yield each model in ``counts`` as many times as its count, spreading the
+    occurrences of each model evenly (smooth weighted round-robin).
+
+    """
+
+    total_count = sum(counts.values())
+    current_weights = OrderedDict((model, 0) for model in counts)
+    for _ in range(total_count):
+        for model, model_count in counts.items():
+            current_weights[model] += model_count
+        model = max(current_weights, key=current_weights.get)
+        current_weights[model] -= total_count
+        yield model
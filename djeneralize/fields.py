@@ -14,14 +14,100 @@
 ##############################################################################
 from django.db import models
 from django.db.models.fields.related import ReverseSingleRelatedObjectDescriptor
+from six import integer_types
 
+from djeneralize.identity import get_current_identity_map
+from djeneralize.utils import get_specialization_code
 
-__all__ = ["SpecializedForeignKey"]
+
+__all__ = ["SpecializationTypeField", "SpecializedForeignKey"]
 
 
 #{ Fields
 
 
+class SpecializationTypeField(models.TextField):
+    """
+    Field which stores the path of the specialization of the general model
+    instances.
+
+    The path is stored as text unless the general model declares
+    ``compact_specialization_type`` on its inner Meta class, in which case it's
+    stored as the integer code returned by
+    :func:`~djeneralize.utils.get_specialization_code`. Either way, the value
+    of the field is the path.
+
+    """
+
+    _PATTERN_LOOKUP_TYPES = frozenset([
+        'contains', 'icontains', 'startswith', 'istartswith', 'endswith',
+        'iendswith', 'regex', 'iregex', 'search',
+        ])
+
+    def is_compact(self):
+        """
+        Report whether the paths are stored as integer codes.
+
+        :rtype: :class:`bool`
+
+        """
+
+        model = getattr(self, 'model', None)
+        return getattr(
+            getattr(model, '_meta', None), 'compact_specialization_type', False,
+            )
+
+    def get_internal_type(self):
+        if self.is_compact():
+            return 'IntegerField'
+        return super(SpecializationTypeField, self).get_internal_type()
+
+    def get_db_converters(self, connection):
+        converters = super(SpecializationTypeField, self).get_db_converters(
+            connection,
+            )
+        if self.is_compact():
+            converters.append(self._convert_code_to_path)
+        return converters
+
+    def _convert_code_to_path(self, value, expression, connection, context):
+        if value is None:
+            return value
+
+        # The codes of specializations which no longer exist are kept as is:
+        return self.model._meta.specialization_paths_by_code.get(value, value)
+
+    def get_prep_value(self, value):
+        if not self.is_compact():
+            return super(SpecializationTypeField, self).get_prep_value(value)
+
+        if value is None or isinstance(value, integer_types):
+            return value
+        return get_specialization_code(value)
+
+    def get_prep_lookup(self, lookup_type, value):
+        if self.is_compact() and lookup_type in self._PATTERN_LOOKUP_TYPES:
+            raise TypeError(
+                "The compact specialization types of %s don't support "
+                "%s lookups" % (self.model._meta.object_name, lookup_type)
+                )
+
+        return super(SpecializationTypeField, self).get_prep_lookup(
+            lookup_type, value,
+            )
+
+    def deconstruct(self):
+        # Migrations use the built-in field matching the column, so that the
+        # existing migrations of general models are left unchanged:
+        name, path, args, kwargs = \
+            super(SpecializationTypeField, self).deconstruct()
+        if self.is_compact():
+            path = 'django.db.models.IntegerField'
+        else:
+            path = 'django.db.models.TextField'
+        return name, path, args, kwargs
+
+
 class SpecializedForeignKey(models.ForeignKey):
     """
     Foreign key field that return the most specialized model instance of the
@@ -47,15 +133,43 @@ class SpecializedReverseSingleRelatedObjectDescriptor(
     """
 
     def __get__(self, instance, instance_type=None):
+        if instance is None:
+            return self
+
+        identity_map = get_current_identity_map()
+        if identity_map is not None and \
+            self.cache_name not in instance.__dict__ and \
+            self.field.rel.get_related_field().primary_key:
+            # The related object may have been loaded already:
+            related_object = identity_map.get(
+                self.field.rel.to, getattr(instance, self.field.attname)
+                )
+            if related_object is not None:
+                setattr(instance, self.cache_name, related_object)
+                return related_object
+
         super_descriptor = \
             super(SpecializedReverseSingleRelatedObjectDescriptor, self)
 
         related_object = super_descriptor.__get__(instance, instance_type)
+        if related_object is None or related_object.specialization_type == \
+            related_object.__class__.model_specialization:
+            # The object is already the most specialized instance (e.g.,
+            # because it's been cached below)
+            return related_object
+
         try:
-            return related_object.get_as_specialization()
+            related_object = related_object.get_as_specialization()
         except KeyError:
             # In case the object is already the most specialized instance
             # KeyError is raised
             return related_object
 
+        # Replace the general instance in the cache of the related object, so
+        # that it's only specialized once. Like the general instance, it's
+        # replaced when the foreign key is reassigned.
+        setattr(instance, self.cache_name, related_object)
+
+        return related_object
+
 #}
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Identity map of the specialized model instances loaded in a given scope"""
+
+from threading import local
+
+from django.db.models.signals import post_delete
+
+from djeneralize.utils import get_general_model
+
+__all__ = ['IdentityMap', 'get_current_identity_map']
+
+
+_state = local()
+
+
+class IdentityMap(object):
+    """
+    Map of the final specialized model instances which have been loaded, keyed
+    by their general model and their primary key, so that they're only loaded
+    once.
+
+    The identity map is used by the specialization managers, by
+    :meth:`~djeneralize.models.BaseGeneralizationModel.get_as_specialization`
+    and by :class:`~djeneralize.fields.SpecializedForeignKey` when it's active,
+    i.e., inside a ``with`` block::
+
+        with IdentityMap():
+            ...
+
+    .. warning:: Changes made to the database by other means than the instances
+        in the identity map (e.g., with
+        :meth:`~django.db.models.query.QuerySet.update`) are not seen in its
+        scope.
+
+    """
+
+    def __init__(self):
+        super(IdentityMap, self).__init__()
+
+        self._instances = {}
+
+    def get(self, model, pk):
+        """
+        Get the final specialized instance of ``model`` with ``pk``.
+
+        :param model: The general model or one of its specializations
+        :param pk: The primary key of the instance
+        :return: The specialized instance, or ``None`` if it hasn't been loaded
+
+        """
+
+        return self._instances.get((get_general_model(model), pk))
+
+    def add(self, instance):
+        """
+        Add ``instance`` to the identity map, unless it's not the final
+        specialization or another instance with the same identity has already
+        been added.
+
+        :param instance: The specialized instance
+        :return: The instance in the identity map with the identity of
+            ``instance``, or ``instance`` itself if it's not a final
+            specialization
+
+        """
+
+        if instance.specialization_type != \
+            instance.__class__.model_specialization:
+            return instance
+
+        key = (get_general_model(instance.__class__), instance.pk)
+
+        return self._instances.setdefault(key, instance)
+
+    def discard(self, instance):
+        """
+        Remove the instance with the identity of ``instance`` from the identity
+        map, if any.
+
+        """
+
+        key = (get_general_model(instance.__class__), instance.pk)
+        self._instances.pop(key, None)
+
+    def __enter__(self):
+        _get_identity_maps().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _get_identity_maps().remove(self)
+
+
+def get_current_identity_map():
+    """
+    Get the identity map of the innermost active scope in the current thread.
+
+    :return: The identity map, or ``None`` if there's no active scope
+    :rtype: :class:`IdentityMap`
+
+    """
+
+    identity_maps = _get_identity_maps()
+    return identity_maps[-1] if identity_maps else None
+
+
+def _get_identity_maps():
+    try:
+        identity_maps = _state.identity_maps
+    except AttributeError:
+        identity_maps = _state.identity_maps = []
+
+    return identity_maps
+
+
+#{ Signal handlers
+
+
+def discard_deleted_instance(sender, instance, **kwargs):
+    """
+    Remove the deleted specialized model instances from the active identity
+    maps.
+
+    """
+
+    for identity_map in _get_identity_maps():
+        identity_map.discard(instance)
+
+
+def connect_deletion_handler(sender, **kwargs):
+    """
+    Connect the handler which discards the deleted instances from the identity
+    maps to the signal sent when the instances of the generalized or
+    specialized model ``sender`` are deleted.
+
+    """
+
+    if sender._meta.abstract:
+        return
+
+    post_delete.connect(discard_deleted_instance, sender=sender)
+
+
+#}
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Signals sent by the queries which specialize model instances"""
+
+from collections import OrderedDict
+from threading import Lock
+from timeit import default_timer
+
+from django.dispatch import Signal
+
+__all__ = [
+    'FetchCollector', 'FetchStats', 'specialization_types_fetched',
+    'specializations_fetched',
+    ]
+
+
+specialization_types_fetched = Signal(
+    providing_args=['row_count', 'duration', 'using'],
+    )
+"""
+Signal sent by :class:`~djeneralize.query.SpecializedQuerySet` once the query
+of its model which gets the specialization types of its instances has been
+iterated over.
+
+The sender is the model of the queryset; ``row_count`` is the number of rows
+fetched and ``duration`` the number of seconds spent fetching them.
+
+"""
+
+specializations_fetched = Signal(
+    providing_args=[
+        'specialization', 'operation', 'row_count', 'duration', 'using',
+        ],
+    )
+"""
+Signal sent once the specialized instances (or the fields which are not in the
+general model) of one specialization have been fetched.
+
+The sender is the specialized model and ``specialization`` its path.
+``operation`` is ``"in_bulk"`` when the instances of the specialization are
+fetched together (e.g., when iterating over a
+:class:`~djeneralize.query.SpecializedQuerySet` or in
+:meth:`~djeneralize.models.BaseGeneralizationModel.specialize_many`) and
+``"get"`` when a single instance is fetched (e.g., by
+:meth:`~djeneralize.query.SpecializedQuerySet.get` or
+:meth:`~djeneralize.models.BaseGeneralizationModel.get_as_specialization`).
+
+"""
+
+
+class FetchStats(object):
+    """
+    Number of queries, number of rows and total duration of the fetches of a
+    given kind.
+
+    """
+
+    def __init__(self, model=None, specialization=None, operation=None):
+        """
+        :param model: The model fetched
+        :param specialization: The path of the specialization fetched, or
+            ``None`` for the queries of the specialization types
+        :type specialization: :class:`basestring`
+        :param operation: ``"types"``, ``"in_bulk"`` or ``"get"``
+        :type operation: :class:`str`
+
+        """
+
+        super(FetchStats, self).__init__()
+
+        self.model = model
+        self.specialization = specialization
+        self.operation = operation
+        self.query_count = 0
+        self.row_count = 0
+        self.duration = 0.0
+
+    def add(self, query_count, row_count, duration):
+        self.query_count += query_count
+        self.row_count += row_count
+        self.duration += duration
+
+    def __repr__(self):
+        return '<FetchStats %s %s %s: %s queries, %s rows, %.6fs>' % (
+            getattr(self.model, '__name__', None),
+            self.specialization,
+            self.operation,
+            self.query_count,
+            self.row_count,
+            self.duration,
+            )
+
+
+class FetchCollector(object):
+    """
+    In-process collector of the fetches reported by
+    :data:`specialization_types_fetched` and :data:`specializations_fetched`,
+    aggregated by model, specialization and operation.
+
+    The fetches are collected from all the threads while the collector is
+    active, i.e., inside a ``with`` block::
+
+        with FetchCollector() as collector:
+            ...
+        print(collector.get_stats(operation='in_bulk').query_count)
+
+    """
+
+    def __init__(self):
+        super(FetchCollector, self).__init__()
+
+        self._stats = OrderedDict()
+        self._lock = Lock()
+
+    def start(self):
+        """Start collecting the fetches."""
+
+        specialization_types_fetched.connect(
+            self._record_specialization_types, weak=False,
+            dispatch_uid=self._get_dispatch_uid(),
+            )
+        specializations_fetched.connect(
+            self._record_specializations, weak=False,
+            dispatch_uid=self._get_dispatch_uid(),
+            )
+
+    def stop(self):
+        """Stop collecting the fetches."""
+
+        specialization_types_fetched.disconnect(
+            dispatch_uid=self._get_dispatch_uid(),
+            )
+        specializations_fetched.disconnect(
+            dispatch_uid=self._get_dispatch_uid(),
+            )
+
+    def clear(self):
+        """Discard the fetches collected so far."""
+
+        with self._lock:
+            self._stats.clear()
+
+    @property
+    def stats(self):
+        """
+        The statistics of each kind of fetch, in the order they were first
+        collected.
+
+        :rtype: :class:`list` of :class:`FetchStats`
+
+        """
+
+        with self._lock:
+            return list(self._stats.values())
+
+    def get_stats(self, model=None, specialization=None, operation=None):
+        """
+        Get the statistics of the fetches matching all the criteria given, if
+        any.
+
+        :param model: The model fetched
+        :param specialization: The path of the specialization fetched
+        :type specialization: :class:`basestring`
+        :param operation: ``"types"``, ``"in_bulk"`` or ``"get"``
+        :type operation: :class:`str`
+        :return: The statistics of the matching fetches added together
+        :rtype: :class:`FetchStats`
+
+        """
+
+        total_stats = FetchStats(model, specialization, operation)
+        for stats in self.stats:
+            if model is not None and stats.model is not model:
+                continue
+            if specialization is not None and \
+                stats.specialization != specialization:
+                continue
+            if operation is not None and stats.operation != operation:
+                continue
+            total_stats.add(stats.query_count, stats.row_count, stats.duration)
+
+        return total_stats
+
+    def _record_specialization_types(
+        self, sender, row_count, duration, **kwargs):
+        self._record(sender, None, 'types', row_count, duration)
+
+    def _record_specializations(
+        self, sender, specialization, operation, row_count, duration,
+        **kwargs):
+        self._record(sender, specialization, operation, row_count, duration)
+
+    def _record(self, model, specialization, operation, row_count, duration):
+        key = (model, specialization, operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = \
+                    FetchStats(model, specialization, operation)
+            stats.add(1, row_count, duration)
+
+    def _get_dispatch_uid(self):
+        return 'djeneralize.instrumentation.FetchCollector:%s' % id(self)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class FetchRecorder(object):
+    """
+    Context manager which times the fetch in its block and sends ``signal``
+    with its outcome when the block is left, if the signal has receivers.
+
+    The number of rows fetched and the arguments of the signal can be updated
+    in the block.
+
+    """
+
+    def __init__(self, signal, sender, **kwargs):
+        super(FetchRecorder, self).__init__()
+
+        self.signal = signal
+        self.sender = sender
+        self.kwargs = kwargs
+        self.row_count = 0
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = default_timer() - self._start_time
+        if self.signal.receivers:
+            self.signal.send(
+                sender=self.sender, row_count=self.row_count,
+                duration=duration, **self.kwargs
+                )
+
+
+def record_iteration(iterable, signal, sender, **kwargs):
+    """
+    Time the iteration over ``iterable`` and send ``signal`` with its outcome
+    once it's exhausted or closed.
+
+    Only the time spent getting the items is measured, not the time spent
+    processing them in between.
+
+    :return: ``iterable`` itself if ``signal`` has no receivers, or an iterator
+        over its items otherwise
+
+    """
+
+    if not signal.receivers:
+        return iterable
+
+    return _iter_recorded(iterable, signal, sender, kwargs)
+
+
+def _iter_recorded(iterable, signal, sender, kwargs):
+    row_count = 0
+    duration = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start_time = default_timer()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                duration += default_timer() - start_time
+            row_count += 1
+            yield item
+    finally:
+        signal.send(
+            sender=sender, row_count=row_count, duration=duration, **kwargs
+            )
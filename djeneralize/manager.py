@@ -14,11 +14,48 @@
 #
 ##############################################################################
 
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.db.models.manager import Manager, ManagerDescriptor
 
 from djeneralize.query import SpecializedQuerySet
+from djeneralize.query import SpecializedRelatedQuerySet
+
+__all__ = ['SpecializationManager', 'SpecializedRelatedManager']
+
+
+class SpecializedRelatedManager(Manager):
+    """
+    Manager for models with
+    :class:`~djeneralize.fields.SpecializedForeignKey` fields, which can fetch
+    the specialized related objects in bulk.
+
+    """
+
+    def get_queryset(self):
+        """
+        Instead of returning a QuerySet, use SpecializedRelatedQuerySet instead
+
+        :return: A queryset which can fetch the specialized related objects
+        :rtype: :class:`djeneralize.query.SpecializedRelatedQuerySet`
+
+        """
+
+        return SpecializedRelatedQuerySet(self.model)
+
+    def select_specialized(self, *field_names):
+        """
+        Set the _specialized_related_fields attribute on a clone of the
+        queryset to ensure the specialized objects of the fields called
+        ``field_names`` are fetched in bulk.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedRelatedQuerySet`
+
+        """
+
+        return self.get_queryset().select_specialized(*field_names)
 
-__all__ = ['SpecializationManager']
 
 class SpecializationManager(Manager):
     """
@@ -31,6 +68,18 @@ class SpecializationManager(Manager):
 
     """
 
+    def __init__(self, type_cache=None):
+        """
+        :param type_cache: The cache of the specialization types of the
+            instances to be used by the querysets, if any
+        :type type_cache: :class:`~djeneralize.cache.SpecializationTypeCache`
+
+        """
+
+        super(SpecializationManager, self).__init__()
+
+        self.type_cache = type_cache
+
     def get_queryset(self):
         """
         Instead of returning a QuerySet, use SpecializedQuerySet instead
@@ -40,7 +89,7 @@ class SpecializationManager(Manager):
 
         """
 
-        return SpecializedQuerySet(self.model)
+        return SpecializedQuerySet(self.model, type_cache=self.type_cache)
 
     def direct(self):
         """
@@ -66,6 +115,121 @@ class SpecializationManager(Manager):
 
         return self.get_queryset().final()
 
+    def joined(self):
+        """
+        Set the _join_specializations attribute on a clone of the queryset to
+        ensure the specializations are fetched in the same query as the general
+        model.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().joined()
+
+    def chunked(self, size=2000, server_side_cursor=False):
+        """
+        Set the _chunk_size attribute on a clone of the queryset to ensure the
+        specializations are fetched for ``size`` general model instances at a
+        time.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().chunked(size, server_side_cursor)
+
+    def parallel(self, max_workers=4):
+        """
+        Set the _parallel_workers attribute on a clone of the queryset to
+        ensure the specializations are fetched concurrently by a pool of up to
+        ``max_workers`` threads.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().parallel(max_workers)
+
+    def reuse_general_rows(self):
+        """
+        Set the _reuse_general_rows attribute on a clone of the queryset to
+        ensure only the fields which are not in the general model are fetched
+        for each specialization.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().reuse_general_rows()
+
+    def lazy(self):
+        """
+        Set the _lazy_specialization attribute on a clone of the queryset to
+        ensure the fields which are not in the general model are only loaded
+        when one of them is first accessed.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().lazy()
+
+    def cached(self, timeout=DEFAULT_TIMEOUT, cache_alias=DEFAULT_CACHE_ALIAS):
+        """
+        Set the _cache_alias attribute on a clone of the queryset to ensure the
+        instances looked up by primary key are cached.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().cached(timeout, cache_alias)
+
+    def of_type(self, model, include_descendants=True):
+        """
+        Filter the queryset so that it only contains the instances of ``model``
+        and, if ``include_descendants`` is set, of its specializations.
+
+        :return: The filtered queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().of_type(model, include_descendants)
+
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Insert the instances ``objs`` of the model or of its specializations
+        into the tables of the general model and of their specializations, in
+        batches.
+
+        :return: The instances inserted
+        :rtype: :class:`list`
+
+        """
+
+        return self.get_queryset().bulk_create(objs, batch_size)
+
+    def select_specialized(self, *field_names):
+        """
+        Set the _specialized_related_fields attribute on a clone of the
+        queryset to ensure the specialized objects of the fields called
+        ``field_names`` are fetched in bulk.
+
+        :return: The cloned queryset
+        :rtype: :class:`djeneralize.query.SpecializedQuerySet`
+
+        """
+
+        return self.get_queryset().select_specialized(*field_names)
+
     def contribute_to_class(self, model, name):
         """
         Specialization managers contribute to the model in a different way, so
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Middleware for djeneralize"""
+
+from djeneralize.identity import IdentityMap
+
+__all__ = ['IdentityMapMiddleware']
+
+
+class IdentityMapMiddleware(object):
+    """
+    Load each specialized model instance only once per request, by using an
+    :class:`~djeneralize.identity.IdentityMap` while the request is processed.
+
+    """
+
+    def process_request(self, request):
+        request.djeneralize_identity_map = IdentityMap().__enter__()
+
+    def process_response(self, request, response):
+        self._exit_identity_map(request)
+        return response
+
+    def process_exception(self, request, exception):
+        self._exit_identity_map(request)
+
+    @staticmethod
+    def _exit_identity_map(request):
+        # The request may not have been processed by this middleware (e.g., if
+        # a previous middleware returned a response):
+        identity_map = getattr(request, 'djeneralize_identity_map', None)
+        if identity_map is not None:
+            identity_map.__exit__(None, None, None)
+            del request.djeneralize_identity_map
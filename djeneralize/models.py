@@ -14,15 +14,24 @@
 #
 ##############################################################################
 import re
+from collections import defaultdict
 
 from django.db.models.base import ModelBase, Model
-from django.db.models.fields import FieldDoesNotExist, TextField
+from django.db.models.fields import FieldDoesNotExist
 from django.dispatch import Signal
 from six import with_metaclass
 
 from djeneralize import PATH_SEPARATOR
+from djeneralize.cache import connect_invalidation_handlers
+from djeneralize.fields import SpecializationTypeField
+from djeneralize.identity import connect_deletion_handler
+from djeneralize.identity import get_current_identity_map
+from djeneralize.instrumentation import FetchRecorder
+from djeneralize.instrumentation import specializations_fetched
 from djeneralize.manager import SpecializationManager
-from djeneralize.utils import find_next_path_down
+from djeneralize.registry import discard_hierarchies
+from djeneralize.utils import get_direct_specialization_path
+from djeneralize.utils import get_specialization_code
 
 
 __all__ = ['BaseGeneralizationMeta', 'BaseGeneralizationModel']
@@ -36,6 +45,10 @@ SPECIALIZATION_RE = re.compile(r'^\w+$')
 specialized_model_prepared = Signal()
 """Signal to be emitted when a specialized model has been prepared"""
 
+specialized_model_prepared.connect(discard_hierarchies)
+specialized_model_prepared.connect(connect_invalidation_handlers)
+specialized_model_prepared.connect(connect_deletion_handler)
+
 #}
 
 # { Metaclass:
@@ -60,6 +73,14 @@ class BaseGeneralizationMeta(ModelBase):
         else:
             delattr(meta, 'specialization')
 
+        try:
+            compact_specialization_type = \
+                getattr(meta, 'compact_specialization_type')
+        except AttributeError:
+            compact_specialization_type = None
+        else:
+            delattr(meta, 'compact_specialization_type')
+
         new_model = super_new(cls, name, bases, attrs)
 
         # Ensure that the _meta attribute has some additional attributes:
@@ -71,6 +92,13 @@ class BaseGeneralizationMeta(ModelBase):
         if not parents:
             return new_model
 
+        if compact_specialization_type is not None and \
+            (new_model._meta.abstract or BaseGeneralizationModel not in bases):
+            raise TypeError(
+                "Only general models can declare compact_specialization_type "
+                "on their inner Meta class"
+                )
+
         if new_model._meta.abstract:
             # This is an abstract base-class and no specializations should be
             # declared on the inner class:
@@ -86,7 +114,13 @@ class BaseGeneralizationMeta(ModelBase):
             # Prepare the look-up mapping of specializations which the sub-
             # classes will update:
             new_model._meta.specializations = {}
+            new_model._meta.direct_specialization_paths = {}
             new_model._meta.specialization = PATH_SEPARATOR
+            new_model._meta.compact_specialization_type = \
+                bool(compact_specialization_type)
+            new_model._meta.specialization_paths_by_code = {
+                get_specialization_code(PATH_SEPARATOR): PATH_SEPARATOR,
+                }
 
             if specialization is not None:
                 # We need to ensure this is actually None and not just evaluates
@@ -109,6 +143,9 @@ class BaseGeneralizationMeta(ModelBase):
             parent_class = new_model.__base__
 
             new_model._meta.specializations = {}
+            new_model._meta.direct_specialization_paths = {}
+            new_model._meta.compact_specialization_type = \
+                parent_class._meta.compact_specialization_type
             new_model._generalized_parent = parent_class
 
             path_specialization = '%s%s%s' % (
@@ -121,15 +158,34 @@ class BaseGeneralizationMeta(ModelBase):
             new_model._meta.specialization = path_specialization
 
             # Update the specializations mapping on the General model so that it
-            # knows to use this class for that specialization:
-            ancestor = getattr(new_model, '_generalized_parent', None)
+            # knows to use this class for that specialization, and precompute
+            # the path of the direct specialization of each ancestor which
+            # leads to this class:
+            direct_specialization_path = path_specialization
+            ancestor = general_model = parent_class
             while ancestor:
-                ancestor._meta.specializations[
-                    new_model._meta.specialization
-                    ] = new_model
+                ancestor._meta.specializations[path_specialization] = new_model
+                ancestor._meta.direct_specialization_paths[
+                    path_specialization
+                    ] = direct_specialization_path
+
+                direct_specialization_path = ancestor._meta.specialization
+                general_model = ancestor
                 ancestor = getattr(ancestor, '_generalized_parent', None)
 
-            parent_class._meta.specializations[path_specialization] = new_model
+            # Map the code of the path back to it, making sure it doesn't
+            # collide with the code of another path if the codes are stored:
+            specialization_code = get_specialization_code(path_specialization)
+            paths_by_code = general_model._meta.specialization_paths_by_code
+            colliding_path = paths_by_code.get(specialization_code)
+            if colliding_path not in (None, path_specialization) and \
+                general_model._meta.compact_specialization_type:
+                raise ValueError(
+                    "The specializations %r and %r have the same code" % (
+                        colliding_path, path_specialization,
+                        )
+                    )
+            paths_by_code[specialization_code] = path_specialization
 
         is_proxy = new_model._meta.proxy
 
@@ -179,7 +235,7 @@ class BaseGeneralizationMeta(ModelBase):
 class BaseGeneralizationModel(with_metaclass(BaseGeneralizationMeta, Model)):
     """Base model from which all Generalized and Specialized models inherit"""
 
-    specialization_type = TextField(db_index=True)
+    specialization_type = SpecializationTypeField(db_index=True)
     """Field to store the specialization"""
 
     def __init__(self, *args, **kwargs):
@@ -201,6 +257,27 @@ class BaseGeneralizationModel(with_metaclass(BaseGeneralizationMeta, Model)):
     class Meta:
         abstract = True
 
+    def __getattr__(self, name):
+        """
+        Load the fields which are not in the general model of a lazily
+        specialized instance upon first access to any of them.
+
+        .. seealso:: :meth:`djeneralize.query.SpecializedQuerySet.lazy`
+
+        """
+
+        loader = self.__dict__.get('_specialization_fields_loader')
+        if loader is None or \
+            name not in loader.get_lazy_attnames(self.__class__):
+            raise AttributeError(
+                "%r object has no attribute %r" % (
+                    self.__class__.__name__, name
+                    )
+                )
+
+        loader.load(self.__class__)
+        return getattr(self, name)
+
     def get_as_specialization(self, final_specialization=True):
         """
         Get the specialized model instance which corresponds to the general
@@ -219,10 +296,109 @@ class BaseGeneralizationModel(with_metaclass(BaseGeneralizationMeta, Model)):
         if not final_specialization:
             # We need to find the path which is only one-step down from the
             # current level of specialization.
-            path = find_next_path_down(self.__class__.model_specialization,
-                                       path, PATH_SEPARATOR)
+            path = get_direct_specialization_path(self.__class__, path)
+
+        model = self._meta.specializations[path]
+
+        identity_map = get_current_identity_map()
+        if identity_map is None:
+            return _get_specialized_instance(model, self.pk)
+
+        # The final specialization may have been loaded already:
+        specialized_instance = identity_map.get(model, self.pk)
+        if specialized_instance is None or \
+            specialized_instance.__class__ is not model:
+            specialized_instance = identity_map.add(
+                _get_specialized_instance(model, self.pk)
+                )
+
+        return specialized_instance
+
+    @classmethod
+    def specialize_many(cls, instances, final_specialization=True):
+        """
+        Get the specialized model instances which correspond to the general
+        case ``instances``, with one query per specialization.
+
+        Instances which are already specialized as requested are returned
+        unchanged.
+
+        :param instances: The general model instances
+        :type instances: iterable
+        :param final_specialization: Whether the specializations returned are
+            the most specialized specializations or whether the direct
+            specializations are used
+        :type final_specialization: :class:`bool`
+        :return: The specialized model instances, in the same order as
+            ``instances``
+        :rtype: :class:`list`
+
+        """
+
+        instances = list(instances)
+        identity_map = get_current_identity_map()
+
+        specialized_models = []
+        pks_by_model = defaultdict(list)
+        specialized_instances_by_model = defaultdict(dict)
+        for instance in instances:
+            path = instance.specialization_type
+
+            if path == instance.__class__.model_specialization:
+                model = None
+            else:
+                if not final_specialization:
+                    path = get_direct_specialization_path(
+                        instance.__class__, path,
+                        )
 
-        return self._meta.specializations[path].objects.get(pk=self.pk)
+                model = instance._meta.specializations[path]
+
+                loaded_instance = identity_map and \
+                    identity_map.get(model, instance.pk)
+                if loaded_instance and loaded_instance.__class__ is model:
+                    specialized_instances_by_model[model][instance.pk] = \
+                        loaded_instance
+                else:
+                    pks_by_model[model].append(instance.pk)
+            specialized_models.append(model)
+
+        for model, pks in pks_by_model.items():
+            model_queryset = model.objects.all()
+            with FetchRecorder(
+                specializations_fetched, model,
+                specialization=model.model_specialization,
+                operation='in_bulk', using=model_queryset.db,
+                ) as recorder:
+                model_instances = model_queryset.in_bulk(pks)
+                recorder.row_count = len(model_instances)
+
+            for pk, specialized_instance in model_instances.items():
+                if identity_map is not None:
+                    specialized_instance = \
+                        identity_map.add(specialized_instance)
+                specialized_instances_by_model[model][pk] = specialized_instance
+
+        return [
+            instance if model is None else
+            specialized_instances_by_model[model][instance.pk]
+            for instance, model in zip(instances, specialized_models)
+            ]
+
+
+def _get_specialized_instance(model, pk):
+    """Get the instance of the specialized ``model`` with ``pk``."""
+
+    model_queryset = model.objects.all()
+    with FetchRecorder(
+        specializations_fetched, model,
+        specialization=model.model_specialization, operation='get',
+        using=model_queryset.db,
+        ) as recorder:
+        specialized_instance = model_queryset.get(pk=pk)
+        recorder.row_count = 1
+
+    return specialized_instance
 
 #}
 
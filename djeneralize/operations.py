@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Migration operations for the tables of general models"""
+
+from django.apps import apps as global_apps
+from django.db.migrations.operations.base import Operation
+from django.db.migrations.operations.fields import AlterField
+from django.db.models import IntegerField
+
+from djeneralize.utils import get_specialization_code
+
+__all__ = [
+    'CreateSpecializationTypePatternIndex', 'EncodeSpecializationType',
+    ]
+
+
+class CreateSpecializationTypePatternIndex(Operation):
+    """
+    Create the index which lets PostgreSQL use the ``specialization_type``
+    column in prefix predicates (e.g., ``specialization_type__startswith``)
+    outside the C locale, by using the ``text_pattern_ops`` operator class.
+
+    Django only creates this index along with the table or the column, so
+    this operation is meant for the tables of general models which were
+    created otherwise. It does nothing if the index already exists or if the
+    database isn't PostgreSQL.
+
+    The index is left in place when the operation is reversed, as it may have
+    been created by Django.
+
+    """
+
+    reversible = True
+
+    def __init__(self, model_name):
+        """
+        :param model_name: The name of the general model
+        :type model_name: :class:`str`
+
+        """
+
+        super(CreateSpecializationTypePatternIndex, self).__init__()
+
+        self.model_name = model_name
+
+    def state_forwards(self, app_label, state):
+        # The index is not part of the state of the model.
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        connection = schema_editor.connection
+        if connection.vendor != 'postgresql':
+            return
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(connection.alias, model):
+            return
+
+        field = model._meta.get_field('specialization_type')
+
+        # Use the name Django gives to this index, so that it's recognized
+        # when the column is altered afterwards:
+        index_name = schema_editor._create_index_name(
+            model, [field.column], suffix='_like',
+            )
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table,
+                )
+        if index_name in constraints:
+            return
+
+        schema_editor.execute(
+            schema_editor._create_index_sql(
+                model, [field], suffix='_like',
+                sql=schema_editor.sql_create_text_index,
+                ),
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        pass
+
+    def describe(self):
+        return "Create the pattern index of specialization_type on %s" % \
+            self.model_name
+
+    def references_model(self, name, app_label=None):
+        return name.lower() == self.model_name.lower()
+
+
+class EncodeSpecializationType(AlterField):
+    """
+    Convert the ``specialization_type`` column of a general model from the
+    paths of the specializations to their integer codes, when the model starts
+    declaring ``compact_specialization_type`` on its inner Meta class.
+
+    This operation is meant to replace the
+    :class:`~django.db.migrations.operations.AlterField` operation generated
+    by ``makemigrations`` in that case. When it's reversed, the codes are
+    converted back to the paths of the specializations of the model.
+
+    """
+
+    def __init__(self, model_name):
+        """
+        :param model_name: The name of the general model
+        :type model_name: :class:`str`
+
+        """
+
+        super(EncodeSpecializationType, self).__init__(
+            model_name, 'specialization_type', IntegerField(db_index=True),
+            )
+
+    def deconstruct(self):
+        return (
+            self.__class__.__name__,
+            self._constructor_args[0],
+            self._constructor_args[1],
+            )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        from_model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(
+            schema_editor.connection.alias, from_model):
+            return
+
+        specialization_types = from_model._base_manager \
+            .using(schema_editor.connection.alias) \
+            .values_list('specialization_type', flat=True)
+        paths = set(specialization_types.distinct())
+        for path in paths:
+            specialization_types.filter(specialization_type=path).update(
+                specialization_type=str(get_specialization_code(path)),
+                )
+
+        if schema_editor.connection.vendor == 'postgresql':
+            self._alter_postgresql_column(
+                app_label, schema_editor, from_state, to_state,
+                )
+        else:
+            super(EncodeSpecializationType, self).database_forwards(
+                app_label, schema_editor, from_state, to_state,
+                )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        to_model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(
+            schema_editor.connection.alias, to_model):
+            return
+
+        # AlterField reverses itself by altering the field forwards from the
+        # other state, which this class overrides:
+        super(EncodeSpecializationType, self).database_forwards(
+            app_label, schema_editor, from_state, to_state,
+            )
+
+        # The historical models don't know their specializations, so the
+        # paths are taken from the current model:
+        global_model = global_apps.get_model(app_label, self.model_name)
+        paths_by_code = global_model._meta.specialization_paths_by_code
+
+        specialization_types = to_model._base_manager \
+            .using(schema_editor.connection.alias) \
+            .values_list('specialization_type', flat=True)
+        codes = set(specialization_types.distinct())
+        for code in codes:
+            path = paths_by_code.get(int(code))
+            if path is not None:
+                specialization_types.filter(specialization_type=code).update(
+                    specialization_type=path,
+                    )
+
+        if schema_editor.connection.vendor == 'postgresql':
+            CreateSpecializationTypePatternIndex(self.model_name) \
+                .database_forwards(
+                    app_label, schema_editor, from_state, to_state,
+                    )
+
+    def _alter_postgresql_column(self, app_label, schema_editor, from_state,
+                                 to_state):
+        from_model = from_state.apps.get_model(app_label, self.model_name)
+        field = from_model._meta.get_field(self.name)
+
+        # The pattern index can't be kept on an integer column:
+        like_index_name = schema_editor._create_index_name(
+            from_model, [field.column], suffix='_like',
+            )
+        index_names = schema_editor._constraint_names(
+            from_model, [field.column], index=True,
+            )
+        if like_index_name in index_names:
+            schema_editor.execute(
+                schema_editor._delete_constraint_sql(
+                    schema_editor.sql_delete_index, from_model,
+                    like_index_name,
+                    ),
+                )
+
+        # The existing values must be cast explicitly:
+        schema_editor.sql_alter_column_type = \
+            "ALTER COLUMN %(column)s TYPE %(type)s USING %(column)s::%(type)s"
+        try:
+            super(EncodeSpecializationType, self).database_forwards(
+                app_label, schema_editor, from_state, to_state,
+                )
+        finally:
+            del schema_editor.sql_alter_column_type
+
+    def describe(self):
+        return "Encode specialization_type on %s as integer codes" % \
+            self.model_name
@@ -14,17 +14,174 @@
 #
 ##############################################################################
 
+from collections import OrderedDict
 from collections import defaultdict
+from copy import deepcopy
+from functools import partial
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from threading import Condition
 
+from uuid import uuid4
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import FieldError
+from django.db import connections
+from django.db import transaction
+from django.db.models import AutoField
+from django.db.models import Model
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.fields import FieldDoesNotExist
 from django.db.models.query import QuerySet
+from django.db.models.query import prefetch_related_objects
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.db.models.sql.subqueries import InsertQuery
+
+from djeneralize.cache import get_cached_instance
+from djeneralize.cache import register_cache_alias
+from djeneralize.cache import set_cached_instance
+from djeneralize.fields import SpecializedForeignKey
+from djeneralize.identity import get_current_identity_map
+from djeneralize.instrumentation import FetchRecorder
+from djeneralize.instrumentation import record_iteration
+from djeneralize.instrumentation import specialization_types_fetched
+from djeneralize.instrumentation import specializations_fetched
+from djeneralize.registry import get_hierarchy
+from djeneralize.utils import get_direct_specialization_path
+from djeneralize.utils import get_direct_specialization_paths
+
+__all__ = ['SpecializedRelatedQuerySet', 'SpecializedQuerySet']
+
+
+MAX_EXACT_SPECIALIZATION_PATHS = 64
+"""
+The maximum number of specialization paths which
+:meth:`SpecializedQuerySet.of_type` compares exactly, above which it uses a
+prefix predicate instead
+"""
+
+
+class SpecializedRelatedQuerySet(QuerySet):
+    """
+    A QuerySet which can fetch the specialized objects of its
+    :class:`~djeneralize.fields.SpecializedForeignKey` fields in bulk.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SpecializedRelatedQuerySet, self).__init__(*args, **kwargs)
+        self._specialized_related_fields = ()
+        self._specialized_related_done = False
+
+    def select_specialized(self, *field_names):
+        """
+        Set the _specialized_related_fields attribute on a clone of this
+        queryset to ensure the specialized objects of the
+        :class:`~djeneralize.fields.SpecializedForeignKey` fields called
+        ``field_names`` are fetched along with the results, with one query per
+        specialization.
+
+        If no field names are given, all the
+        :class:`~djeneralize.fields.SpecializedForeignKey` fields are used.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedRelatedQuerySet`
+        :raises FieldError: If one of the fields isn't a
+            :class:`~djeneralize.fields.SpecializedForeignKey`
+
+        """
+
+        if field_names:
+            for field_name in field_names:
+                field = self.model._meta.get_field(field_name)
+                if not isinstance(field, SpecializedForeignKey):
+                    raise FieldError(
+                        "%s.%s is not a SpecializedForeignKey" % (
+                            self.model._meta.object_name, field_name,
+                            )
+                        )
+        else:
+            field_names = [
+                field.name for field in self.model._meta.fields if
+                isinstance(field, SpecializedForeignKey)
+                ]
+
+        # The general objects are selected along with the results, so that
+        # their specializations are known without querying them:
+        clone = self.select_related(*field_names)
+        clone._specialized_related_fields = tuple(
+            OrderedDict.fromkeys(
+                clone._specialized_related_fields + tuple(field_names)
+                )
+            )
+        return clone
+
+    def _fetch_all(self):
+        """
+        Fetch the specialized objects of the fields set by
+        :meth:`select_specialized` once the results are fetched.
+
+        """
+
+        super(SpecializedRelatedQuerySet, self)._fetch_all()
+
+        if self._specialized_related_fields and \
+            not self._specialized_related_done:
+            self._fetch_specialized_related_objects()
+
+    def _fetch_specialized_related_objects(self):
+        """
+        Replace the general objects of the fields set by
+        :meth:`select_specialized` with their specialized counterparts in the
+        cache of each result, with one query per specialization.
+
+        """
+
+        instances = [
+            instance for instance in self._result_cache if
+            isinstance(instance, Model)
+            ]
+
+        for field_name in self._specialized_related_fields:
+            field = self.model._meta.get_field(field_name)
+            cache_name = field.get_cache_name()
+
+            instances_with_related_object = [
+                instance for instance in instances if
+                instance.__dict__.get(cache_name) is not None
+                ]
+
+            specialized_objects = field.rel.to.specialize_many(
+                instance.__dict__[cache_name] for instance in
+                instances_with_related_object
+                )
+
+            for instance, specialized_object in zip(
+                instances_with_related_object, specialized_objects
+                ):
+                instance.__dict__[cache_name] = specialized_object
+
+        self._specialized_related_done = True
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        """
+        Customize the _clone method of QuerySet to ensure the value of
+        _specialized_related_fields is copied across to the clone correctly.
+
+        :rtype: :class:`SpecializedRelatedQuerySet`
+
+        """
 
-from djeneralize import PATH_SEPARATOR
-from djeneralize.utils import find_next_path_down
+        clone = super(SpecializedRelatedQuerySet, self)._clone(
+            klass, setup, **kwargs
+            )
+        clone._specialized_related_fields = self._specialized_related_fields
 
-__all__ = ['SpecializedQuerySet']
+        return clone
 
 
-class SpecializedQuerySet(QuerySet):
+class SpecializedQuerySet(SpecializedRelatedQuerySet):
     """
     A wrapper around QuerySet to ensure specialized models are returned.
 
@@ -36,13 +193,26 @@ class SpecializedQuerySet(QuerySet):
             the most specialized specializations or whether the direct
             specializations are used
         :type final_specialization: :class:`bool`
+        :param type_cache: The cache of the specialization types of the
+            instances, if any
+        :type type_cache: :class:`~djeneralize.cache.SpecializationTypeCache`
 
         """
 
         final_specialization = kwargs.pop('final_specialization', True)
+        type_cache = kwargs.pop('type_cache', None)
 
         super(SpecializedQuerySet, self).__init__(*args, **kwargs)
         self._final_specialization = final_specialization
+        self._type_cache = type_cache
+        self._join_specializations = False
+        self._chunk_size = None
+        self._server_side_cursor = False
+        self._parallel_workers = None
+        self._reuse_general_rows = False
+        self._lazy_specialization = False
+        self._cache_alias = None
+        self._cache_timeout = DEFAULT_TIMEOUT
 
     def iterator(self):
         """
@@ -51,6 +221,393 @@ class SpecializedQuerySet(QuerySet):
 
         """
 
+        if self._join_specializations:
+            specialized_instances = self._iter_joined()
+        elif self._lazy_specialization:
+            specialized_instances = self._iter_lazy()
+        elif self._reuse_general_rows:
+            specialized_instances = self._iter_from_general_instances()
+        else:
+            specialized_instances = self._iter_by_specialization()
+
+        identity_map = self._get_identity_map()
+        if identity_map is not None:
+            # Return the instances which have already been loaded instead:
+            specialized_instances = (
+                identity_map.add(specialized_instance) for
+                specialized_instance in specialized_instances
+                )
+
+        if self._type_cache is not None:
+            specialized_instances = self._iter_caching_types(
+                specialized_instances
+                )
+
+        return specialized_instances
+
+    def _iter_caching_types(self, specialized_instances):
+        """
+        Store the specialization types of ``specialized_instances`` in the
+        specialization type cache as they are iterated over.
+
+        """
+
+        for specialized_instance in specialized_instances:
+            self._type_cache.set(
+                self.model, specialized_instance.pk,
+                specialized_instance.specialization_type,
+                )
+            yield specialized_instance
+
+    def _iter_by_specialization(self):
+        """
+        Fetch the types and ids of the general model first and then load the
+        instances of each specialization with one query per specialization.
+
+        If the queryset is chunked, this is done for one window of general
+        model instances at a time.
+
+        The instances which are already in the active identity map, if any,
+        aren't loaded again.
+
+        """
+
+        identity_map = self._get_identity_map()
+        worker_pool = self._get_worker_pool()
+
+        try:
+            for specialized_instance in self._iter_windows_by_specialization(
+                identity_map, worker_pool):
+                yield specialized_instance
+        finally:
+            if worker_pool is not None:
+                worker_pool.close()
+
+    def _iter_windows_by_specialization(self, identity_map, worker_pool):
+        """
+        Load the instances of each window of general model instances with one
+        query per specialization, using ``worker_pool`` if it's set.
+
+        """
+
+        for specializations_data in self._get_windows(
+            self._get_specializations_data()
+            ):
+            # Transform this into a dictionary of IDs by type:
+            ids_by_specialization = defaultdict(list)
+
+            # and keep track of the instances which have already been loaded:
+            loaded_instances = {}
+
+            # and keep track of the IDs which respect the ordering specified in
+            # the queryset:
+            specialization_ids = []
+
+            # and of the annotations, which are only computed in this query:
+            annotations_by_id = {}
+
+            for specialization_type, specialization_id, annotations in \
+                specializations_data:
+                specialization_ids.append(specialization_id)
+
+                if identity_map is not None:
+                    loaded_instance = identity_map.get(
+                        self.model, specialization_id
+                        )
+                    if loaded_instance is not None:
+                        loaded_instances[specialization_id] = loaded_instance
+                        continue
+
+                ids_by_specialization[specialization_type].append(
+                    specialization_id
+                    )
+
+                if annotations:
+                    annotations_by_id[specialization_id] = annotations
+
+            specialized_model_instances = self._get_specialized_instances(
+                ids_by_specialization, self._fetch_specialization, worker_pool,
+                )
+            specialized_model_instances.update(loaded_instances)
+
+            for resource_id in specialization_ids:
+                specialized_instance = specialized_model_instances[resource_id]
+
+                if annotations_by_id:
+                    for annotation_name, annotation_value in \
+                        annotations_by_id[resource_id].items():
+                        setattr(
+                            specialized_instance, annotation_name,
+                            annotation_value,
+                            )
+
+                yield specialized_instance
+
+    def _iter_from_general_instances(self):
+        """
+        Fetch the general model instances first and then load only the fields
+        which are not in the general model with one query per specialization,
+        so that the table of the general model is only read once.
+
+        If the queryset is chunked, this is done for one window of general
+        model instances at a time.
+
+        """
+
+        worker_pool = self._get_worker_pool()
+
+        try:
+            for general_instances in self._get_windows(
+                self._iter_general_instances()
+                ):
+                general_instances_by_specialization = defaultdict(list)
+                for general_instance in general_instances:
+                    general_instances_by_specialization[
+                        general_instance.specialization_type
+                        ].append(general_instance)
+
+                specialized_model_instances = self._get_specialized_instances(
+                    general_instances_by_specialization,
+                    self._fetch_specialization_fields,
+                    worker_pool,
+                    )
+
+                for general_instance in general_instances:
+                    yield specialized_model_instances[general_instance.pk]
+        finally:
+            if worker_pool is not None:
+                worker_pool.close()
+
+    def _iter_lazy(self):
+        """
+        Fetch the general model instances and turn them into specialized
+        instances whose fields which are not in the general model are only
+        loaded when one of them is first accessed.
+
+        The missing fields are then loaded for all the instances of the same
+        specialization in the window at once.
+
+        """
+
+        general_fields = set(self.model._meta.concrete_fields)
+
+        for general_instances in self._get_windows(
+            self._iter_general_instances()
+            ):
+            loader = SpecializationFieldsLoader(
+                self.model, self._get_specialization_related_lookups
+                )
+
+            specializations = self._get_specialization_paths(
+                general_instance.specialization_type for general_instance in
+                general_instances
+                )
+
+            specialized_instances = []
+            for general_instance, specialization in zip(
+                general_instances, specializations):
+                model = self.model._meta.specializations[specialization]
+
+                specialized_instance = _build_specialized_instance(
+                    model, general_fields, general_instance, None
+                    )
+                self._copy_query_attributes(
+                    general_instance, specialized_instance
+                    )
+                loader.add(specialized_instance)
+
+                specialized_instances.append(specialized_instance)
+
+            for specialized_instance in specialized_instances:
+                yield specialized_instance
+
+    def _get_worker_pool(self):
+        """
+        Get the pool of threads which fetch the specializations during an
+        iteration over this queryset.
+
+        :return: The pool, or ``None`` if the queryset isn't parallel
+        :rtype: :class:`SpecializationWorkerPool`
+
+        """
+
+        if not self._parallel_workers:
+            return None
+
+        return SpecializationWorkerPool(self._parallel_workers)
+
+    def _get_specialized_instances(
+        self, data_by_specialization, fetch_specialization, worker_pool=None):
+        """
+        Load the specialized instances with one query per specialization,
+        sending the queries to ``worker_pool`` if it's set.
+
+        :param data_by_specialization: The ids (or instances) of the general
+            model instances keyed by their specialization type
+        :type data_by_specialization: :class:`dict`
+        :param fetch_specialization: The callable which loads the specialized
+            instances given the path of a specialization and the ids (or
+            instances) of the general model instances
+        :param worker_pool: The pool of threads which fetch the
+            specializations, if the queryset is parallel
+        :type worker_pool: :class:`SpecializationWorkerPool`
+        :return: The specialized instances keyed by their id
+        :rtype: :class:`dict`
+
+        """
+
+        specializations = list(data_by_specialization)
+        specialization_paths = self._get_specialization_paths(specializations)
+
+        data_by_specialization_path = defaultdict(list)
+        for specialization, specialization_path in zip(
+            specializations, specialization_paths):
+            data_by_specialization_path[specialization_path].extend(
+                data_by_specialization[specialization]
+                )
+
+        specializations_data = list(data_by_specialization_path.items())
+
+        # Other connections wouldn't see the changes made in the current
+        # transaction, so the queries can only be run in parallel outside of
+        # transactions:
+        is_parallel = worker_pool is not None and \
+            1 < len(specializations_data) and \
+            not connections[self.db].in_atomic_block
+
+        if is_parallel:
+            sub_instances_by_specialization = worker_pool.map(
+                fetch_specialization, specializations_data,
+                )
+        else:
+            sub_instances_by_specialization = [
+                fetch_specialization(specialization, data) for
+                specialization, data in specializations_data
+                ]
+
+        specialized_model_instances = {}
+
+        # Add the sub-class instances into a single look-up
+        for sub_instances in sub_instances_by_specialization:
+            specialized_model_instances.update(sub_instances)
+
+        return specialized_model_instances
+
+    def _fetch_specialization(self, specialization, ids):
+        """
+        Load the instances of the model for ``specialization`` with ``ids``.
+
+        :param specialization: The path of the specialization
+        :type specialization: :class:`basestring`
+        :param ids: The ids of the instances to load
+        :type ids: :class:`list`
+        :return: The specialized instances keyed by their id
+        :rtype: :class:`dict`
+
+        """
+
+        model = self.model._meta.specializations[specialization]
+        sub_queryset = self._get_specialization_queryset(model)
+
+        with FetchRecorder(
+            specializations_fetched, model, specialization=specialization,
+            operation='in_bulk', using=sub_queryset.db,
+            ) as recorder:
+            sub_instances = sub_queryset.in_bulk(ids)
+            recorder.row_count = len(sub_instances)
+
+        return sub_instances
+
+    def _get_specialization_queryset(self, model):
+        """
+        Get a queryset of the specialized ``model`` which loads the instances
+        as this queryset would.
+
+        """
+
+        sub_queryset = model.objects.all()
+
+        # Copy any deferred loading over to the new querysets:
+        sub_queryset.query.deferred_loading = self.query.deferred_loading
+
+        # Copy any extra select statements to the new querysets. NB: It doesn't
+        # make sense to copy any of the "where", "tables" or "order_by" options
+        # as these have already been applied in the parent queryset
+        sub_queryset.query._extra = self.query._extra
+
+        # Copy the related objects to be selected, leaving out those which
+        # aren't related to this specialization:
+        sub_queryset.query.select_related = _get_select_related(
+            self.query.select_related, model
+            )
+        sub_queryset.query.max_depth = self.query.max_depth
+
+        return sub_queryset
+
+    def _fetch_specialization_fields(self, specialization, general_instances):
+        """
+        Load the fields of the model for ``specialization`` which are not in
+        the general model and build the specialized instances from them and
+        ``general_instances``.
+
+        :param specialization: The path of the specialization
+        :type specialization: :class:`basestring`
+        :param general_instances: The general model instances to specialize
+        :type general_instances: :class:`list`
+        :return: The specialized instances keyed by their id
+        :rtype: :class:`dict`
+
+        """
+
+        model = self.model._meta.specializations[specialization]
+
+        general_fields = set(self.model._meta.concrete_fields)
+        specialization_fields = _get_specialization_fields(self.model, model)
+
+        if specialization_fields:
+            specialization_values_by_pk = _fetch_specialization_values(
+                model, specialization_fields,
+                [general_instance.pk for general_instance in general_instances],
+                )
+
+        specialized_instances = {}
+        for general_instance in general_instances:
+            if specialization_fields:
+                specialization_values = \
+                    specialization_values_by_pk[general_instance.pk]
+            else:
+                specialization_values = {}
+
+            specialized_instance = _build_specialized_instance(
+                model, general_fields, general_instance, specialization_values
+                )
+            self._copy_query_attributes(general_instance, specialized_instance)
+
+            specialized_instances[general_instance.pk] = specialized_instance
+
+        # The objects related to the general model have been selected along
+        # with the general model instances, but those related to this
+        # specialization only have to be fetched now:
+        related_lookups = self._get_specialization_related_lookups(model)
+        if related_lookups and specialized_instances:
+            prefetch_related_objects(
+                list(specialized_instances.values()), related_lookups
+                )
+
+        return specialized_instances
+
+    def _get_specializations_data(self):
+        """
+        Get the specialization type, the id and the annotations of every
+        general model instance in the queryset, respecting the ordering of the
+        queryset.
+
+        :return: An iterator of ``(specialization_type, id, annotations)``
+            tuples, where ``annotations`` is ``None`` if the queryset isn't
+            annotated
+
+        """
+
         # Determine whether there are any extra fields which are also required
         # to order the queryset. This is needed as Django's implementation of
         # ValuesQuerySet cannot cope with fields being omitted which are used in
@@ -60,139 +617,1608 @@ class SpecializedQuerySet(QuerySet):
             field.lstrip('-') for field in self.query.order_by)
         extra_ordering_fields = list(extra_fields & ordering_fields)
 
+        # The annotations are computed in this query and copied to the
+        # specialized instances afterwards:
+        annotation_names = list(self.query.annotation_select)
+
         values_query_fields = ['specialization_type', 'id'] + \
-            extra_ordering_fields
+            extra_ordering_fields + annotation_names
 
         # Get the resource ids and types together
         specializations_data = self._clone().values(*values_query_fields)
 
-        # Transform this into a dictionary of IDs by type:
-        ids_by_specialization = defaultdict(list)
+        if self._server_side_cursor:
+            return record_iteration(
+                self._stream_specializations_data(specializations_data),
+                specialization_types_fetched,
+                self.model,
+                using=self.db,
+                )
 
-        # and keep track of the IDs which respect the ordering specified in the
-        # queryset:
-        specialization_ids = []
+        specializations_data_rows = record_iteration(
+            specializations_data.iterator(),
+            specialization_types_fetched,
+            self.model,
+            using=self.db,
+            )
 
-        for specialization_data in specializations_data:
-            specialization_type = specialization_data['specialization_type']
-            specialization_id = specialization_data['id']
+        return (
+            (
+                specialization_data['specialization_type'],
+                specialization_data['id'],
+                dict(
+                    (annotation_name, specialization_data[annotation_name])
+                    for annotation_name in annotation_names
+                    ) if annotation_names else None,
+                )
+            for specialization_data in specializations_data_rows
+            )
 
-            ids_by_specialization[specialization_type].append(specialization_id)
-            specialization_ids.append(specialization_id)
+    def _stream_specializations_data(self, specializations_data):
+        """
+        Execute the query of ``specializations_data`` on a server-side cursor,
+        if supported by the database backend, and fetch _chunk_size rows at a
+        time from it.
 
-        specialized_model_instances = {}
+        :param specializations_data: The queryset of the specialization types
+            and ids
+        :type specializations_data:
+            :class:`~django.db.models.query.ValuesQuerySet`
+        :return: An iterator of ``(specialization_type, id, annotations)``
+            tuples
 
-        # Add the sub-class instances into a single look-up
-        for specialization, ids in ids_by_specialization.items():
-            if not self._final_specialization:
-                # Coerce the specialization to only be the direct child of the
-                # general model (self.model):
-                specialization = find_next_path_down(
-                    self.model.model_specialization, specialization,
-                    PATH_SEPARATOR
-                    )
+        """
 
-            sub_queryset = self.model._meta.specializations[
-                specialization
-                ].objects.all()
+        compiler = specializations_data.query.get_compiler(
+            using=specializations_data.db
+            )
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            return
 
-            # Copy any deferred loading over to the new querysets:
-            sub_queryset.query.deferred_loading = self.query.deferred_loading
+        converters = compiler.get_converters(
+            [select[0] for select in compiler.select]
+            )
 
-            # Copy any extra select statements to the new querysets. NB: It
-            # doesn't make sense to copy any of the "where", "tables" or
-            # "order_by" options as these have already been applied in the
-            # parent queryset
-            sub_queryset.query._extra = self.query._extra
+        # The extra select statements always come first in the query and the
+        # annotations last:
+        specialization_type_index = len(specializations_data.query.extra_select)
+        specialization_id_index = specialization_type_index + 1
 
-            sub_instances = sub_queryset.in_bulk(ids)
+        annotation_names = list(specializations_data.query.annotation_select)
+        annotations_index = len(compiler.select) - len(annotation_names)
 
-            specialized_model_instances.update(sub_instances)
+        cursor = _get_streaming_cursor(compiler.connection)
+        try:
+            cursor.execute(sql, params)
 
-        for resource_id in specialization_ids:
-            yield specialized_model_instances[resource_id]
+            rows = cursor.fetchmany(self._chunk_size)
+            while rows:
+                for row in rows:
+                    if converters:
+                        row = compiler.apply_converters(row, converters)
+                    yield (
+                        row[specialization_type_index],
+                        row[specialization_id_index],
+                        dict(zip(annotation_names, row[annotations_index:])) if
+                        annotation_names else None,
+                        )
+                rows = cursor.fetchmany(self._chunk_size)
+        finally:
+            cursor.close()
 
-    def annotate(self, *args, **kawrgs):
-        raise NotImplementedError(
-            "%s does not support annotations as these cannot be reliably copied"
-            " to the specialized instances" % self.__class__.__name__
-            )
+    def _get_windows(self, iterable):
+        """
+        Split ``iterable`` into lists of at most _chunk_size items, or a single
+        list if the queryset isn't chunked.
 
-    def get(self, *args, **kwargs):
         """
-        Override get to ensure a specialized model instance is returned.
 
-        :return: A specialized model instance
+        if self._chunk_size is None:
+            yield list(iterable)
+            return
+
+        iterator = iter(iterable)
+        while True:
+            window = list(islice(iterator, self._chunk_size))
+            if not window:
+                break
+            yield window
 
+    def _iter_joined(self):
         """
+        Fetch the general model together with all its specializations in a
+        single query, by LEFT OUTER JOINing the tables of the specializations.
 
-        if 'specialization_type' in kwargs:
-            # if the specialization is explicitly specified, use this to work out
-            # which sub-class of the general model we'll use:
-            specialization = kwargs.pop('specialization_type')
-        else:
-            try:
-                specialization = super(SpecializedQuerySet, self)\
-                    .filter(*args, **kwargs).values_list(
-                        'specialization_type', flat=True
-                        )[0]
-            except IndexError:
-                raise self.model.DoesNotExist(
-                    "%s matching query does not exist." %
-                    self.model._meta.object_name
-                    )
+        """
 
-        if not self._final_specialization:
-            # Coerce the specialization to only be the direct child of the
-            # general model (self.model):
-            specialization = find_next_path_down(
-                self.model.model_specialization, specialization, PATH_SEPARATOR
+        lookups_by_specialization = self._get_specialization_lookups()
+
+        queryset = self._clone()
+        queryset.query.select_related = self._get_joined_select_related(
+            lookups_by_specialization
+            )
+
+        general_instances = record_iteration(
+            super(SpecializedQuerySet, queryset).iterator(),
+            specialization_types_fetched,
+            self.model,
+            using=self.db,
+            )
+        for general_instance in general_instances:
+            specialization = self._get_specialization_path(
+                general_instance.specialization_type
                 )
 
-        try:
-            return self.model._meta.specializations[specialization]\
-                                   .objects.get(*args, **kwargs)
-        except KeyError:
-            raise self.model.DoesNotExist("%s matching query does not exist." %
-                                          self.model._meta.object_name)
-    def direct(self):
-        """
-        Set the _final_specialization attribute on a clone of this queryset to
-        ensure only directly descended specializations are considered.
+            specialized_instance = general_instance
+            for accessor_name in lookups_by_specialization[specialization]:
+                specialized_instance = getattr(
+                    specialized_instance, accessor_name
+                    )
 
-        :return: The cloned queryset
-        :rtype: :class:`SpecializedQuerySet`
+            # Proxy specializations are stored in the table of their parent,
+            # whose instance is the one reached through the parent links:
+            model = self.model._meta.specializations[specialization]
+            if model._meta.proxy:
+                specialized_instance.__class__ = model
 
-        """
+            self._copy_query_attributes(general_instance, specialized_instance)
 
-        clone = self._clone()
-        clone._final_specialization = False
-        return clone
+            yield specialized_instance
 
-    def final(self):
+    def _iter_general_instances(self):
         """
-        Set the _final_specialization attribute on a clone of this queryset to
-        ensure only terminal specializations are considered.
-
-        :return: The cloned queryset
-        :rtype: :class:`SpecializedQuerySet`
+        Iterate over the general model instances in the queryset, whose
+        specialization types are then known.
 
         """
 
-        clone = self._clone()
-        clone._final_specialization = True
-        return clone
+        return record_iteration(
+            super(SpecializedQuerySet, self._get_general_queryset()).iterator(),
+            specialization_types_fetched,
+            self.model,
+            using=self.db,
+            )
 
-    def _clone(self, klass=None, setup=False, **kwargs):
+    def _copy_query_attributes(self, general_instance, specialized_instance):
         """
-        Customize the _clone method of QuerySet to ensure the value of
-        _final_specialization is copied across to the clone correctly.
-
-        :rtype: :class:`SpecializedQuerySet`
+        Copy the attributes set by the query of this queryset (i.e., the extra
+        select statements and the annotations) from ``general_instance`` to
+        ``specialized_instance``.
 
         """
 
-        clone = super(SpecializedQuerySet, self)._clone(klass, setup, **kwargs)
-        clone._final_specialization = self._final_specialization
+        for extra_select_name in self.query.extra_select:
+            setattr(
+                specialized_instance, extra_select_name,
+                getattr(general_instance, extra_select_name)
+                )
 
-        return clone
+        for annotation_name in self.query.annotation_select:
+            setattr(
+                specialized_instance, annotation_name,
+                getattr(general_instance, annotation_name)
+                )
+
+        # Copy the objects related to the general model which were selected
+        # along with it:
+        for field in self.model._meta.fields:
+            if not field.rel:
+                continue
+
+            cache_name = field.get_cache_name()
+            if cache_name in general_instance.__dict__:
+                specialized_instance.__dict__[cache_name] = \
+                    general_instance.__dict__[cache_name]
+
+    def _get_general_queryset(self):
+        """
+        Get a copy of this queryset which only selects the objects related to
+        the general model, as the objects which are only related to some of
+        its specializations can't be selected along with it.
+
+        """
+
+        queryset = self._clone()
+        queryset.query.select_related = _get_select_related(
+            self.query.select_related, self.model
+            )
+
+        return queryset
+
+    def _get_joined_select_related(self, lookups_by_specialization):
+        """
+        Work out the related objects to select along with the general model
+        when its specializations are joined to it, so that the objects related
+        to each specialization are selected through the reverse parent links.
+
+        :param lookups_by_specialization: The names of the reverse parent links
+            to follow from the general model, keyed by the specialization path
+        :type lookups_by_specialization: :class:`dict`
+        :return: The related objects to select, in the format of
+            :attr:`django.db.models.sql.Query.select_related`
+        :rtype: :class:`dict`
+
+        """
+
+        if self.query.select_related is True:
+            select_related = _get_default_select_related(
+                self.model._meta.fields, self.query.max_depth
+                )
+        else:
+            select_related = deepcopy(
+                _get_select_related(self.query.select_related, self.model) or
+                {}
+                )
+
+        for specialization, lookups in lookups_by_specialization.items():
+            model = self.model._meta.specializations[specialization]
+
+            specialization_select_related = select_related
+            for lookup in lookups:
+                specialization_select_related = \
+                    specialization_select_related.setdefault(lookup, {})
+
+            specialization_select_related.update(
+                self._get_specialization_select_related(
+                    model, model._generalized_parent
+                    )
+                )
+
+        return select_related
+
+    def _get_specialization_select_related(self, model, parent_model):
+        """
+        Get the related objects to select which are related to ``model`` but
+        not to ``parent_model``.
+
+        :param model: The specialized model
+        :param parent_model: An ancestor of ``model``
+        :return: The related objects to select, in the format of
+            :attr:`django.db.models.sql.Query.select_related`
+        :rtype: :class:`dict`
+
+        """
+
+        select_related = self.query.select_related
+
+        if select_related is True:
+            parent_fields = set(parent_model._meta.fields)
+            return _get_default_select_related(
+                [field for field in model._meta.fields if
+                 field not in parent_fields],
+                self.query.max_depth,
+                )
+
+        if not select_related:
+            return {}
+
+        return dict(
+            (field_name, deepcopy(field_select_related)) for
+            field_name, field_select_related in select_related.items() if
+            _has_field(model, field_name) and
+            not _has_field(parent_model, field_name)
+            )
+
+    def _get_specialization_related_lookups(self, model):
+        """
+        Get the lookups with which to prefetch the objects to select which are
+        related to ``model`` but not to the general model.
+
+        :param model: The specialized model
+        :rtype: :class:`list`
+
+        """
+
+        return _get_select_related_lookups(
+            self._get_specialization_select_related(model, self.model)
+            )
+
+    def _get_specialization_lookups(self):
+        """
+        Work out how to reach every specialization of the general model from
+        the general model itself.
+
+        :return: The names of the reverse parent links to follow from the
+            general model, keyed by the specialization path
+        :rtype: :class:`dict`
+
+        """
+
+        hierarchy = get_hierarchy(self.model)
+
+        if self._final_specialization:
+            models = hierarchy.get_descendants(self.model)
+        else:
+            models = hierarchy.get_children(self.model)
+
+        # The lookups are computed from the general model of the hierarchy,
+        # which may be an ancestor of self.model:
+        depth = hierarchy.get_depth(self.model)
+
+        lookups_by_specialization = {}
+        for model in models:
+            lookups_by_specialization[model.model_specialization] = \
+                list(hierarchy.get_parent_link_lookups(model)[depth:])
+
+        return lookups_by_specialization
+
+    def _get_specialization_path(self, specialization):
+        """
+        Coerce ``specialization`` to be the direct child of the general model
+        (self.model) if only direct specializations are required.
+
+        :param specialization: The specialization path stored for a general
+            model instance
+        :type specialization: :class:`basestring`
+        :return: The path of the specialization to be used
+        :rtype: :class:`basestring`
+
+        """
+
+        if not self._final_specialization:
+            specialization = get_direct_specialization_path(
+                self.model, specialization,
+                )
+
+        return specialization
+
+    def _get_specialization_paths(self, specializations):
+        """
+        Coerce each of ``specializations`` to be the direct child of the
+        general model (self.model) if only direct specializations are required.
+
+        :param specializations: The specialization paths stored for general
+            model instances
+        :type specializations: iterable
+        :return: The paths of the specializations to be used, in the same order
+        :rtype: :class:`list`
+
+        """
+
+        if self._final_specialization:
+            return list(specializations)
+
+        return get_direct_specialization_paths(self.model, specializations)
+
+    def get(self, *args, **kwargs):
+        """
+        Override get to ensure a specialized model instance is returned.
+
+        Instances looked up by primary key are taken from the active identity
+        map or, if this queryset is cached, from the cache when they've been
+        loaded already. Otherwise, if their specialization type is in the
+        specialization type cache, only the tables of their specialization are
+        queried.
+
+        :return: A specialized model instance
+
+        """
+
+        pk = None
+        if self._returns_stored_instances() and not args and \
+            not self.query.has_filters():
+            pk = _get_pk_lookup_value(self.model, kwargs)
+
+        if pk is not None:
+            specialized_instance = self._get_loaded_instance(pk)
+            if specialized_instance is not None:
+                return specialized_instance
+
+        specialized_instance = None
+
+        if pk is not None and self._type_cache is not None:
+            specialization_type = self._type_cache.get(self.model, pk)
+            if specialization_type is not None:
+                try:
+                    specialized_instance = self._get_from_database(
+                        specialization_type=specialization_type,
+                        _stored_specialization_type=specialization_type,
+                        **kwargs
+                        )
+                except self.model.DoesNotExist:
+                    # The instance may have been re-specialized or deleted by
+                    # another process:
+                    self._type_cache.discard(self.model, pk)
+
+        if specialized_instance is None:
+            specialized_instance = self._get_from_database(*args, **kwargs)
+
+        if pk is not None and self._type_cache is not None:
+            self._type_cache.set(
+                self.model, pk, specialized_instance.specialization_type,
+                )
+
+        if pk is not None and self._cache_alias is not None:
+            set_cached_instance(
+                specialized_instance, self._cache_alias, self._cache_timeout,
+                )
+
+        return specialized_instance
+
+    def _get_loaded_instance(self, pk):
+        """
+        Get the instance with ``pk`` from the active identity map or from the
+        cache.
+
+        :param pk: The primary key of the instance
+        :return: The specialized instance, or ``None`` if it hasn't been loaded
+
+        """
+
+        identity_map = self._get_identity_map()
+
+        if identity_map is not None:
+            specialized_instance = identity_map.get(self.model, pk)
+            if isinstance(specialized_instance, self.model):
+                return specialized_instance
+
+        if self._cache_alias is not None:
+            specialized_instance = get_cached_instance(
+                self.model, pk, self._cache_alias
+                )
+            if isinstance(specialized_instance, self.model):
+                if identity_map is not None:
+                    specialized_instance = \
+                        identity_map.add(specialized_instance)
+                return specialized_instance
+
+        return None
+
+    def _get_from_database(self, *args, **kwargs):
+        """
+        Get the specialized model instance matching the lookup from the
+        database.
+
+        Unless the specialization type is looked up, it's fetched first and
+        then the instance is got from the tables of its specialization only.
+        If the queryset is joined, the specialization is resolved and its
+        fields are fetched in a single query instead, by joining the tables of
+        all the specializations, which is only worth it when a round trip to
+        the database costs more than compiling that query.
+
+        If the specialization type comes from the specialization type cache,
+        it's passed as ``_stored_specialization_type`` too so that an instance
+        which has been re-specialized since isn't fetched as the wrong
+        specialization.
+
+        """
+
+        stored_specialization_type = \
+            kwargs.pop('_stored_specialization_type', None)
+
+        if 'specialization_type' not in kwargs and self._join_specializations:
+            # Like the iteration over the joined queryset, the query is
+            # reported as the query of the specialization types:
+            try:
+                specialized_instance = super(SpecializedQuerySet, self).get(
+                    *args, **kwargs
+                    )
+            except KeyError:
+                raise self.model.DoesNotExist(
+                    "%s matching query does not exist." %
+                    self.model._meta.object_name
+                    )
+
+            return specialized_instance
+
+        if self.query.annotation_select:
+            # The annotations can only be copied to the specialized instance
+            # when it's fetched by iterating over this queryset:
+            return super(SpecializedQuerySet, self).get(*args, **kwargs)
+
+        if 'specialization_type' in kwargs:
+            # if the specialization is explicitly specified, use this to work
+            # out which sub-class of the general model we'll use:
+            specialization_type = kwargs.pop('specialization_type')
+        else:
+            specialization_type, pk = self._get_specialization_type(
+                *args, **kwargs
+                )
+            args = ()
+            kwargs = {'pk': pk}
+
+        specialization = self._get_specialization_path(specialization_type)
+
+        try:
+            model = self.model._meta.specializations[specialization]
+        except KeyError:
+            raise self.model.DoesNotExist("%s matching query does not exist." %
+                                          self.model._meta.object_name)
+
+        specialization_queryset = self._get_specialization_queryset(model)
+        if stored_specialization_type is not None:
+            specialization_queryset = specialization_queryset.filter(
+                specialization_type=stored_specialization_type,
+                )
+        with FetchRecorder(
+            specializations_fetched, model, specialization=specialization,
+            operation='get', using=specialization_queryset.db,
+            ) as recorder:
+            specialized_instance = specialization_queryset.get(*args, **kwargs)
+            recorder.row_count = 1
+
+        identity_map = self._get_identity_map()
+        if identity_map is not None:
+            specialized_instance = identity_map.add(specialized_instance)
+
+        return specialized_instance
+
+    def _get_specialization_type(self, *args, **kwargs):
+        """
+        Get the specialization type and the primary key of the general model
+        instance matching the lookup.
+
+        :return: The specialization type and the primary key
+        :rtype: :class:`tuple`
+        :raises DoesNotExist: If no instance matches the lookup
+        :raises MultipleObjectsReturned: If several instances match the lookup
+
+        """
+
+        general_queryset = QuerySet(
+            self.model, query=self.query.clone(), using=self.db,
+            )
+        with FetchRecorder(
+            specialization_types_fetched, self.model, using=self.db,
+            ) as recorder:
+            specialization_type, pk = general_queryset \
+                .values_list('specialization_type', 'pk') \
+                .get(*args, **kwargs)
+            recorder.row_count = 1
+
+        return specialization_type, pk
+
+    def _returns_stored_instances(self):
+        """
+        Check whether the instances returned by this queryset are the final
+        specializations as they're stored in the database, i.e., without extra
+        selects, annotations or deferred fields, so that they can be shared.
+
+        :rtype: :class:`bool`
+
+        """
+
+        return self._final_specialization and not (
+            self.query.extra_select or self.query.annotation_select or
+            self.query.deferred_loading[0] or self._lazy_specialization
+            )
+
+    def _get_identity_map(self):
+        """
+        Get the active identity map, unless the instances returned by this
+        queryset may differ from those in it.
+
+        :return: The identity map or ``None``
+        :rtype: :class:`~djeneralize.identity.IdentityMap`
+
+        """
+
+        if not self._returns_stored_instances():
+            return None
+
+        return get_current_identity_map()
+
+    def direct(self):
+        """
+        Set the _final_specialization attribute on a clone of this queryset to
+        ensure only directly descended specializations are considered.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = self._clone()
+        clone._final_specialization = False
+        return clone
+
+    def final(self):
+        """
+        Set the _final_specialization attribute on a clone of this queryset to
+        ensure only terminal specializations are considered.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = self._clone()
+        clone._final_specialization = True
+        return clone
+
+    def joined(self):
+        """
+        Set the _join_specializations attribute on a clone of this queryset to
+        ensure the specializations are fetched in the same query as the general
+        model, by LEFT OUTER JOINing the tables of all the specializations.
+
+        This trades one query per specialization for a wider query, which is
+        usually faster when the general model has many specializations.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = self._clone()
+        clone._join_specializations = True
+        return clone
+
+    def chunked(self, size=2000, server_side_cursor=False):
+        """
+        Set the _chunk_size attribute on a clone of this queryset to ensure the
+        specializations are fetched for ``size`` general model instances at a
+        time, so that the memory used while iterating over it is proportional
+        to ``size`` rather than to the number of results.
+
+        Use :meth:`iterator` to iterate over the cloned queryset, as iterating
+        over it directly caches all the results.
+
+        :param size: The number of general model instances to specialize at a
+            time
+        :type size: :class:`int`
+        :param server_side_cursor: Whether the specialization types and ids
+            should be streamed from a server-side cursor (on PostgreSQL) instead
+            of being read by the client in one go. On other backends, they are
+            fetched ``size`` rows at a time from a regular cursor
+        :type server_side_cursor: :class:`bool`
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+        :raises ValueError: If ``size`` is not a positive number
+
+        """
+
+        if size < 1:
+            raise ValueError("The chunk size must be a positive number")
+
+        clone = self._clone()
+        clone._chunk_size = size
+        clone._server_side_cursor = server_side_cursor
+        return clone
+
+    def parallel(self, max_workers=4):
+        """
+        Set the _parallel_workers attribute on a clone of this queryset to
+        ensure the specializations are fetched concurrently by a pool of up to
+        ``max_workers`` threads, each with its own database connection. The
+        pool is kept for the whole iteration (i.e., for all the windows of a
+        chunked queryset) and the connections are closed along with it.
+
+        The specializations are fetched sequentially inside transactions, as
+        the other connections wouldn't see the changes made in them.
+
+        :param max_workers: The maximum number of threads to use
+        :type max_workers: :class:`int`
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+        :raises ValueError: If ``max_workers`` is not a positive number
+
+        """
+
+        if max_workers < 1:
+            raise ValueError("The number of workers must be a positive number")
+
+        clone = self._clone()
+        clone._parallel_workers = max_workers
+        return clone
+
+    def reuse_general_rows(self):
+        """
+        Set the _reuse_general_rows attribute on a clone of this queryset to
+        ensure the general model instances are fetched first, with all their
+        fields, and that only the fields which are not in the general model are
+        fetched for each specialization.
+
+        This avoids reading the table of the general model once per
+        specialization.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = self._clone()
+        clone._reuse_general_rows = True
+        return clone
+
+    def lazy(self):
+        """
+        Set the _lazy_specialization attribute on a clone of this queryset to
+        ensure the specialized instances are built from the general model
+        instances alone, and that the fields which are not in the general model
+        are loaded when one of them is first accessed.
+
+        At that point, the missing fields are loaded for all the instances of
+        the same specialization, so pages which only use the fields of the
+        general model take a single query.
+
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = self._clone()
+        clone._lazy_specialization = True
+        return clone
+
+    def cached(self, timeout=DEFAULT_TIMEOUT, cache_alias=DEFAULT_CACHE_ALIAS):
+        """
+        Set the _cache_alias attribute on a clone of this queryset to ensure
+        the instances looked up by primary key with :meth:`get` are stored in
+        (and then taken from) the cache called ``cache_alias``.
+
+        The cached instances are invalidated when any of the models in their
+        hierarchy is saved or deleted, in the caches used by this process and
+        in those listed in the ``DJENERALIZE_CACHE_ALIASES`` setting.
+
+        :param timeout: The timeout of the cache entries, as for
+            :meth:`django.core.cache.backends.base.BaseCache.set`
+        :param cache_alias: The alias of the cache to use
+        :type cache_alias: :class:`str`
+        :return: The cloned queryset
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        register_cache_alias(cache_alias)
+
+        clone = self._clone()
+        clone._cache_alias = cache_alias
+        clone._cache_timeout = timeout
+        return clone
+
+    def of_type(self, model, include_descendants=True):
+        """
+        Filter this queryset so that it only contains the instances of
+        ``model`` and, if ``include_descendants`` is set, of its
+        specializations.
+
+        The subtree of ``model`` is matched against the exact specialization
+        paths taken from the hierarchy registry, so that the index of the
+        ``specialization_type`` column can be used, unless there are more than
+        :data:`MAX_EXACT_SPECIALIZATION_PATHS` of them and they're not stored
+        as integer codes, in which case the paths are matched by their prefix.
+
+        :param model: The model of this queryset or one of its specializations
+        :param include_descendants: Whether the specializations of ``model``
+            are included
+        :type include_descendants: :class:`bool`
+        :return: The filtered queryset
+        :rtype: :class:`SpecializedQuerySet`
+        :raises ValueError: If ``model`` isn't the model of this queryset or
+            one of its specializations
+
+        """
+
+        hierarchy = get_hierarchy(self.model)
+
+        if model not in hierarchy or \
+            not hierarchy.is_in_subtree(model, self.model):
+            raise ValueError(
+                "%s is not a specialization of %s" % (
+                    model._meta.object_name, self.model._meta.object_name,
+                    )
+                )
+
+        if include_descendants and model is self.model:
+            # All the instances are in the subtree of the model:
+            return self._clone()
+
+        specializations = [model.model_specialization]
+        if include_descendants:
+            specializations.extend(
+                descendant.model_specialization for descendant in
+                hierarchy.get_descendants(model)
+                )
+
+        if len(specializations) == 1:
+            return self.filter(specialization_type=specializations[0])
+
+        if len(specializations) <= MAX_EXACT_SPECIALIZATION_PATHS or \
+            self.model._meta.compact_specialization_type:
+            return self.filter(specialization_type__in=sorted(specializations))
+
+        return self.filter(
+            specialization_type__startswith=model.model_specialization,
+            )
+
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Override bulk_create to insert instances of any specialization of the
+        model of this queryset, which Django refuses as they're multi-table
+        inherited models.
+
+        The rows of the general model are inserted first, in batches, and then
+        those of each specialization, from the top of the hierarchy down. The
+        ``specialization_type`` of the instances which don't have one is set
+        to the path of their model.
+
+        Unlike Django's bulk_create, the primary keys of the instances of the
+        specializations are set. They're returned by the batches of inserts on
+        PostgreSQL, but on other databases the rows of the general model are
+        inserted one at a time for the instances of the specializations which
+        don't have a primary key already. The instances of the general model
+        itself are always inserted in batches, so as with Django's bulk_create,
+        their primary keys are only set on PostgreSQL. The ``save()`` method
+        isn't called and no signals are sent.
+
+        :param objs: The unsaved instances of the model of this queryset or of
+            its specializations
+        :type objs: iterable
+        :param batch_size: The maximum number of rows inserted per query, or
+            ``None`` to insert as many as supported by the database
+        :type batch_size: :class:`int`
+        :return: The instances inserted
+        :rtype: :class:`list`
+        :raises ValueError: If an instance isn't of the model of this queryset
+            or of one of its specializations
+
+        """
+
+        assert batch_size is None or batch_size > 0
+
+        objs = list(objs)
+
+        for obj in objs:
+            if not isinstance(obj, self.model) or obj._meta.proxy:
+                raise ValueError(
+                    "%s is not a specialization of %s" % (
+                        obj.__class__._meta.object_name,
+                        self.model._meta.object_name,
+                        )
+                    )
+
+        if objs:
+            self._insert_specialized_instances(objs, batch_size)
+
+        return objs
+
+    def _prefetch_related_objects(self):
+        """
+        Prefetch the related objects of each lookup for the specialized
+        instances of the model which defines the relation, as the specialized
+        instances are of different models.
+
+        This way, relations of the general model are prefetched in one query
+        for all the instances, while relations of a specialization are only
+        prefetched for the instances of that specialization.
+
+        """
+
+        lookups_by_model = OrderedDict()
+        for lookup in self._prefetch_related_lookups:
+            # Prefetch objects are supported in Django 1.7+:
+            lookup_path = getattr(lookup, 'prefetch_through', lookup)
+            relation_name = lookup_path.split(LOOKUP_SEP)[0]
+
+            for model in self._get_relation_models(relation_name):
+                lookups_by_model.setdefault(model, []).append(lookup)
+
+        for model, lookups in lookups_by_model.items():
+            instances = [
+                instance for instance in self._result_cache if
+                isinstance(instance, model)
+                ]
+            if instances:
+                prefetch_related_objects(instances, lookups)
+
+        self._prefetch_done = True
+
+    def _get_relation_models(self, relation_name):
+        """
+        Get the most general models which define the relation
+        ``relation_name``, which is either the general model or one or more of
+        its specializations.
+
+        If no model defines it, the general model is returned so that Django
+        reports the invalid lookup.
+
+        :rtype: :class:`list`
+
+        """
+
+        if hasattr(self.model, relation_name):
+            return [self.model]
+
+        hierarchy = get_hierarchy(self.model)
+
+        relation_models = [
+            model for model in hierarchy.get_descendants(self.model) if
+            hasattr(model, relation_name) and
+            not hasattr(hierarchy.get_ancestors(model)[0], relation_name)
+            ]
+
+        return relation_models or [self.model]
+
+    def _insert_specialized_instances(self, instances, batch_size=None):
+        """
+        Insert the rows of ``instances``, which may be instances of any
+        specialization of the model of this queryset, into the tables of the
+        general model and of all their specializations, one batch of rows per
+        table at a time.
+
+        The rows of the general model are only inserted in batches if the
+        instances have a primary key already, if they don't have rows in the
+        tables of any specialization or if the database can return the primary
+        keys of the rows inserted by a query (i.e., on PostgreSQL); otherwise,
+        they're inserted one at a time to get the primary keys that the rows of
+        their specializations refer to. No signals are sent.
+
+        :param instances: The unsaved specialized instances
+        :type instances: :class:`list`
+        :param batch_size: The maximum number of rows per query, which is
+            lowered to the maximum supported by the database if necessary
+        :type batch_size: :class:`int`
+
+        """
+
+        connection = connections[self.db]
+
+        def get_batch_size(fields, model_instances):
+            max_batch_size = max(
+                connection.ops.bulk_batch_size(fields, model_instances), 1,
+                )
+            return min(batch_size or max_batch_size, max_batch_size)
+
+        def insert_rows(model, model_instances, fields):
+            if not model_instances:
+                return
+            QuerySet(model, using=self.db)._batched_insert(
+                model_instances,
+                fields,
+                get_batch_size(fields, model_instances),
+                )
+
+        hierarchy = get_hierarchy(self.model)
+        general_model = hierarchy.general_model
+
+        for instance in instances:
+            if not instance.specialization_type:
+                instance.specialization_type = \
+                    instance.__class__.model_specialization
+
+            # Like Model.save(), copy the primary key set on the specialization
+            # up to its ancestors:
+            model = instance.__class__
+            for parent_model in hierarchy.get_ancestors(model):
+                parent_link = model._meta.parents[parent_model]
+                parent_pk_attname = parent_model._meta.pk.attname
+                if getattr(instance, parent_pk_attname) is None and \
+                    getattr(instance, parent_link.attname) is not None:
+                    setattr(
+                        instance,
+                        parent_pk_attname,
+                        getattr(instance, parent_link.attname),
+                        )
+                model = parent_model
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            general_fields = general_model._meta.local_concrete_fields
+            fields = [
+                field for field in general_fields if
+                not isinstance(field, AutoField)
+                ]
+            instances_with_pk = []
+            instances_without_pk = []
+            general_instances_without_pk = []
+            for instance in instances:
+                if instance._get_pk_val(general_model._meta) is not None:
+                    instances_with_pk.append(instance)
+                elif instance.__class__ is general_model and \
+                    connection.vendor != 'postgresql':
+                    # No specialization refers to the primary key of the row,
+                    # so it doesn't have to be got back:
+                    general_instances_without_pk.append(instance)
+                else:
+                    instances_without_pk.append(instance)
+            insert_rows(general_model, instances_with_pk, general_fields)
+            insert_rows(general_model, general_instances_without_pk, fields)
+
+            if instances_without_pk:
+                pk_attname = general_model._meta.pk.attname
+
+                if connection.vendor == 'postgresql':
+                    # The primary keys of a whole batch can be returned by the
+                    # query which inserts it:
+                    general_batch_size = \
+                        get_batch_size(fields, instances_without_pk)
+                    for offset in range(
+                        0, len(instances_without_pk), general_batch_size):
+                        batch = instances_without_pk[
+                            offset:offset + general_batch_size
+                            ]
+                        pks = _insert_returning_pks(
+                            general_model, batch, fields, self.db,
+                            )
+                        for instance, pk in zip(batch, pks):
+                            setattr(instance, pk_attname, pk)
+                else:
+                    for instance in instances_without_pk:
+                        pk = general_model._base_manager._insert(
+                            [instance],
+                            fields=fields,
+                            return_id=True,
+                            using=self.db,
+                            )
+                        setattr(instance, pk_attname, pk)
+
+            # The tables of the specializations are written from the top of
+            # the hierarchy down, once the primary keys of their parents are
+            # known:
+            specialized_models = sorted(
+                (
+                    model for model in hierarchy.get_descendants(general_model)
+                    if not model._meta.proxy
+                    ),
+                key=hierarchy.get_depth,
+                )
+            for model in specialized_models:
+                model_instances = [
+                    instance for instance in instances if
+                    isinstance(instance, model)
+                    ]
+                parent_model = hierarchy.get_ancestors(model)[0]
+                parent_link = model._meta.parents[parent_model]
+                for instance in model_instances:
+                    setattr(
+                        instance,
+                        parent_link.attname,
+                        instance._get_pk_val(parent_model._meta),
+                        )
+
+                insert_rows(
+                    model, model_instances, model._meta.local_concrete_fields,
+                    )
+
+        for instance in instances:
+            instance._state.adding = False
+            instance._state.db = self.db
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        """
+        Customize the _clone method of QuerySet to ensure the value of
+        _final_specialization is copied across to the clone correctly.
+
+        :rtype: :class:`SpecializedQuerySet`
+
+        """
+
+        clone = super(SpecializedQuerySet, self)._clone(klass, setup, **kwargs)
+        clone._final_specialization = self._final_specialization
+        clone._type_cache = self._type_cache
+        clone._join_specializations = self._join_specializations
+        clone._chunk_size = self._chunk_size
+        clone._server_side_cursor = self._server_side_cursor
+        clone._parallel_workers = self._parallel_workers
+        clone._reuse_general_rows = self._reuse_general_rows
+        clone._lazy_specialization = self._lazy_specialization
+        clone._cache_alias = self._cache_alias
+        clone._cache_timeout = self._cache_timeout
+
+        return clone
+
+
+class SpecializationWorkerPool(object):
+    """
+    Pool of threads which fetch the specializations of a parallel queryset,
+    kept for a whole iteration so that each thread opens a single database
+    connection. The connections of the threads are closed along with the
+    pool.
+
+    The threads are only started when the pool is first used.
+
+    """
+
+    def __init__(self, max_workers):
+        """
+        :param max_workers: The number of threads
+        :type max_workers: :class:`int`
+
+        """
+
+        super(SpecializationWorkerPool, self).__init__()
+
+        self.max_workers = max_workers
+        self._pool = None
+
+    def map(self, function, args_list):
+        """
+        Call ``function`` with each item of ``args_list`` as arguments from
+        the threads of the pool.
+
+        :return: The results, in the order of ``args_list``
+        :rtype: :class:`list`
+
+        """
+
+        if self._pool is None:
+            self._pool = ThreadPool(self.max_workers)
+
+        return self._pool.map(partial(_call_with_args, function), args_list, 1)
+
+    def close(self):
+        """Close the database connections of the threads and stop them."""
+
+        pool = self._pool
+        if pool is None:
+            return
+        self._pool = None
+
+        try:
+            # Each thread waits for the others once it's closed its
+            # connections, so that no thread runs this twice:
+            barrier = _Barrier(self.max_workers)
+            pool.map(
+                partial(_close_thread_connections, barrier),
+                range(self.max_workers),
+                1,
+                )
+        finally:
+            pool.close()
+            pool.join()
+
+
+class _Barrier(object):
+    """Point which ``count`` threads have to reach before any goes on."""
+
+    def __init__(self, count):
+        super(_Barrier, self).__init__()
+
+        self._remaining_count = count
+        self._condition = Condition()
+
+    def wait(self):
+        with self._condition:
+            self._remaining_count -= 1
+            self._condition.notify_all()
+            while 0 < self._remaining_count:
+                self._condition.wait()
+
+
+class SpecializationFieldsLoader(object):
+    """
+    Load the fields which are not in the general model for lazily specialized
+    instances, with one query for all the instances of each specialization.
+
+    """
+
+    def __init__(self, general_model, get_related_lookups=None):
+        """
+        :param general_model: The model from which the instances were
+            specialized
+        :type general_model:
+            :class:`~djeneralize.models.BaseGeneralizationModel`
+        :param get_related_lookups: The callable which returns the lookups of
+            the related objects to prefetch along with the fields of a given
+            specialized model
+
+        """
+
+        super(SpecializationFieldsLoader, self).__init__()
+
+        self.general_model = general_model
+        self._get_related_lookups = get_related_lookups
+        self._instances_by_model = defaultdict(list)
+        self._deferred_attnames_by_model = {}
+        self._related_lookups_by_model = {}
+        self._lazy_attnames_by_model = {}
+
+    def add(self, instance):
+        """
+        Remove the fields which are not in the general model from ``instance``
+        so that they're loaded upon first access.
+
+        :param instance: The specialized instance built from the fields of the
+            general model only
+
+        """
+
+        deferred_attnames = self.get_deferred_attnames(instance.__class__)
+        if not deferred_attnames:
+            return
+
+        for attname in deferred_attnames:
+            del instance.__dict__[attname]
+        instance._specialization_fields_loader = self
+
+        self._instances_by_model[instance.__class__].append(instance)
+
+    def get_deferred_attnames(self, model):
+        """
+        Get the attribute names of the fields of ``model`` which are loaded
+        upon first access.
+
+        :rtype: :class:`frozenset`
+
+        """
+
+        try:
+            deferred_attnames = self._deferred_attnames_by_model[model]
+        except KeyError:
+            deferred_attnames = frozenset(
+                field.attname for field in
+                _get_specialization_fields(self.general_model, model)
+                )
+            self._deferred_attnames_by_model[model] = deferred_attnames
+
+        return deferred_attnames
+
+    def get_related_lookups(self, model):
+        """
+        Get the lookups of the related objects of ``model`` which are
+        prefetched along with its fields.
+
+        :rtype: :class:`list`
+
+        """
+
+        try:
+            related_lookups = self._related_lookups_by_model[model]
+        except KeyError:
+            if self._get_related_lookups is None:
+                related_lookups = []
+            else:
+                related_lookups = self._get_related_lookups(model)
+            self._related_lookups_by_model[model] = related_lookups
+
+        return related_lookups
+
+    def get_lazy_attnames(self, model):
+        """
+        Get the names of the attributes of ``model`` whose access triggers the
+        loading, i.e., the deferred attribute names and the names of the caches
+        of the related objects which are prefetched.
+
+        :rtype: :class:`frozenset`
+
+        """
+
+        try:
+            lazy_attnames = self._lazy_attnames_by_model[model]
+        except KeyError:
+            related_cache_names = [
+                model._meta.get_field(
+                    related_lookup.split(LOOKUP_SEP, 1)[0]
+                    ).get_cache_name()
+                for related_lookup in self.get_related_lookups(model)
+                ]
+            lazy_attnames = \
+                self.get_deferred_attnames(model).union(related_cache_names)
+            self._lazy_attnames_by_model[model] = lazy_attnames
+
+        return lazy_attnames
+
+    def load(self, model):
+        """
+        Load the missing fields of all the instances of ``model``.
+
+        :param model: The specialized model
+
+        """
+
+        instances = self._instances_by_model.pop(model, [])
+        if not instances:
+            return
+
+        specialization_values_by_pk = _fetch_specialization_values(
+            model, _get_specialization_fields(self.general_model, model),
+            [instance.pk for instance in instances],
+            )
+
+        for instance in instances:
+            instance.__dict__.update(specialization_values_by_pk[instance.pk])
+            del instance.__dict__['_specialization_fields_loader']
+
+        related_lookups = self.get_related_lookups(model)
+        if related_lookups:
+            prefetch_related_objects(instances, related_lookups)
+
+
+def _get_pk_lookup_value(model, lookup):
+    """
+    Get the primary key looked up by ``lookup``, if that's its only condition.
+
+    :param model: The model whose instances are looked up
+    :param lookup: The keyword arguments of the lookup
+    :type lookup: :class:`dict`
+    :return: The primary key or ``None``
+
+    """
+
+    if len(lookup) != 1:
+        return None
+
+    ((field_name, value),) = lookup.items()
+
+    exact_suffix = LOOKUP_SEP + 'exact'
+    if field_name.endswith(exact_suffix):
+        field_name = field_name[:-len(exact_suffix)]
+
+    if field_name in ('pk', model._meta.pk.attname):
+        return value
+
+    # The primary keys of the ancestors of the model are also valid:
+    try:
+        field = model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return None
+
+    return value if getattr(field, 'primary_key', False) else None
+
+
+def _has_field(model, field_name):
+    """
+    Check whether ``model`` has a field (or a reverse relation) called
+    ``field_name``.
+
+    :rtype: :class:`bool`
+
+    """
+
+    try:
+        model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return False
+
+    return True
+
+
+def _get_select_related(select_related, model):
+    """
+    Get the related objects in ``select_related`` which can be selected along
+    with ``model``.
+
+    :param select_related: The related objects to select, in the format of
+        :attr:`django.db.models.sql.Query.select_related`
+    :param model: The model whose instances are selected
+    :return: ``select_related`` without the fields which ``model`` doesn't
+        have
+
+    """
+
+    if not isinstance(select_related, dict):
+        return select_related
+
+    return dict(
+        (field_name, field_select_related) for
+        field_name, field_select_related in select_related.items() if
+        _has_field(model, field_name)
+        )
+
+
+def _get_default_select_related(fields, max_depth):
+    """
+    Get the related objects which Django selects when
+    :meth:`~django.db.models.query.QuerySet.select_related` is called without
+    arguments, i.e., those of the non-null foreign keys, starting from
+    ``fields``.
+
+    :param fields: The fields of the model whose instances are selected
+    :type fields: :class:`list`
+    :param max_depth: How many relations to follow
+    :type max_depth: :class:`int`
+    :rtype: :class:`dict`
+
+    """
+
+    select_related = {}
+
+    if max_depth < 1:
+        return select_related
+
+    for field in fields:
+        if not field.rel or field.rel.parent_link or field.null:
+            continue
+
+        select_related[field.name] = _get_default_select_related(
+            field.rel.to._meta.fields, max_depth - 1
+            )
+
+    return select_related
+
+
+def _get_select_related_lookups(select_related):
+    """
+    Turn ``select_related`` into the equivalent lookups for
+    :meth:`~django.db.models.query.QuerySet.prefetch_related`.
+
+    :param select_related: The related objects to select, in the format of
+        :attr:`django.db.models.sql.Query.select_related`
+    :type select_related: :class:`dict`
+    :rtype: :class:`list`
+
+    """
+
+    lookups = []
+
+    for field_name, field_select_related in select_related.items():
+        lookups.append(field_name)
+        lookups.extend(
+            LOOKUP_SEP.join((field_name, lookup)) for lookup in
+            _get_select_related_lookups(field_select_related)
+            )
+
+    return lookups
+
+
+def _get_specialization_fields(general_model, model):
+    """
+    Get the concrete fields of ``model`` which are not in ``general_model``,
+    excluding the links to the parents of ``model``, since their values are
+    the same as the primary key of the general model.
+
+    :rtype: :class:`list`
+
+    """
+
+    general_fields = set(general_model._meta.concrete_fields)
+
+    return [
+        field for field in model._meta.concrete_fields if
+        field not in general_fields and
+        not getattr(field.rel, 'parent_link', False)
+        ]
+
+
+def _fetch_specialization_values(model, fields, pks):
+    """
+    Fetch the values of ``fields`` for the instances of ``model`` with
+    ``pks``.
+
+    Only the tables of ``model`` and its ancestors which contain ``fields``
+    are used, since the primary key of ``model`` is in all of them.
+
+    :return: The values keyed by attribute name, keyed by primary key
+    :rtype: :class:`dict`
+
+    """
+
+    specialization_rows = model.objects.filter(pk__in=pks).order_by()\
+        .values_list('pk', *[field.name for field in fields])
+
+    attnames = [field.attname for field in fields]
+
+    with FetchRecorder(
+        specializations_fetched, model,
+        specialization=model.model_specialization, operation='in_bulk',
+        using=specialization_rows.db,
+        ) as recorder:
+        specialization_values_by_pk = dict(
+            (
+                specialization_row[0],
+                dict(zip(attnames, specialization_row[1:])),
+                )
+            for specialization_row in specialization_rows
+            )
+        recorder.row_count = len(specialization_values_by_pk)
+
+    return specialization_values_by_pk
+
+
+def _insert_returning_pks(model, instances, fields, using):
+    """
+    Insert the rows of ``instances`` into the table of ``model`` with a single
+    query which returns their primary keys, which is only supported by
+    PostgreSQL.
+
+    :param fields: The fields to insert
+    :type fields: :class:`list`
+    :param using: The alias of the database
+    :type using: :class:`str`
+    :return: The primary keys of the rows, in the order of ``instances``
+    :rtype: :class:`list`
+
+    """
+
+    query = InsertQuery(model)
+    query.insert_values(fields, instances)
+    compiler = query.get_compiler(using=using)
+    connection = compiler.connection
+
+    returning_sql, returning_params = connection.ops.return_insert_id()
+    returning_sql = \
+        returning_sql % connection.ops.quote_name(model._meta.pk.column)
+
+    pks = []
+    with connection.cursor() as cursor:
+        # There's one statement per row if a field requires its own
+        # placeholder:
+        for sql, params in compiler.as_sql():
+            cursor.execute(
+                '%s %s' % (sql, returning_sql),
+                tuple(params) + tuple(returning_params),
+                )
+            pks.extend(row[0] for row in cursor.fetchall())
+
+    return pks
+
+
+def _build_specialized_instance(
+    model, general_fields, general_instance, specialization_values):
+    """
+    Build an instance of ``model`` from the values of ``general_instance`` and
+    ``specialization_values``.
+
+    :param model: The specialized model
+    :param general_fields: The concrete fields of the general model
+    :type general_fields: :class:`set`
+    :param general_instance: The general model instance
+    :param specialization_values: The values of the fields which are not in
+        the general model keyed by attribute name, or ``None`` if they're not
+        known yet
+    :type specialization_values: :class:`dict`
+    :return: The specialized instance
+
+    """
+
+    values = []
+    for field in model._meta.concrete_fields:
+        if field in general_fields:
+            value = general_instance.__dict__[field.attname]
+        elif getattr(field.rel, 'parent_link', False):
+            value = general_instance.pk
+        elif specialization_values is None:
+            value = None
+        else:
+            value = specialization_values[field.attname]
+        values.append(value)
+
+    specialized_instance = model(*values)
+    specialized_instance._state.adding = False
+    specialized_instance._state.db = general_instance._state.db
+
+    return specialized_instance
+
+
+def _get_streaming_cursor(connection):
+    """
+    Get a cursor from which the results of a query can be fetched as they are
+    needed.
+
+    On PostgreSQL, this is a named (i.e., server-side) cursor, as the results of
+    regular cursors are all read by the client upon execution. Other backends
+    get a regular cursor, as the results of SQLite cursors are already read as
+    they are fetched.
+
+    :param connection: The connection to the database
+    :type connection: :class:`django.db.backends.BaseDatabaseWrapper`
+    :return: The cursor, wrapped like the cursors of ``connection``
+
+    """
+
+    if connection.vendor != 'postgresql':
+        return connection.cursor()
+
+    connection.ensure_connection()
+    # Server-side cursors must be declared "WITH HOLD" to be used outside of a
+    # transaction:
+    raw_cursor = connection.connection.cursor(
+        name='djeneralize_%s' % uuid4().hex,
+        withhold=connection.get_autocommit(),
+        )
+
+    if connection.queries_logged:
+        cursor = connection.make_debug_cursor(raw_cursor)
+    else:
+        cursor = connection.make_cursor(raw_cursor)
+    return cursor
+
+
+def _call_with_args(function, args):
+    return function(*args)
+
+
+def _close_thread_connections(barrier, index):
+    """
+    Close the database connections of the current thread of a pool and wait
+    for the other threads of the pool to do the same.
+
+    """
+
+    try:
+        for connection in connections.all():
+            connection.close()
+    finally:
+        barrier.wait()
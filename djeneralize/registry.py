@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Registry of the hierarchies of general models and their specializations"""
+
+from threading import Lock
+
+from djeneralize.utils import get_general_model
+
+__all__ = ['Hierarchy', 'get_hierarchy']
+
+
+_hierarchies = {}
+"""The hierarchies built so far, keyed by their general model"""
+
+_hierarchies_lock = Lock()
+
+
+class Hierarchy(object):
+    """
+    Immutable view of the hierarchy of a general model and all its
+    specializations, which answers the questions about the position of the
+    models in the hierarchy in constant time.
+
+    It is built from the specializations declared when the hierarchy is first
+    used, and rebuilt if another specialization is declared afterwards.
+
+    """
+
+    def __init__(self, general_model):
+        """
+        :param general_model: The general model of the hierarchy
+        :type general_model: :class:`~djeneralize.models.BaseGeneralizationModel`
+
+        """
+
+        super(Hierarchy, self).__init__()
+
+        self._general_model = general_model
+
+        # Sorting the models by path ensures that the parent of each model is
+        # processed before the model itself:
+        specialized_models = sorted(
+            general_model._meta.specializations.values(),
+            key=lambda model: model.model_specialization,
+            )
+
+        ancestors = {general_model: ()}
+        children = {general_model: []}
+        parent_link_lookups = {general_model: ()}
+        for model in specialized_models:
+            parent_model = model._generalized_parent
+
+            ancestors[model] = (parent_model,) + ancestors[parent_model]
+            children[model] = []
+            children[parent_model].append(model)
+
+            if model._meta.proxy:
+                # Proxy models are stored in the table of their parent, so
+                # there's no parent link to follow:
+                parent_link_lookups[model] = parent_link_lookups[parent_model]
+            else:
+                parent_link = model._meta.parents[parent_model]
+                parent_link_lookups[model] = \
+                    parent_link_lookups[parent_model] + \
+                    (parent_link.related_query_name(),)
+
+        descendants = dict((model, set()) for model in ancestors)
+        for model, model_ancestors in ancestors.items():
+            for ancestor in model_ancestors:
+                descendants[ancestor].add(model)
+
+        self._ancestors = ancestors
+        self._children = dict(
+            (model, tuple(model_children)) for model, model_children in
+            children.items()
+            )
+        self._descendants = dict(
+            (model, frozenset(model_descendants)) for model, model_descendants
+            in descendants.items()
+            )
+        self._subtrees = dict(
+            (model, model_descendants | frozenset([model])) for
+            model, model_descendants in self._descendants.items()
+            )
+        self._parent_link_lookups = parent_link_lookups
+        self._leaves = frozenset(
+            model for model, model_children in children.items() if
+            not model_children
+            )
+
+    @property
+    def general_model(self):
+        """The general model of the hierarchy"""
+
+        return self._general_model
+
+    @property
+    def leaves(self):
+        """
+        The models of the hierarchy which have no specializations.
+
+        :rtype: :class:`frozenset`
+
+        """
+
+        return self._leaves
+
+    def get_ancestors(self, model):
+        """
+        Get the models of which ``model`` is a specialization.
+
+        :param model: A model of the hierarchy
+        :return: The ancestors of ``model``, from its parent to the general
+            model
+        :rtype: :class:`tuple`
+
+        """
+
+        return self._ancestors[model]
+
+    def get_children(self, model):
+        """
+        Get the direct specializations of ``model``.
+
+        :param model: A model of the hierarchy
+        :return: The direct specializations of ``model``, ordered by path
+        :rtype: :class:`tuple`
+
+        """
+
+        return self._children[model]
+
+    def get_descendants(self, model):
+        """
+        Get all the specializations of ``model``, direct or not.
+
+        :param model: A model of the hierarchy
+        :rtype: :class:`frozenset`
+
+        """
+
+        return self._descendants[model]
+
+    def get_depth(self, model):
+        """
+        Get the number of levels between the general model and ``model``.
+
+        :param model: A model of the hierarchy
+        :return: The depth of ``model``, which is 0 for the general model
+        :rtype: :class:`int`
+
+        """
+
+        return len(self._ancestors[model])
+
+    def get_parent_link_lookups(self, model):
+        """
+        Get the names of the reverse parent links to follow from the general
+        model to reach ``model``.
+
+        :param model: A model of the hierarchy
+        :rtype: :class:`tuple`
+
+        """
+
+        return self._parent_link_lookups[model]
+
+    def is_leaf(self, model):
+        """
+        Report whether ``model`` has no specializations.
+
+        :param model: A model of the hierarchy
+        :rtype: :class:`bool`
+
+        """
+
+        return model in self._leaves
+
+    def is_in_subtree(self, model, root_model):
+        """
+        Report whether ``model`` is ``root_model`` or one of its
+        specializations.
+
+        :param model: A model of the hierarchy
+        :param root_model: A model of the hierarchy
+        :rtype: :class:`bool`
+
+        """
+
+        return model in self._subtrees[root_model]
+
+    def __contains__(self, model):
+        return model in self._ancestors
+
+
+def get_hierarchy(model):
+    """
+    Get the hierarchy which ``model`` belongs to.
+
+    :param model: The general model or one of its specializations
+    :type model: :class:`~djeneralize.models.BaseGeneralizationModel`
+    :rtype: :class:`Hierarchy`
+
+    """
+
+    general_model = get_general_model(model)
+
+    hierarchy = _hierarchies.get(general_model)
+    if hierarchy is None:
+        with _hierarchies_lock:
+            hierarchy = _hierarchies.get(general_model)
+            if hierarchy is None:
+                hierarchy = _hierarchies[general_model] = \
+                    Hierarchy(general_model)
+
+    return hierarchy
+
+
+#{ Signal handlers
+
+
+def discard_hierarchies(sender, **kwargs):
+    """
+    Discard the hierarchies built so far when a specialized model is prepared,
+    so that they're rebuilt with it.
+
+    """
+
+    with _hierarchies_lock:
+        _hierarchies.clear()
+
+
+#}
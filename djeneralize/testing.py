@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011,2013, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+"""Assertions about the queries which specialize model instances in tests"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db import router
+from django.test.utils import CaptureQueriesContext
+
+from djeneralize.instrumentation import FetchCollector
+from djeneralize.registry import get_hierarchy
+
+__all__ = ['assert_max_specialization_queries']
+
+
+@contextmanager
+def assert_max_specialization_queries(
+    model, max_queries=None, max_queries_per_specialization=None):
+    """
+    Assert that the block of this context manager makes at most
+    ``max_queries`` queries to load the instances in the hierarchy of
+    ``model`` and at most ``max_queries_per_specialization`` queries for each
+    specialization, e.g., to catch N+1 queries in
+    :class:`~djeneralize.fields.SpecializedForeignKey` fields::
+
+        with assert_max_specialization_queries(
+            FruitProducer, max_queries_per_specialization=1):
+            for shop in Shop.objects.select_specialized('producer'):
+                shop.producer.name
+
+    The queries are those reported by the signals in
+    :mod:`djeneralize.instrumentation` plus the other queries on the table of
+    the general model made by the current thread (e.g., by the
+    :class:`~django.db.models.ForeignKey` fields to the general model, or by
+    the :class:`~djeneralize.fields.SpecializedForeignKey` fields before
+    specializing the instance). The queries of the specialization types and
+    those of the general model count towards ``max_queries`` only.
+
+    :param model: The general model or one of its specializations
+    :type model: :class:`~djeneralize.models.BaseGeneralizationModel`
+    :param max_queries: The maximum number of queries in the hierarchy, or
+        ``None`` if it's not limited
+    :type max_queries: :class:`int`
+    :param max_queries_per_specialization: The maximum number of queries for
+        each specialization, or ``None`` if it's not limited
+    :type max_queries_per_specialization: :class:`int`
+    :return: The collector of the queries made in the block
+    :rtype: :class:`~djeneralize.instrumentation.FetchCollector`
+    :raises AssertionError: If there are more queries than expected, with the
+        number of queries made for each specialization
+
+    """
+
+    hierarchy = get_hierarchy(model)
+    general_model_meta = hierarchy.general_model._meta
+    connection = connections[router.db_for_read(hierarchy.general_model)]
+
+    with CaptureQueriesContext(connection) as query_context:
+        with FetchCollector() as collector:
+            yield collector
+
+    hierarchy_stats = [
+        stats for stats in collector.stats if stats.model in hierarchy
+        ]
+
+    # The queries of the specialization types of the general model are on its
+    # table too, so they're only counted once:
+    general_table_sql = \
+        'FROM %s' % connection.ops.quote_name(general_model_meta.db_table)
+    general_query_count = len([
+        query for query in query_context.captured_queries if
+        general_table_sql in query['sql']
+        ])
+    general_query_count -= sum(
+        stats.query_count for stats in hierarchy_stats if
+        stats.specialization is None and
+        stats.model._meta.db_table == general_model_meta.db_table
+        )
+    general_query_count = max(general_query_count, 0)
+
+    query_counts_by_specialization = OrderedDict()
+    for stats in hierarchy_stats:
+        if stats.specialization is not None:
+            query_counts_by_specialization[stats.specialization] = \
+                query_counts_by_specialization.get(stats.specialization, 0) + \
+                stats.query_count
+
+    general_model_name = general_model_meta.object_name
+    failures = []
+
+    query_count = general_query_count + \
+        sum(stats.query_count for stats in hierarchy_stats)
+    if max_queries is not None and max_queries < query_count:
+        failures.append(
+            "%s queries were made to load %s instances, expected at most %s" %
+            (query_count, general_model_name, max_queries)
+            )
+
+    if max_queries_per_specialization is not None:
+        for specialization, specialization_query_count in \
+            query_counts_by_specialization.items():
+            if max_queries_per_specialization < specialization_query_count:
+                failures.append(
+                    "%s queries were made for the specialization %s, expected "
+                    "at most %s" % (
+                        specialization_query_count, specialization,
+                        max_queries_per_specialization,
+                        )
+                    )
+
+    if failures:
+        stats_lines = _format_stats(hierarchy_stats)
+        if general_query_count:
+            stats_lines.append(
+                'Other queries of %s: %s queries' %
+                (general_model_name, general_query_count)
+                )
+        raise AssertionError('\n'.join(failures + [''] + stats_lines))
+
+
+def _format_stats(stats_list):
+    """
+    Describe the queries in ``stats_list``, grouped by specialization path.
+
+    :rtype: :class:`list` of :class:`str`
+
+    """
+
+    lines = []
+    sorted_stats_list = sorted(
+        stats_list,
+        key=lambda stats: (stats.specialization or '', stats.operation),
+        )
+    for stats in sorted_stats_list:
+        if stats.specialization is None:
+            label = \
+                'Specialization types of %s' % stats.model._meta.object_name
+        else:
+            label = stats.specialization
+        lines.append(
+            '%s (%s): %s queries, %s rows, %.3fs' % (
+                label, stats.operation, stats.query_count, stats.row_count,
+                stats.duration,
+                )
+            )
+
+    return lines
@@ -16,9 +16,15 @@
 
 """Utilities for djeneralize"""
 
+from zlib import crc32
+
 from django.http import Http404
 
-__all__ = ['find_next_path_down', 'get_specialization_or_404']
+__all__ = [
+    'find_next_path_down', 'get_direct_specialization_path',
+    'get_direct_specialization_paths', 'get_general_model',
+    'get_specialization_code', 'get_specialization_or_404',
+    ]
 
 
 def find_next_path_down(current_path, path_to_reduce, separator):
@@ -50,6 +56,83 @@ def find_next_path_down(current_path, path_to_reduce, separator):
         )
 
 
+def get_direct_specialization_path(model, path):
+    """
+    Get the path of the direct specialization of ``model`` which ``path``
+    belongs to, using the table precomputed when the specializations of
+    ``model`` were declared.
+
+    :param model: The general model or one of its specializations
+    :type model: :class:`~djeneralize.models.BaseGeneralizationModel`
+    :param path: The path of a specialization of ``model``
+    :type path: :class:`basestring`
+    :return: The path one level deeper than that of ``model``, or ``path``
+        itself if it isn't the path of a specialization of ``model``
+    :rtype: :class:`basestring`
+
+    """
+
+    return model._meta.direct_specialization_paths.get(path, path)
+
+
+def get_direct_specialization_paths(model, paths):
+    """
+    Get the paths of the direct specializations of ``model`` which each of
+    ``paths`` belongs to.
+
+    :param model: The general model or one of its specializations
+    :type model: :class:`~djeneralize.models.BaseGeneralizationModel`
+    :param paths: The paths of specializations of ``model``
+    :type paths: iterable
+    :return: The paths one level deeper than that of ``model``, in the same
+        order as ``paths``
+    :rtype: :class:`list`
+
+    .. seealso:: :func:`get_direct_specialization_path`
+
+    """
+
+    direct_specialization_paths = model._meta.direct_specialization_paths
+    return [
+        direct_specialization_paths.get(path, path) for path in paths
+        ]
+
+
+def get_specialization_code(path):
+    """
+    Get the integer code which represents ``path`` in the compact
+    ``specialization_type`` columns.
+
+    The code is derived from ``path`` alone, so that it doesn't depend on the
+    order in which the specializations are declared.
+
+    :param path: The path of a specialization
+    :type path: :class:`basestring`
+    :return: A positive integer which fits in a signed 32-bit column
+    :rtype: :class:`int`
+
+    """
+
+    return crc32(path.encode('utf-8')) & 0x7fffffff
+
+
+def get_general_model(model):
+    """
+    Get the general model of which ``model`` is a specialization.
+
+    :param model: The general model or one of its specializations
+    :type model: :class:`~djeneralize.models.BaseGeneralizationModel`
+    :return: The general model
+
+    """
+
+    model = model._meta.concrete_model
+    while getattr(model, '_generalized_parent', None):
+        model = model._generalized_parent
+
+    return model
+
+
 def _get_queryset(klass):
     """
     Returns a SpecializedQuerySet from a BaseGeneralizedModel sub-class,
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Generation of hierarchies of specialized models of varying width and depth,
+along with their tables and instances.
+
+"""
+
+from collections import namedtuple
+
+from django.db import connection
+from django.db import models
+
+from djeneralize.datasets import generate_instances
+from djeneralize.fields import SpecializedForeignKey
+from djeneralize.manager import SpecializedRelatedManager
+from djeneralize.models import BaseGeneralizationModel
+
+__all__ = ['GeneratedHierarchy', 'build_hierarchy', 'populate_hierarchy']
+
+
+APP_LABEL = 'benchmarks'
+
+
+GeneratedHierarchy = namedtuple(
+    'GeneratedHierarchy', ['general_model', 'models', 'holder_model'],
+    )
+"""
+The general model of a generated hierarchy, all its models (general model
+first) and the model which refers to it with a
+:class:`~djeneralize.fields.SpecializedForeignKey`
+
+"""
+
+
+def build_hierarchy(name, width, depth):
+    """
+    Generate a hierarchy in which every model but the leaves has ``width``
+    direct specializations, down to ``depth`` levels of specialization, and
+    create the tables of its models.
+
+    Like the models of the test apps, the general model has a ``name`` field
+    and each specialization adds a field of its own.
+
+    :param name: The name of the general model, used as a prefix for the
+        names of the other models
+    :type name: :class:`str`
+    :param width: The number of direct specializations of each model
+    :type width: :class:`int`
+    :param depth: The number of levels of specialization
+    :type depth: :class:`int`
+    :rtype: :class:`GeneratedHierarchy`
+
+    """
+
+    general_model = _make_model(
+        name, BaseGeneralizationModel,
+        {'name': models.CharField(max_length=30)},
+        )
+
+    hierarchy_models = [general_model]
+    parent_models = [general_model]
+    for level in range(1, depth + 1):
+        level_models = []
+        for parent_model in parent_models:
+            for index in range(width):
+                model_name = '%s%s' % (parent_model.__name__, index)
+                field_name = 'field_%s' % model_name.lower()
+                level_models.append(
+                    _make_model(
+                        model_name, parent_model,
+                        {field_name: models.IntegerField(default=level)},
+                        specialization='s%s' % index,
+                        )
+                    )
+        hierarchy_models.extend(level_models)
+        parent_models = level_models
+
+    holder_model = _make_model(
+        '%sHolder' % name, models.Model,
+        {
+            'specialized': SpecializedForeignKey(general_model),
+            'objects': SpecializedRelatedManager(),
+            },
+        )
+
+    with connection.schema_editor() as schema_editor:
+        for model in hierarchy_models + [holder_model]:
+            schema_editor.create_model(model)
+
+    return GeneratedHierarchy(general_model, hierarchy_models, holder_model)
+
+
+def populate_hierarchy(hierarchy, count):
+    """
+    Create ``count`` instances spread evenly across the leaves of
+    ``hierarchy``, and one holder of each of them.
+
+    :param hierarchy: The hierarchy to populate
+    :type hierarchy: :class:`GeneratedHierarchy`
+    :param count: The number of instances to create
+    :type count: :class:`int`
+
+    """
+
+    generate_instances(
+        dict(
+            (model, 1) for model in hierarchy.models if
+            not model._meta.specializations
+            ),
+        count,
+        )
+
+    hierarchy.holder_model.objects.bulk_create(
+        hierarchy.holder_model(specialized_id=pk) for pk in
+        hierarchy.general_model.objects.values_list('pk', flat=True)
+        )
+
+
+def _make_model(name, base, attrs, specialization=None):
+    meta_attrs = {'app_label': APP_LABEL}
+    if specialization is not None:
+        meta_attrs['specialization'] = specialization
+
+    attrs = dict(attrs, __module__=__name__, Meta=type('Meta', (), meta_attrs))
+    return type(str(name), (base,), attrs)
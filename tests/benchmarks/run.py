@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""
+Run the benchmarks of the strategies used to fetch specialized model
+instances and report the wall time, the number of queries and the peak memory
+of each scenario.
+
+"""
+
+from __future__ import print_function
+
+import os
+from argparse import ArgumentParser
+from collections import OrderedDict
+from time import sleep
+from timeit import default_timer
+
+import django
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2:
+    tracemalloc = None
+
+
+HIERARCHY_SHAPES = OrderedDict([
+    # Like the "fruit" app:
+    ('Flat', (2, 1)),
+    # Like the "writing" and "producers" apps:
+    ('Nested', (2, 2)),
+    ('Wide', (16, 1)),
+    ('Deep', (2, 4)),
+    ])
+"""The width and depth of the generated hierarchies, keyed by their name"""
+
+GET_COUNT = 100
+"""The number of instances got one at a time in the relevant scenarios"""
+
+
+#{ Scenarios
+
+
+def iterate(hierarchy, pks):
+    list(hierarchy.general_model.specializations.all())
+
+
+def iterate_joined(hierarchy, pks):
+    list(hierarchy.general_model.specializations.joined())
+
+
+def iterate_lazy(hierarchy, pks):
+    list(hierarchy.general_model.specializations.lazy())
+
+
+def iterate_reusing_general_rows(hierarchy, pks):
+    list(hierarchy.general_model.specializations.reuse_general_rows())
+
+
+def iterate_chunked(hierarchy, pks):
+    for _ in hierarchy.general_model.specializations.chunked(500).iterator():
+        pass
+
+
+def get(hierarchy, pks):
+    for pk in pks[:GET_COUNT]:
+        hierarchy.general_model.specializations.get(pk=pk)
+
+
+def get_joined(hierarchy, pks):
+    for pk in pks[:GET_COUNT]:
+        hierarchy.general_model.specializations.joined().get(pk=pk)
+
+
+def get_as_specialization(hierarchy, pks):
+    general_model = hierarchy.general_model
+    for general_instance in general_model.objects.filter(pk__in=pks[:GET_COUNT]):
+        general_instance.get_as_specialization()
+
+
+def access_foreign_key(hierarchy, pks):
+    for holder in hierarchy.holder_model.objects.all()[:GET_COUNT]:
+        holder.specialized
+
+
+def select_specialized(hierarchy, pks):
+    holders = hierarchy.holder_model.objects.select_specialized()
+    for holder in holders[:GET_COUNT]:
+        holder.specialized
+
+
+SCENARIOS = OrderedDict([
+    ('iterator', iterate),
+    ('iterator-joined', iterate_joined),
+    ('iterator-lazy', iterate_lazy),
+    ('iterator-reuse-general-rows', iterate_reusing_general_rows),
+    ('iterator-chunked', iterate_chunked),
+    ('get', get),
+    ('get-joined', get_joined),
+    ('get-as-specialization', get_as_specialization),
+    ('foreign-key', access_foreign_key),
+    ('select-specialized', select_specialized),
+    ])
+
+
+#{ Measurements
+
+
+def measure_time(scenario, hierarchy, pks, repeat):
+    """
+    Get the best wall time of ``repeat`` runs of ``scenario``, in seconds.
+
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start_time = default_timer()
+        scenario(hierarchy, pks)
+        timings.append(default_timer() - start_time)
+
+    return min(timings)
+
+
+def measure_queries(scenario, hierarchy, pks):
+    """Get the number of queries run by ``scenario``."""
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        scenario(hierarchy, pks)
+
+    return len(context.captured_queries)
+
+
+def measure_peak_memory(scenario, hierarchy, pks):
+    """
+    Get the peak memory allocated while running ``scenario``, in bytes, or
+    ``None`` if it can't be traced.
+
+    """
+
+    if tracemalloc is None:
+        return None
+
+    tracemalloc.start()
+    try:
+        scenario(hierarchy, pks)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return peak_memory
+
+
+def simulate_latency(latency):
+    """
+    Delay every query by ``latency`` seconds, as a round trip to a database
+    server would.
+
+    """
+
+    from django.db.backends.utils import CursorWrapper
+
+    execute = CursorWrapper.execute
+    executemany = CursorWrapper.executemany
+
+    def execute_with_latency(self, sql, params=None):
+        sleep(latency)
+        return execute(self, sql, params)
+
+    def executemany_with_latency(self, sql, param_list):
+        sleep(latency)
+        return executemany(self, sql, param_list)
+
+    CursorWrapper.execute = execute_with_latency
+    CursorWrapper.executemany = executemany_with_latency
+
+
+#}
+
+
+def run_benchmarks(count, repeat, scenario_names, hierarchy_names):
+    """
+    Generate the hierarchies called ``hierarchy_names``, populate them with
+    ``count`` instances each and run the scenarios called ``scenario_names``
+    against them.
+
+    :return: The results of each scenario run against each hierarchy, as
+        ``(hierarchy name, scenario name, seconds, queries, peak bytes)``
+    :rtype: :class:`list`
+
+    """
+
+    from tests.benchmarks.hierarchies import build_hierarchy
+    from tests.benchmarks.hierarchies import populate_hierarchy
+
+    results = []
+    for hierarchy_name in hierarchy_names:
+        width, depth = HIERARCHY_SHAPES[hierarchy_name]
+        hierarchy = build_hierarchy(hierarchy_name, width, depth)
+        populate_hierarchy(hierarchy, count)
+
+        pks = list(
+            hierarchy.general_model.objects.order_by('?')
+            .values_list('pk', flat=True)
+            )
+
+        for scenario_name in scenario_names:
+            scenario = SCENARIOS[scenario_name]
+            results.append((
+                hierarchy_name,
+                scenario_name,
+                measure_time(scenario, hierarchy, pks, repeat),
+                measure_queries(scenario, hierarchy, pks),
+                measure_peak_memory(scenario, hierarchy, pks),
+                ))
+
+    return results
+
+
+def format_results(results):
+    lines = ['%-8s %-28s %10s %8s %12s' % (
+        'Shape', 'Scenario', 'Seconds', 'Queries', 'Peak KiB',
+        )]
+    for hierarchy_name, scenario_name, seconds, queries, peak_memory in \
+        results:
+        lines.append('%-8s %-28s %10.4f %8d %12s' % (
+            hierarchy_name,
+            scenario_name,
+            seconds,
+            queries,
+            '-' if peak_memory is None else '%.1f' % (peak_memory / 1024.0),
+            ))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--count', type=int, default=2000,
+        help='The number of instances in each hierarchy',
+        )
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='The number of timed runs of each scenario',
+        )
+    parser.add_argument(
+        '--scenario', action='append', choices=list(SCENARIOS),
+        help='The scenarios to run (all by default)',
+        )
+    parser.add_argument(
+        '--shape', action='append', choices=list(HIERARCHY_SHAPES),
+        help='The shapes of the hierarchies to generate (all by default)',
+        )
+    parser.add_argument(
+        '--database',
+        help='The path to a new SQLite database file to use instead of an '
+            'in-memory database',
+        )
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='The simulated round-trip time of each query, in milliseconds',
+        )
+    arguments = parser.parse_args(argv)
+
+    if arguments.database:
+        if os.path.exists(arguments.database):
+            parser.error('%s already exists' % arguments.database)
+        os.environ['DJENERALIZE_BENCHMARKS_DATABASE'] = arguments.database
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.benchmarks.settings'
+    django.setup()
+
+    if arguments.latency:
+        simulate_latency(arguments.latency / 1000.0)
+
+    results = run_benchmarks(
+        arguments.count,
+        arguments.repeat,
+        arguments.scenario or list(SCENARIOS),
+        arguments.shape or list(HIERARCHY_SHAPES),
+        )
+    print(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@
 #
 ##############################################################################
 from tests.test_djeneralize.producers.models import EcoProducer
+from tests.test_djeneralize.producers.models import StandardProducer
 from tests.test_djeneralize.fruit.models import Banana
 
 """Fixtures for djeneralize tests"""
@@ -24,7 +25,8 @@ from fixture import DataSet
 
 __all__ = [
     'PenData', 'FountainPenData', 'BallPointPenData', 'PencilData',
-    'EcoProducerData', 'ShopData'
+    'SharpenerData', 'EcoProducerData', 'StandardProducerData', 'ShopData',
+    'CarrotData', 'PotatoData', 'NewPotatoData',
     ]
 
 
@@ -97,6 +99,20 @@ class PencilData(DataSet):
         lead = 'H5'
 
 
+class SharpenerData(DataSet):
+
+    class Meta:
+        django_model = 'writing.Sharpener'
+
+    class Staedtler:
+        name = 'Staedtler'
+        pencil = PencilData.Technical
+
+    class Faber:
+        name = 'Faber'
+        pencil = PencilData.Technical
+
+
 class BananaData(DataSet):
 
     class Meta:
@@ -119,6 +135,20 @@ class EcoProducerData(DataSet):
         produce = BananaData.Banana
         pen = PenData.GeneralPen
         fertilizer = 'Love'
+        pencil = PencilData.Technical
+
+
+class StandardProducerData(DataSet):
+
+    class Meta:
+        django_model = 'producers.StandardProducer'
+
+    class BananaProducer:
+        specialization_type = StandardProducer.model_specialization
+        name = 'Standard Producer'
+        produce = BananaData.Banana
+        pen = FountainPenData.MontBlanc
+        chemicals = 'Pesticide'
 
 
 class ShopData(DataSet):
@@ -129,3 +159,41 @@ class ShopData(DataSet):
     class EcoMart:
         name = 'EcoMart'
         producer = EcoProducerData.BananaProducer
+
+    class StandardMart:
+        name = 'StandardMart'
+        producer = StandardProducerData.BananaProducer
+
+
+class CarrotData(DataSet):
+
+    class Meta:
+        django_model = 'fruit.Carrot'
+
+    class Chantenay:
+        specialization_type = '/carrot/'
+        name = 'Chantenay'
+        colour = 'Orange'
+
+
+class PotatoData(DataSet):
+
+    class Meta:
+        django_model = 'fruit.Potato'
+
+    class Maris:
+        specialization_type = '/potato/'
+        name = 'Maris Piper'
+        variety = 'Floury'
+
+
+class NewPotatoData(DataSet):
+
+    class Meta:
+        django_model = 'fruit.NewPotato'
+
+    class Jersey:
+        specialization_type = '/potato/new_potato/'
+        name = 'Jersey Royal'
+        variety = 'Waxy'
+        harvest_week = 18
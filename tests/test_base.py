@@ -15,7 +15,13 @@
 ##############################################################################
 from itertools import chain
 
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models.aggregates import Count
+from django.db.models.expressions import F
 from django.http.response import Http404
+from django.test.testcases import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from fixture.django_testcase import FixtureTestCase
 from nose.tools import assert_false
 from nose.tools import assert_not_equal
@@ -24,12 +30,32 @@ from nose.tools import eq_
 from nose.tools import ok_
 from nose.tools import raises
 
+from djeneralize import query
 from djeneralize.utils import find_next_path_down
+from djeneralize.utils import get_direct_specialization_path
+from djeneralize.utils import get_direct_specialization_paths
+from djeneralize.utils import get_specialization_code
 from djeneralize.utils import get_specialization_or_404
 from tests.fixtures import BallPointPenData
+from tests.fixtures import CarrotData
+from tests.fixtures import EcoProducerData
 from tests.fixtures import FountainPenData
+from tests.fixtures import NewPotatoData
 from tests.fixtures import PenData
 from tests.fixtures import PencilData
+from tests.fixtures import PotatoData
+from tests.fixtures import SharpenerData
+from tests.fixtures import StandardProducerData
+from tests.test_djeneralize.fruit.models import Apple
+from tests.test_djeneralize.fruit.models import BakingPotato
+from tests.test_djeneralize.fruit.models import Carrot
+from tests.test_djeneralize.fruit.models import Fruit
+from tests.test_djeneralize.fruit.models import NewPotato
+from tests.test_djeneralize.fruit.models import Potato
+from tests.test_djeneralize.fruit.models import Vegetable
+from tests.test_djeneralize.producers.models import EcoProducer
+from tests.test_djeneralize.producers.models import FruitProducer
+from tests.test_djeneralize.producers.models import StandardProducer
 from tests.test_djeneralize.writing.models import BallPointPen
 from tests.test_djeneralize.writing.models import FountainPen
 from tests.test_djeneralize.writing.models import Pen
@@ -40,6 +66,7 @@ from tests.test_djeneralize.writing.models import base_generalization_with_speci
 from tests.test_djeneralize.writing.models import invalid_specialization_factory
 from tests.test_djeneralize.writing.models import no_meta_factory
 from tests.test_djeneralize.writing.models import no_specialization_factory
+from tests.test_djeneralize.writing.models import specialized_compact_specialization_type_factory
 
 
 class TestMetaclass(object):
@@ -149,6 +176,88 @@ class TestMetaclass(object):
 
         base_generalization_with_specialization_factory()
 
+    @raises(TypeError)
+    def test_specialized_compact_specialization_type(self):
+        """
+        It is not permissible to declare compact_specialization_type if the
+        model is a specialization.
+
+        """
+
+        specialized_compact_specialization_type_factory()
+
+    def test_direct_specialization_paths(self):
+        """
+        The paths of the direct specializations are precomputed for each
+        descendant of a model.
+
+        """
+
+        eq_(
+            WritingImplement._meta.direct_specialization_paths,
+            {
+                Pen.model_specialization: Pen.model_specialization,
+                Pencil.model_specialization: Pencil.model_specialization,
+                FountainPen.model_specialization: Pen.model_specialization,
+                BallPointPen.model_specialization: Pen.model_specialization,
+                },
+            )
+        eq_(
+            Pen._meta.direct_specialization_paths,
+            {
+                FountainPen.model_specialization:
+                    FountainPen.model_specialization,
+                BallPointPen.model_specialization:
+                    BallPointPen.model_specialization,
+                },
+            )
+        eq_(FountainPen._meta.direct_specialization_paths, {})
+
+
+class TestDirectSpecializationPath(object):
+    """Tests for get_direct_specialization_path(s)."""
+
+    def test_descendant(self):
+        """The paths of the descendants are reduced to the direct child"""
+
+        eq_(
+            get_direct_specialization_path(
+                WritingImplement, FountainPen.model_specialization,
+                ),
+            Pen.model_specialization,
+            )
+        eq_(
+            get_direct_specialization_path(
+                Pen, FountainPen.model_specialization,
+                ),
+            FountainPen.model_specialization,
+            )
+
+    def test_unknown_path(self):
+        """Paths which aren't of a descendant are returned unchanged"""
+
+        eq_(
+            get_direct_specialization_path(Pen, Pencil.model_specialization),
+            Pencil.model_specialization,
+            )
+
+    def test_batch(self):
+        """Batches of paths are mapped in order"""
+
+        paths = [
+            BallPointPen.model_specialization, Pencil.model_specialization,
+            FountainPen.model_specialization, Pen.model_specialization,
+            ]
+
+        eq_(
+            get_direct_specialization_paths(WritingImplement, paths),
+            [
+                Pen.model_specialization, Pencil.model_specialization,
+                Pen.model_specialization, Pen.model_specialization,
+                ],
+            )
+        eq_(get_direct_specialization_paths(WritingImplement, iter([])), [])
+
 
 class TestFindNextPathDown(object):
     """Tests for find_next_path_down."""
@@ -220,6 +329,70 @@ class TestModelInstance(FixtureTestCase):
             montblanc_special
             )
 
+    def test_specialize_many(self):
+        """
+        specialize_many() returns the final specializations of the instances,
+        in order, with one query per specialization.
+
+        """
+
+        writing_implements = list(WritingImplement.objects.order_by('name'))
+
+        with self.assertNumQueries(4):
+            specialized_writing_implements = \
+                WritingImplement.specialize_many(writing_implements)
+
+        expected_writing_implements = list(
+            WritingImplement.specializations.order_by('name')
+            )
+        eq_(specialized_writing_implements, expected_writing_implements)
+        eq_(
+            [wi.__class__ for wi in specialized_writing_implements],
+            [wi.__class__ for wi in expected_writing_implements],
+            )
+
+    def test_specialize_many_direct(self):
+        """
+        specialize_many() can get the direct specializations by setting
+        final_specialization=False.
+
+        """
+
+        pens = Pen.objects.order_by('name')
+        writing_implements = WritingImplement.objects.filter(
+            name__in=[pen.name for pen in pens],
+            ).order_by('name')
+
+        eq_(
+            [wi.__class__ for wi in WritingImplement.specialize_many(
+                writing_implements, final_specialization=False,
+                )],
+            [Pen] * len(pens),
+            )
+        eq_(
+            [pen.__class__ for pen in Pen.specialize_many(
+                pens, final_specialization=False,
+                )],
+            [BallPointPen, Pen, FountainPen, BallPointPen, FountainPen],
+            )
+
+    def test_specialize_many_specialized(self):
+        """
+        Instances which are already specialized are returned unchanged, without
+        querying the database.
+
+        """
+
+        pencils = list(Pencil.objects.all())
+
+        with self.assertNumQueries(0):
+            specialized_pencils = WritingImplement.specialize_many(pencils)
+
+        eq_(
+            [id(pencil) for pencil in specialized_pencils],
+            [id(pencil) for pencil in pencils],
+            )
+
     def test_default_specialization_type(self):
         """
         Ensure that the default specialization type is correctly set at
@@ -362,6 +535,81 @@ class TestSpecializedQueryset(FixtureTestCase):
         for expected_name, wi in zip(expected_names, filtered_writing_implements):
             eq_(expected_name, wi.name)
 
+    def test_of_type(self):
+        """
+        of_type() filters the queryset by the subtree of the model given.
+
+        """
+
+        pens = WritingImplement.specializations.of_type(Pen).order_by('name')
+
+        eq_(
+            [pen.name for pen in pens],
+            ['Bic', 'General pen', 'Mont Blanc', 'Papermate', 'Parker'],
+            )
+        eq_(
+            pens.query.where.children[0].rhs,
+            [
+                Pen.model_specialization, BallPointPen.model_specialization,
+                FountainPen.model_specialization,
+                ],
+            )
+
+        eq_(
+            set(
+                pen.name for pen in
+                WritingImplement.specializations.of_type(FountainPen)
+                ),
+            set(['Mont Blanc', 'Parker']),
+            )
+
+    def test_of_type_without_descendants(self):
+        """
+        of_type() only matches the model itself if its descendants are
+        excluded.
+
+        """
+
+        pens = WritingImplement.specializations.direct().of_type(
+            Pen, include_descendants=False,
+            )
+
+        eq_([pen.name for pen in pens], ['General pen'])
+
+    def test_of_type_own_model(self):
+        """of_type() doesn't filter by the subtree of the model queried"""
+
+        pens = Pen.specializations.of_type(Pen)
+
+        eq_(len(pens.query.where.children), 0)
+        eq_(pens.count(), 5)
+
+    def test_of_type_prefix(self):
+        """
+        of_type() matches the paths by their prefix when there are too many of
+        them.
+
+        """
+
+        original_max_paths = query.MAX_EXACT_SPECIALIZATION_PATHS
+        query.MAX_EXACT_SPECIALIZATION_PATHS = 2
+        try:
+            pens = WritingImplement.specializations.of_type(Pen)
+        finally:
+            query.MAX_EXACT_SPECIALIZATION_PATHS = original_max_paths
+
+        eq_(pens.query.where.children[0].lookup_name, 'startswith')
+        eq_(pens.count(), 5)
+
+    def test_of_type_unrelated_model(self):
+        """Only the model queried and its specializations can be given"""
+
+        assert_raises(ValueError, Pen.specializations.of_type, Pencil)
+        assert_raises(
+            ValueError, Pen.specializations.of_type, WritingImplement,
+            )
+        assert_raises(ValueError, Pen.specializations.of_type, FruitProducer)
+
     def test_get_final(self):
         """
         Calling get() returns the final specialization when calling the
@@ -397,6 +645,408 @@ class TestSpecializedQueryset(FixtureTestCase):
 
         eq_(mont_blanc.__class__, FountainPen)
 
+    def test_get_queries(self):
+        """
+        Calling get() fetches the specialization type and then the instance
+        from the tables of its specialization only.
+
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            mont_blanc = WritingImplement.specializations.get(
+                name='Mont Blanc'
+                )
+
+        eq_(mont_blanc.__class__, FountainPen)
+        eq_(mont_blanc.nib_width, FountainPenData.MontBlanc.nib_width)
+        eq_(len(context.captured_queries), 2)
+        ok_(
+            'writing_pencil' not in context.captured_queries[1]['sql'] and
+            'writing_ballpointpen' not in context.captured_queries[1]['sql']
+            )
+
+        with self.assertNumQueries(2):
+            mont_blanc = WritingImplement.specializations.direct().get(
+                name='Mont Blanc'
+                )
+            eq_(mont_blanc.__class__, Pen)
+            eq_(mont_blanc.ink_colour, FountainPenData.MontBlanc.ink_colour)
+
+    def test_get_joined(self):
+        """
+        Calling get() on a joined queryset resolves the specialization and
+        fetches its fields in a single query.
+
+        """
+
+        with self.assertNumQueries(1):
+            mont_blanc = WritingImplement.specializations.joined().get(
+                name='Mont Blanc'
+                )
+            eq_(mont_blanc.__class__, FountainPen)
+            eq_(mont_blanc.nib_width, FountainPenData.MontBlanc.nib_width)
+
+        with self.assertNumQueries(1):
+            mont_blanc = WritingImplement.specializations.direct().joined()\
+                .get(name='Mont Blanc')
+            eq_(mont_blanc.__class__, Pen)
+            eq_(mont_blanc.ink_colour, FountainPenData.MontBlanc.ink_colour)
+
+    def test_get_specialization_type(self):
+        """
+        Calling get() with the specialization type only queries the table of
+        that specialization.
+
+        """
+
+        with self.assertNumQueries(1):
+            mont_blanc = WritingImplement.specializations.get(
+                name='Mont Blanc',
+                specialization_type=FountainPen.model_specialization,
+                )
+
+        eq_(mont_blanc.__class__, FountainPen)
+
+    def test_get_non_final_specialization_type(self):
+        """
+        Calling get() with the specialization type of an ancestor of the
+        specialization of the instance gets it as that ancestor.
+
+        """
+
+        mont_blanc = WritingImplement.specializations.get(
+            name=FountainPenData.MontBlanc.name,
+            specialization_type=Pen.model_specialization,
+            )
+
+        eq_(mont_blanc.__class__, Pen)
+        eq_(mont_blanc.ink_colour, FountainPenData.MontBlanc.ink_colour)
+
+    def test_get_errors(self):
+        """
+        Calling get() raises the exceptions of the general model when no
+        instance or several instances match.
+
+        """
+
+        assert_raises(
+            WritingImplement.DoesNotExist,
+            WritingImplement.specializations.get, name='Non-existent',
+            )
+        assert_raises(
+            WritingImplement.MultipleObjectsReturned,
+            WritingImplement.specializations.get, length__gt=0,
+            )
+
+    def test_joined_final(self):
+        """
+        Calling joined() returns the final specializations, with all their
+        fields, in a single query.
+
+        """
+
+        with self.assertNumQueries(1):
+            writing_implements = list(
+                WritingImplement.specializations.joined().order_by('length')
+                )
+
+        expected_writing_implements = list(
+            WritingImplement.specializations.order_by('length')
+            )
+
+        eq_(writing_implements, expected_writing_implements)
+
+        for wi, expected_wi in zip(
+            writing_implements, expected_writing_implements):
+            eq_(wi.__class__, expected_wi.__class__)
+
+            dataset = self.datasets[wi.name]
+
+            for field_name, value in dataset.__dict__.items():
+                if field_name.startswith('_') or field_name == 'ref':
+                    continue
+
+                eq_(getattr(wi, field_name), value)
+
+    def test_joined_direct(self):
+        """
+        Calling joined() on a queryset of direct specializations only returns
+        the direct specializations.
+
+        """
+
+        models = set(
+            wi.__class__ for wi in
+            WritingImplement.specializations.joined().direct()
+            )
+
+        eq_(models, set([Pen, Pencil]))
+
+        mont_blanc = Pen.specializations.direct().joined().get(
+            name='Mont Blanc'
+            )
+
+        eq_(mont_blanc.__class__, FountainPen)
+
+    def test_joined_extra(self):
+        """Queries added with .extra() are set on the joined specializations"""
+
+        writing_implement = WritingImplement.specializations.joined().extra(
+            select={'extra_field': 'SELECT 1'},
+            )[0]
+
+        eq_(writing_implement.extra_field, 1)
+
+    def test_chunked(self):
+        """
+        Calling chunked() returns the same specializations, in the same order,
+        as when the queryset is not chunked.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')
+
+        chunked_writing_implements = \
+            list(writing_implements.chunked(size=2).iterator())
+
+        eq_(chunked_writing_implements, list(writing_implements))
+        eq_(
+            [wi.__class__ for wi in chunked_writing_implements],
+            [wi.__class__ for wi in writing_implements],
+            )
+
+    def test_chunked_windows(self):
+        """
+        The specializations of a chunked queryset are fetched one window at a
+        time.
+
+        """
+
+        # One query for the types and ids, and one for each of the two pencils
+        with self.assertNumQueries(3):
+            pencils = list(
+                WritingImplement.specializations.filter(
+                    specialization_type=Pencil.model_specialization,
+                    ).chunked(size=1).iterator()
+                )
+
+        eq_(len(pencils), 2)
+
+    def test_chunked_server_side_cursor(self):
+        """
+        Streaming the specialization types and ids from a cursor gives the same
+        specializations, in the same order, as when they're read in one go.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')
+
+        streamed_writing_implements = list(
+            writing_implements.chunked(size=2, server_side_cursor=True)
+            .iterator()
+            )
+
+        eq_(streamed_writing_implements, list(writing_implements))
+
+    def test_chunked_server_side_cursor_extra_ordering(self):
+        """
+        The specialization types and ids are streamed correctly when the
+        queryset is ordered by a field from an "extra" statement.
+
+        """
+
+        writing_implements = WritingImplement.specializations.extra(
+            select={'extra_field': 'SELECT 1'},
+            ).order_by('-extra_field', 'name')
+
+        streamed_writing_implements = list(
+            writing_implements.chunked(size=3, server_side_cursor=True)
+            .iterator()
+            )
+
+        eq_(streamed_writing_implements, list(writing_implements))
+        eq_(streamed_writing_implements[0].extra_field, 1)
+
+    def test_chunked_server_side_cursor_empty(self):
+        """Streaming an empty queryset gives no specializations"""
+
+        writing_implements = WritingImplement.specializations.filter(
+            pk__in=[],
+            ).chunked(server_side_cursor=True)
+
+        eq_(list(writing_implements.iterator()), [])
+
+    def test_chunked_invalid_size(self):
+        """The chunk size must be a positive number"""
+
+        assert_raises(
+            ValueError, WritingImplement.specializations.chunked, size=0
+            )
+
+    def test_parallel_in_transaction(self):
+        """
+        Calling parallel() inside a transaction returns the same
+        specializations, in the same order, as a sequential queryset.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')
+
+        parallel_writing_implements = list(writing_implements.parallel())
+
+        eq_(parallel_writing_implements, list(writing_implements))
+        eq_(
+            [wi.__class__ for wi in parallel_writing_implements],
+            [wi.__class__ for wi in writing_implements],
+            )
+
+    def test_parallel_invalid_max_workers(self):
+        """The number of workers must be a positive number"""
+
+        assert_raises(
+            ValueError, WritingImplement.specializations.parallel,
+            max_workers=0,
+            )
+
+    def test_reuse_general_rows(self):
+        """
+        Calling reuse_general_rows() returns the final specializations, with
+        all their fields, in the same order as a regular queryset.
+
+        """
+
+        writing_implements = list(
+            WritingImplement.specializations.reuse_general_rows()
+            .order_by('name')
+            )
+
+        expected_writing_implements = list(
+            WritingImplement.specializations.order_by('name')
+            )
+
+        eq_(writing_implements, expected_writing_implements)
+
+        for wi, expected_wi in zip(
+            writing_implements, expected_writing_implements):
+            eq_(wi.__class__, expected_wi.__class__)
+
+            for field in wi._meta.concrete_fields:
+                eq_(
+                    getattr(wi, field.attname),
+                    getattr(expected_wi, field.attname),
+                    )
+
+    def test_reuse_general_rows_queries(self):
+        """
+        The table of the general model is only read once when calling
+        reuse_general_rows().
+
+        """
+
+        with CaptureQueriesContext(connection) as captured_queries:
+            list(WritingImplement.specializations.reuse_general_rows())
+
+        general_table_name = \
+            connection.ops.quote_name(WritingImplement._meta.db_table)
+
+        # One query for the general model and one for each specialization:
+        eq_(len(captured_queries), 5)
+        for captured_query in captured_queries[1:]:
+            ok_(general_table_name not in captured_query['sql'])
+
+    def test_reuse_general_rows_direct(self):
+        """
+        Calling reuse_general_rows() on a queryset of direct specializations
+        only returns the direct specializations.
+
+        """
+
+        models = set(
+            wi.__class__ for wi in
+            WritingImplement.specializations.reuse_general_rows().direct()
+            )
+
+        eq_(models, set([Pen, Pencil]))
+
+    def test_reuse_general_rows_extra(self):
+        """
+        Queries added with .extra() are set on the specializations when calling
+        reuse_general_rows().
+
+        """
+
+        writing_implement = WritingImplement.specializations.extra(
+            select={'extra_field': 'SELECT 1'},
+            ).reuse_general_rows()[0]
+
+        eq_(writing_implement.extra_field, 1)
+
+    def test_lazy_general_fields(self):
+        """
+        Calling lazy() returns the final specializations in a single query
+        when only the fields of the general model are used.
+
+        """
+
+        with self.assertNumQueries(1):
+            writing_implements = list(
+                WritingImplement.specializations.lazy().order_by('name')
+                )
+            names = [wi.name for wi in writing_implements]
+            pks = [wi.pk for wi in writing_implements]
+
+        expected_writing_implements = list(
+            WritingImplement.specializations.order_by('name')
+            )
+
+        eq_(names, [wi.name for wi in expected_writing_implements])
+        eq_(pks, [wi.pk for wi in expected_writing_implements])
+        eq_(
+            [wi.__class__ for wi in writing_implements],
+            [wi.__class__ for wi in expected_writing_implements],
+            )
+
+    def test_lazy_specialization_fields(self):
+        """
+        The fields which are not in the general model are loaded for all the
+        instances of the same specialization upon first access.
+
+        """
+
+        writing_implements = list(
+            WritingImplement.specializations.lazy().order_by('name')
+            )
+        fountain_pens = [
+            wi for wi in writing_implements if isinstance(wi, FountainPen)
+            ]
+
+        with self.assertNumQueries(1):
+            for fountain_pen in fountain_pens:
+                dataset = self.datasets[fountain_pen.name]
+                eq_(fountain_pen.nib_width, dataset.nib_width)
+                eq_(fountain_pen.ink_colour, dataset.ink_colour)
+
+        pencil = Pencil.objects.get(name=PencilData.Technical.name)
+        lazy_pencil = [
+            wi for wi in writing_implements if wi.name == pencil.name
+            ][0]
+
+        with self.assertNumQueries(1):
+            eq_(lazy_pencil.lead, pencil.lead)
+
+    def test_lazy_missing_attribute(self):
+        """
+        Accessing an attribute which doesn't exist on a lazily specialized
+        instance raises AttributeError.
+
+        """
+
+        writing_implement = WritingImplement.specializations.lazy()[0]
+
+        assert_raises(
+            AttributeError, getattr, writing_implement, 'non_existing'
+            )
+
     def test_final(self):
         """
         Calling the final() method on the manager or queryset ensures that the
@@ -424,11 +1074,48 @@ class TestSpecializedQueryset(FixtureTestCase):
         assert_false(qs._final_specialization)
 
     def test_annotate(self):
-        """Annotation is not possible for SpecializedQuerySets"""
+        """
+        Annotations are computed on the general model and copied to the
+        specialized instances.
 
-        assert_raises(
-            NotImplementedError, WritingImplement.specializations.annotate
-            )
+        """
+
+        writing_implements = WritingImplement.specializations.annotate(
+            double_length=F('length') * 2,
+            producer_count=Count('fruitproducer'),
+            ).order_by('name')
+
+        expected_writing_implements = \
+            WritingImplement.specializations.order_by('name')
+
+        querysets = [
+            writing_implements,
+            writing_implements.chunked(size=2),
+            writing_implements.chunked(size=2, server_side_cursor=True),
+            writing_implements.joined(),
+            writing_implements.reuse_general_rows(),
+            writing_implements.lazy(),
+            ]
+        for queryset in querysets:
+            specialized_writing_implements = list(queryset.iterator())
+
+            eq_(specialized_writing_implements, list(expected_writing_implements))
+
+            for wi, expected_wi in zip(
+                specialized_writing_implements, expected_writing_implements):
+                eq_(wi.__class__, expected_wi.__class__)
+                eq_(wi.double_length, expected_wi.length * 2)
+                eq_(wi.producer_count, 0)
+
+    def test_annotate_get(self):
+        """Annotations are copied to the specialized instance returned by get()"""
+
+        mont_blanc = WritingImplement.specializations.annotate(
+            double_length=F('length') * 2,
+            ).get(name='Mont Blanc')
+
+        eq_(mont_blanc.__class__, FountainPen)
+        eq_(mont_blanc.double_length, FountainPenData.MontBlanc.length * 2)
 
     def test_extra(self):
         """Queries added with .extra() are inherited in specializations."""
@@ -494,6 +1181,267 @@ class TestSpecializedQueryset(FixtureTestCase):
 
         eq_(reversed_writing_implements[0].extra_field, 1)
 
+class TestPrefetchRelated(FixtureTestCase):
+    """Tests for prefetching objects related to the specializations"""
+
+    datasets = [
+        PenData, PencilData, FountainPenData, BallPointPenData, SharpenerData,
+        EcoProducerData,
+        ]
+
+    def test_specialization_relation(self):
+        """
+        Relations of a specialization are prefetched in one query for the
+        instances of that specialization only.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')\
+            .prefetch_related('sharpeners')
+
+        # One query for the types and ids, one for each specialization and one
+        # for the sharpeners:
+        with self.assertNumQueries(6):
+            writing_implements = list(writing_implements)
+
+            sharpener_names_by_pencil_name = dict(
+                (wi.name, set(s.name for s in wi.sharpeners.all())) for
+                wi in writing_implements if isinstance(wi, Pencil)
+                )
+
+        eq_(
+            sharpener_names_by_pencil_name,
+            {
+                PencilData.Crayola.name: set(),
+                PencilData.Technical.name: set([
+                    SharpenerData.Staedtler.name, SharpenerData.Faber.name,
+                    ]),
+                },
+            )
+
+    def test_general_relation(self):
+        """
+        Relations of the general model are prefetched in one query for all the
+        instances.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')\
+            .prefetch_related('fruitproducer_set', 'sharpeners')
+
+        # One query for the types and ids, one for each specialization and one
+        # for each relation:
+        with self.assertNumQueries(7):
+            producer_names_by_wi_name = dict(
+                (wi.name, [p.name for p in wi.fruitproducer_set.all()]) for
+                wi in writing_implements
+                )
+
+        eq_(
+            producer_names_by_wi_name[PenData.GeneralPen.name],
+            [EcoProducerData.BananaProducer.name],
+            )
+        eq_(producer_names_by_wi_name[PencilData.Technical.name], [])
+
+
+class TestSelectRelated(FixtureTestCase):
+    """Tests for selecting the objects related to the specializations"""
+
+    datasets = [
+        PenData, PencilData, FountainPenData, EcoProducerData,
+        StandardProducerData,
+        ]
+
+    def _check_related_objects(self, producers):
+        """
+        Check that the related objects of ``producers`` are set without
+        querying the database.
+
+        """
+
+        with self.assertNumQueries(0):
+            eq_(
+                [(p.__class__, p.pen.name) for p in producers],
+                [
+                    (EcoProducer, PenData.GeneralPen.name),
+                    (StandardProducer, FountainPenData.MontBlanc.name),
+                    ],
+                )
+            eq_(producers[0].pencil.name, PencilData.Technical.name)
+
+    def test_general_relation(self):
+        """
+        Objects related to the general model are selected along with each
+        specialization.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related('pen')
+
+        # One query for the types and ids and one for each specialization:
+        with self.assertNumQueries(3):
+            producers = list(producers)
+
+        with self.assertNumQueries(0):
+            eq_(
+                [p.pen.name for p in producers],
+                [PenData.GeneralPen.name, FountainPenData.MontBlanc.name],
+                )
+
+    def test_specialization_relation(self):
+        """
+        Objects related to some of the specializations only are selected along
+        with those specializations.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related('pen', 'pencil')
+
+        with self.assertNumQueries(3):
+            producers = list(producers)
+
+        self._check_related_objects(producers)
+
+    def test_joined(self):
+        """
+        The related objects are selected in the same query when the
+        specializations are joined.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related('pen', 'pencil').joined()
+
+        with self.assertNumQueries(1):
+            producers = list(producers)
+
+        self._check_related_objects(producers)
+
+    def test_joined_without_fields(self):
+        """
+        select_related() without fields isn't overridden by the joins of the
+        specializations.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related().joined()
+
+        with self.assertNumQueries(1):
+            producers = list(producers)
+
+        with self.assertNumQueries(0):
+            eq_(
+                [p.pen.name for p in producers],
+                [PenData.GeneralPen.name, FountainPenData.MontBlanc.name],
+                )
+
+    def test_reuse_general_rows(self):
+        """
+        The objects related to the general model are selected along with it
+        and those related to a specialization are prefetched once the
+        specialization is loaded.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related('pen', 'pencil').reuse_general_rows()
+
+        # One query for the general model, one for each specialization and one
+        # for the pencils:
+        with self.assertNumQueries(4):
+            producers = list(producers)
+
+        self._check_related_objects(producers)
+
+    def test_lazy(self):
+        """
+        The objects related to a lazily loaded specialization are prefetched
+        along with its fields.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_related('pen', 'pencil').lazy()
+
+        with self.assertNumQueries(1):
+            producers = list(producers)
+
+        # One query for the fields of the specialization and one for the
+        # pencils:
+        with self.assertNumQueries(2):
+            eq_(producers[0].pencil.name, PencilData.Technical.name)
+
+        self._check_related_objects(producers)
+
+
+class TestParallelSpecializedQueryset(TransactionTestCase):
+    """Tests for fetching the specializations from a pool of threads"""
+
+    def setUp(self):
+        Pencil.objects.create(name='Crayola', length=8, lead='B2')
+        Pen.objects.create(
+            name='General pen', length=15, ink_colour='Blue',
+            specialization_type=Pen.model_specialization,
+            )
+        FountainPen.objects.create(
+            name='Mont Blanc', length=18, ink_colour='Black', nib_width='1.25',
+            )
+        BallPointPen.objects.create(name='Bic', length=12, ink_colour='Blue')
+
+    def test_parallel(self):
+        """
+        Calling parallel() returns the same specializations, in the same order,
+        as a sequential queryset.
+
+        """
+
+        writing_implements = WritingImplement.specializations.order_by('name')
+
+        parallel_writing_implements = list(
+            writing_implements.parallel(max_workers=2)
+            )
+
+        eq_(parallel_writing_implements, list(writing_implements))
+        eq_(
+            [wi.__class__ for wi in parallel_writing_implements],
+            [BallPointPen, Pencil, Pen, FountainPen],
+            )
+
+    def test_parallel_chunked(self):
+        """
+        The threads of a chunked parallel queryset are reused by all the
+        windows, so each thread opens a single database connection.
+
+        """
+
+        created_connections = []
+
+        def record_connection(sender, connection, **kwargs):
+            created_connections.append(connection)
+
+        connection_created.connect(record_connection)
+        try:
+            parallel_writing_implements = list(
+                WritingImplement.specializations.order_by('name')
+                .chunked(2).parallel(max_workers=2)
+                )
+        finally:
+            connection_created.disconnect(record_connection)
+
+        eq_(
+            [wi.__class__ for wi in parallel_writing_implements],
+            [BallPointPen, Pencil, Pen, FountainPen],
+            )
+        eq_(len(created_connections), 2)
+        ok_(all(
+            created_connection.connection is None for created_connection in
+            created_connections
+            ))
+
+
 class TestGetSpecializationOr404(FixtureTestCase):
     """Tests for get_specialization_or_404"""
 
@@ -578,3 +1526,251 @@ class TestGetSpecializationOr404(FixtureTestCase):
             WritingImplement.specializations.all(), name='some thing else'
             )
 
+
+class TestCompactSpecializationType(FixtureTestCase):
+    """Tests for the specialization types stored as integer codes"""
+
+    datasets = [CarrotData, PotatoData, NewPotatoData]
+
+    def test_storage(self):
+        """The codes of the paths are stored instead of the paths"""
+
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT specialization_type FROM %s' % Vegetable._meta.db_table
+            )
+
+        eq_(
+            set(row[0] for row in cursor.fetchall()),
+            set(
+                get_specialization_code(model.model_specialization) for model in
+                (Carrot, Potato, NewPotato)
+                ),
+            )
+
+    def test_paths(self):
+        """The value of specialization_type is the path"""
+
+        jersey = Vegetable.objects.get(name=NewPotatoData.Jersey.name)
+
+        eq_(jersey.specialization_type, NewPotato.model_specialization)
+        eq_(
+            set(
+                Vegetable.objects.values_list('specialization_type', flat=True)
+                ),
+            set(
+                model.model_specialization for model in
+                (Carrot, Potato, NewPotato)
+                ),
+            )
+
+    def test_iterator(self):
+        vegetables = Vegetable.specializations.order_by('name')
+
+        eq_(
+            [vegetable.__class__ for vegetable in vegetables],
+            [Carrot, NewPotato, Potato],
+            )
+        eq_(
+            [vegetable.__class__ for vegetable in vegetables.direct()],
+            [Carrot, Potato, Potato],
+            )
+
+    def test_proxy_specialization(self):
+        """The instances of proxy specializations are of the proxy model"""
+
+        russet = BakingPotato.objects.create(
+            name='Russet', variety='Floury',
+            specialization_type=BakingPotato.model_specialization,
+            )
+
+        eq_(Vegetable.specializations.get(pk=russet.pk).__class__, BakingPotato)
+        for vegetables in (
+            Vegetable.specializations.all(), Vegetable.specializations.joined(),
+            ):
+            eq_(vegetables.get(name='Russet').__class__, BakingPotato)
+            eq_(
+                [
+                    vegetable.__class__ for vegetable in
+                    vegetables.of_type(BakingPotato)
+                    ],
+                [BakingPotato],
+                )
+
+    def test_get(self):
+        jersey = Vegetable.objects.get(name=NewPotatoData.Jersey.name)
+
+        eq_(
+            Vegetable.specializations.get(pk=jersey.pk).__class__, NewPotato,
+            )
+        eq_(jersey.get_as_specialization().__class__, NewPotato)
+        eq_(jersey.get_as_specialization(False).__class__, Potato)
+
+    def test_filter(self):
+        """Lookups on specialization_type take paths"""
+
+        eq_(
+            [
+                carrot.name for carrot in Vegetable.specializations.filter(
+                    specialization_type=Carrot.model_specialization,
+                    )
+                ],
+            [CarrotData.Chantenay.name],
+            )
+        eq_(Vegetable.specializations.of_type(Potato).count(), 2)
+
+        assert_raises(
+            TypeError, Vegetable.objects.filter,
+            specialization_type__startswith=Potato.model_specialization,
+            )
+
+    def test_of_type(self):
+        """of_type() always matches the exact codes"""
+
+        original_max_paths = query.MAX_EXACT_SPECIALIZATION_PATHS
+        query.MAX_EXACT_SPECIALIZATION_PATHS = 1
+        try:
+            potatoes = Vegetable.specializations.of_type(Potato)
+        finally:
+            query.MAX_EXACT_SPECIALIZATION_PATHS = original_max_paths
+
+        eq_(potatoes.query.where.children[0].lookup_name, 'in')
+        eq_(
+            set(potato.__class__ for potato in potatoes),
+            set([Potato, NewPotato]),
+            )
+
+    def test_save(self):
+        carrot = Carrot.objects.create(name='Nantes', colour='Orange')
+
+        eq_(
+            Vegetable.specializations.get(pk=carrot.pk).specialization_type,
+            Carrot.model_specialization,
+            )
+
+
+class TestBulkCreate(FixtureTestCase):
+
+    datasets = []
+
+    def test_specializations(self):
+        """Instances of different specializations are created together"""
+
+        writing_implements = WritingImplement.specializations.bulk_create([
+            Pencil(name='Staedtler', length=17, lead='HB'),
+            FountainPen(
+                name='Lamy', length=14, ink_colour='Blue', nib_width='0.50',
+                ),
+            BallPointPen(
+                name='Bic', length=12, ink_colour='Red',
+                replaceable_insert=False,
+                ),
+            Pen(name='Felt-tip pen', length=13, ink_colour='Green'),
+            ])
+
+        for writing_implement in writing_implements:
+            ok_(writing_implement.pk is not None)
+            eq_(
+                writing_implement.specialization_type,
+                writing_implement.__class__.model_specialization,
+                )
+
+            specialized_writing_implement = \
+                WritingImplement.specializations.get(pk=writing_implement.pk)
+            eq_(
+                specialized_writing_implement.__class__,
+                writing_implement.__class__,
+                )
+            eq_(specialized_writing_implement.name, writing_implement.name)
+
+        eq_(
+            str(FountainPen.objects.get(name='Lamy').nib_width),
+            '0.50',
+            )
+        eq_(Pencil.objects.get(name='Staedtler').lead, 'HB')
+
+    def test_batches(self):
+        """The rows of each table are inserted in batches"""
+
+        pens = [
+            Pen(pk=pk, name='Pen %s' % pk, length=10, ink_colour='Blue') for
+            pk in range(1, 5)
+            ]
+        pencils = [
+            Pencil(pk=pk, name='Pencil %s' % pk, length=10, lead='2B') for
+            pk in range(5, 9)
+            ]
+
+        with CaptureQueriesContext(connection) as context:
+            WritingImplement.specializations.bulk_create(
+                pens + pencils, batch_size=4,
+                )
+
+        insert_queries = [
+            query for query in context.captured_queries if
+            'INSERT INTO' in query['sql']
+            ]
+        eq_(len(insert_queries), 4)
+        eq_(WritingImplement.objects.count(), 8)
+        eq_(Pen.objects.count(), 4)
+        eq_(Pencil.objects.count(), 4)
+
+    def test_general_model_batches(self):
+        """
+        The rows of the instances of the general model are inserted in
+        batches, even if they don't have a primary key.
+
+        """
+
+        fruits = [Fruit(name='Fruit %s' % index) for index in range(50)]
+
+        with self.assertNumQueries(1):
+            Fruit.specializations.bulk_create(fruits)
+
+        eq_(Fruit.objects.count(), 50)
+
+        # Only the rows of the specializations are inserted one at a time:
+        apples = [Apple(name='Apple %s' % index, radius=4) for index in range(2)]
+        with self.assertNumQueries(4):
+            Fruit.specializations.bulk_create(
+                [Fruit(name='Lemon'), Fruit(name='Lime')] + apples,
+                )
+
+        eq_(Fruit.objects.count(), 54)
+        eq_(
+            sorted(apple.name for apple in Apple.objects.all()),
+            ['Apple 0', 'Apple 1'],
+            )
+
+    def test_compact_specialization_type(self):
+        """The specialization types are stored as codes if required"""
+
+        Vegetable.specializations.bulk_create([
+            Carrot(name='Nantes', colour='Orange'),
+            NewPotato(name='Charlotte', variety='Salad', harvest_week=24),
+            ])
+
+        eq_(
+            Vegetable.specializations.get(name='Charlotte').__class__,
+            NewPotato,
+            )
+        eq_(
+            Vegetable.objects.get(name='Nantes').specialization_type,
+            Carrot.model_specialization,
+            )
+
+    def test_other_model(self):
+        """Only instances of the model and its specializations are accepted"""
+
+        assert_raises(
+            ValueError,
+            Pen.specializations.bulk_create,
+            [Pencil(name='Staedtler', length=17, lead='HB')],
+            )
+        eq_(WritingImplement.objects.count(), 0)
+
+    def test_no_instances(self):
+        """Nothing is inserted if there are no instances"""
+
+        with self.assertNumQueries(0):
+            eq_(WritingImplement.specializations.bulk_create([]), [])
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the caching of specialized model instances"""
+
+from contextlib import contextmanager
+from time import sleep
+
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.cache import cache
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from fixture.django_testcase import FixtureTestCase
+from nose.tools import assert_raises
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize import cache as cache_module
+from djeneralize.cache import SpecializationTypeCache
+from djeneralize.cache import get_cache_key
+from djeneralize.cache import set_cached_instance
+from djeneralize.identity import IdentityMap
+from djeneralize.query import SpecializedQuerySet
+from djeneralize.utils import get_specialization_or_404
+from tests.fixtures import BallPointPenData
+from tests.fixtures import FountainPenData
+from tests.fixtures import PenData
+from tests.fixtures import PencilData
+from tests.test_djeneralize.writing.models import BallPointPen
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import Pencil
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestCachedQueryset(FixtureTestCase):
+
+    datasets = [PenData, PencilData, FountainPenData, BallPointPenData]
+
+    def setUp(self):
+        super(TestCachedQueryset, self).setUp()
+
+        cache.clear()
+
+        self.mont_blanc_pk = \
+            WritingImplement.objects.get(name=FountainPenData.MontBlanc.name).pk
+
+    def tearDown(self):
+        cache.clear()
+
+        super(TestCachedQueryset, self).tearDown()
+
+    def test_get(self):
+        """Instances got by primary key are cached"""
+
+        with self.assertNumQueries(2):
+            mont_blanc = WritingImplement.specializations.cached().get(
+                pk=self.mont_blanc_pk,
+                )
+
+        with self.assertNumQueries(0):
+            cached_mont_blanc = WritingImplement.specializations.cached().get(
+                pk=self.mont_blanc_pk,
+                )
+            eq_(cached_mont_blanc.__class__, FountainPen)
+            eq_(cached_mont_blanc.nib_width, mont_blanc.nib_width)
+
+            # The cache is shared by the hierarchy:
+            eq_(
+                Pen.specializations.cached().get(pk=self.mont_blanc_pk),
+                mont_blanc,
+                )
+
+    def test_get_specialization_or_404(self):
+        """get_specialization_or_404() uses the cache of the queryset"""
+
+        writing_implements = WritingImplement.specializations.cached()
+
+        mont_blanc = get_specialization_or_404(
+            writing_implements, pk=self.mont_blanc_pk,
+            )
+
+        with self.assertNumQueries(0):
+            eq_(
+                get_specialization_or_404(
+                    writing_implements, pk=self.mont_blanc_pk,
+                    ),
+                mont_blanc,
+                )
+
+    def test_other_lookups(self):
+        """Instances got by other lookups than the primary key aren't cached"""
+
+        writing_implements = WritingImplement.specializations.cached()
+
+        writing_implements.get(name=FountainPenData.MontBlanc.name)
+
+        with self.assertNumQueries(2):
+            writing_implements.get(name=FountainPenData.MontBlanc.name)
+
+        eq_(cache.get(get_cache_key(WritingImplement, self.mont_blanc_pk)), None)
+
+    def test_direct(self):
+        """Direct specializations aren't cached"""
+
+        mont_blanc = WritingImplement.specializations.direct().cached().get(
+            pk=self.mont_blanc_pk,
+            )
+        eq_(mont_blanc.__class__, Pen)
+
+        eq_(cache.get(get_cache_key(WritingImplement, self.mont_blanc_pk)), None)
+
+    def test_wrong_model(self):
+        """Instances of other specializations aren't taken from the cache"""
+
+        WritingImplement.specializations.cached().get(pk=self.mont_blanc_pk)
+
+        assert_raises(
+            Pencil.DoesNotExist,
+            Pencil.specializations.cached().get, pk=self.mont_blanc_pk,
+            )
+
+    def test_identity_map(self):
+        """The cached instances are added to the active identity map"""
+
+        WritingImplement.specializations.cached().get(pk=self.mont_blanc_pk)
+
+        with IdentityMap():
+            mont_blanc = WritingImplement.specializations.cached().get(
+                pk=self.mont_blanc_pk,
+                )
+
+            with self.assertNumQueries(0):
+                ok_(
+                    WritingImplement.specializations.get(
+                        pk=self.mont_blanc_pk,
+                        ) is mont_blanc
+                    )
+
+    def test_save_specialization(self):
+        """Saving the specialization invalidates the cached instance"""
+
+        writing_implements = WritingImplement.specializations.cached()
+
+        mont_blanc = writing_implements.get(pk=self.mont_blanc_pk)
+        mont_blanc.nib_width = '2.00'
+        mont_blanc.save()
+
+        with self.assertNumQueries(2):
+            eq_(
+                str(writing_implements.get(pk=self.mont_blanc_pk).nib_width),
+                '2.00',
+                )
+
+    def test_save_general_model(self):
+        """
+        Saving the general model instance invalidates the cached specialized
+        instance.
+
+        """
+
+        writing_implements = WritingImplement.specializations.cached()
+
+        writing_implements.get(pk=self.mont_blanc_pk)
+
+        general_mont_blanc = WritingImplement.objects.get(
+            pk=self.mont_blanc_pk,
+            )
+        general_mont_blanc.name = 'Mont Blanc Meisterstuck'
+        general_mont_blanc.save()
+
+        with self.assertNumQueries(2):
+            eq_(
+                writing_implements.get(pk=self.mont_blanc_pk).name,
+                general_mont_blanc.name,
+                )
+
+    def test_delete(self):
+        """Deleting the instance invalidates the cached instance"""
+
+        writing_implements = WritingImplement.specializations.cached()
+
+        writing_implements.get(pk=self.mont_blanc_pk).delete()
+
+        assert_raises(
+            WritingImplement.DoesNotExist,
+            writing_implements.get, pk=self.mont_blanc_pk,
+            )
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        'unused': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unused',
+            },
+        })
+    def test_unused_cache(self):
+        """Only the caches which are used or configured are invalidated"""
+
+        WritingImplement.specializations.cached().get(pk=self.mont_blanc_pk)
+
+        cache_key = get_cache_key(WritingImplement, self.mont_blanc_pk)
+        caches['unused'].set(cache_key, 'Unrelated value')
+
+        WritingImplement.objects.get(pk=self.mont_blanc_pk).save()
+
+        eq_(cache.get(cache_key), None)
+        eq_(caches['unused'].get(cache_key), 'Unrelated value')
+
+    def test_save_before_caching(self):
+        """
+        The cached instances are invalidated by processes which haven't used
+        the cache.
+
+        """
+
+        mont_blanc = WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+        set_cached_instance(mont_blanc, DEFAULT_CACHE_ALIAS, None)
+
+        with _unregistered_cache_aliases():
+            mont_blanc.save()
+
+        eq_(cache.get(get_cache_key(WritingImplement, self.mont_blanc_pk)), None)
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'shared',
+                },
+            },
+        DJENERALIZE_CACHE_ALIASES=['shared'],
+        )
+    def test_configured_cache(self):
+        """The caches in the settings are invalidated"""
+
+        mont_blanc = WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+        set_cached_instance(mont_blanc, 'shared', None)
+
+        with _unregistered_cache_aliases():
+            mont_blanc.save()
+
+        eq_(
+            caches['shared'].get(
+                get_cache_key(WritingImplement, self.mont_blanc_pk),
+                ),
+            None,
+            )
+
+
+class TestSpecializationTypeCache(FixtureTestCase):
+
+    datasets = [PenData, PencilData, FountainPenData, BallPointPenData]
+
+    def setUp(self):
+        super(TestSpecializationTypeCache, self).setUp()
+
+        self.type_cache = SpecializationTypeCache()
+        self.writing_implements = SpecializedQuerySet(
+            WritingImplement, type_cache=self.type_cache,
+            )
+
+        self.mont_blanc_pk = \
+            WritingImplement.objects.get(name=FountainPenData.MontBlanc.name).pk
+
+    def test_get(self):
+        """
+        Instances whose specialization type is cached are got from the tables
+        of their specialization only.
+
+        """
+
+        self.writing_implements.get(pk=self.mont_blanc_pk)
+        eq_(
+            self.type_cache.get(WritingImplement, self.mont_blanc_pk),
+            FountainPen.model_specialization,
+            )
+
+        with CaptureQueriesContext(connection) as context:
+            mont_blanc = self.writing_implements.get(pk=self.mont_blanc_pk)
+
+        eq_(mont_blanc.__class__, FountainPen)
+        eq_(len(context.captured_queries), 1)
+        ok_('LEFT OUTER JOIN' not in context.captured_queries[0]['sql'])
+
+    def test_iterator(self):
+        """The specialization types are cached when iterating"""
+
+        writing_implements = list(self.writing_implements)
+
+        eq_(len(self.type_cache), len(writing_implements))
+        for writing_implement in writing_implements:
+            eq_(
+                self.type_cache.get(Pen, writing_implement.pk),
+                writing_implement.specialization_type,
+                )
+
+    def test_stale_specialization_type(self):
+        """
+        Instances whose cached specialization type is wrong are still found.
+
+        """
+
+        self.type_cache.set(
+            WritingImplement, self.mont_blanc_pk, Pencil.model_specialization,
+            )
+
+        mont_blanc = self.writing_implements.get(pk=self.mont_blanc_pk)
+
+        eq_(mont_blanc.__class__, FountainPen)
+        eq_(
+            self.type_cache.get(WritingImplement, self.mont_blanc_pk),
+            FountainPen.model_specialization,
+            )
+
+    def test_respecialized_instance(self):
+        """
+        Instances re-specialized without invalidating the cache are got as
+        their new specialization, even if the rows of the old one remain.
+
+        """
+
+        self.writing_implements.get(pk=self.mont_blanc_pk)
+
+        # Re-specialize the fountain pen into a ballpoint pen without sending
+        # any signal, as another process would:
+        cursor = connection.cursor()
+        cursor.execute(
+            'INSERT INTO %s (%s, %s) VALUES (%%s, %%s)' % (
+                BallPointPen._meta.db_table,
+                BallPointPen._meta.pk.column,
+                BallPointPen._meta.get_field('replaceable_insert').column,
+                ),
+            [self.mont_blanc_pk, False],
+            )
+        WritingImplement.objects.filter(pk=self.mont_blanc_pk).update(
+            specialization_type=BallPointPen.model_specialization,
+            )
+
+        mont_blanc = self.writing_implements.get(pk=self.mont_blanc_pk)
+
+        eq_(mont_blanc.__class__, BallPointPen)
+        eq_(
+            self.type_cache.get(WritingImplement, self.mont_blanc_pk),
+            BallPointPen.model_specialization,
+            )
+
+    def test_invalidation(self):
+        """
+        The specialization type is removed from the cache when the instance is
+        saved or deleted.
+
+        """
+
+        mont_blanc = self.writing_implements.get(pk=self.mont_blanc_pk)
+        mont_blanc.save()
+        eq_(self.type_cache.get(WritingImplement, self.mont_blanc_pk), None)
+
+        self.writing_implements.get(pk=self.mont_blanc_pk)
+        WritingImplement.objects.get(pk=self.mont_blanc_pk).delete()
+        eq_(self.type_cache.get(WritingImplement, self.mont_blanc_pk), None)
+
+    def test_eviction(self):
+        """The least recently used entries are evicted"""
+
+        type_cache = SpecializationTypeCache(maxsize=2)
+
+        type_cache.set(WritingImplement, 1, Pen.model_specialization)
+        type_cache.set(WritingImplement, 2, Pen.model_specialization)
+        type_cache.get(WritingImplement, 1)
+        type_cache.set(WritingImplement, 3, Pen.model_specialization)
+
+        eq_(len(type_cache), 2)
+        eq_(type_cache.get(WritingImplement, 1), Pen.model_specialization)
+        eq_(type_cache.get(WritingImplement, 2), None)
+        eq_(type_cache.get(WritingImplement, 3), Pen.model_specialization)
+
+    def test_timeout(self):
+        """The entries expire after the timeout"""
+
+        type_cache = SpecializationTypeCache(timeout=0.01)
+
+        type_cache.set(WritingImplement, 1, Pen.model_specialization)
+        eq_(type_cache.get(WritingImplement, 1), Pen.model_specialization)
+
+        sleep(0.02)
+        eq_(type_cache.get(WritingImplement, 1), None)
+
+    def test_invalid_maxsize(self):
+        """The maximum size must be positive"""
+
+        assert_raises(ValueError, SpecializationTypeCache, maxsize=0)
+
+
+@contextmanager
+def _unregistered_cache_aliases():
+    """Forget the cache aliases used so far, as in a new process"""
+
+    cache_aliases = set(cache_module._cache_aliases)
+    cache_module._cache_aliases.clear()
+    try:
+        yield
+    finally:
+        cache_module._cache_aliases.update(cache_aliases)
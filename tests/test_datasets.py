@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the generation of datasets of specialized model instances"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from fixture.django_testcase import FixtureTestCase
+from nose.tools import assert_raises
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.datasets import generate_instances
+from djeneralize.datasets import get_default_field_values
+from tests.test_djeneralize.producers.models import EcoProducer
+from tests.test_djeneralize.writing.models import BallPointPen
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import Pencil
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestGenerateInstances(FixtureTestCase):
+
+    datasets = []
+
+    def test_distribution(self):
+        """The instances are split between the models by weight"""
+
+        counts = generate_instances(
+            {Pencil: 1, FountainPen: 2, BallPointPen: 3, Pen: 0.5}, 65,
+            )
+
+        eq_(
+            dict(counts),
+            {Pencil: 10, FountainPen: 20, BallPointPen: 30, Pen: 5},
+            )
+        for model, count in counts.items():
+            eq_(
+                WritingImplement.objects.filter(
+                    specialization_type=model.model_specialization,
+                    ).count(),
+                count,
+                )
+
+    def test_specializations(self):
+        """The rows of all the tables of the specializations are written"""
+
+        generate_instances({Pen: 1, FountainPen: 1}, 4)
+
+        writing_implements = \
+            list(WritingImplement.specializations.order_by('pk'))
+
+        eq_(
+            [wi.__class__ for wi in writing_implements],
+            [Pen, FountainPen, Pen, FountainPen],
+            )
+        eq_(writing_implements[1].name, 'FountainPen 1')
+        eq_(str(writing_implements[1].nib_width), '0.00')
+
+    def test_batches(self):
+        """The tables are written in batches"""
+
+        with CaptureQueriesContext(connection) as context:
+            generate_instances(
+                {Pencil: 1, FountainPen: 1, BallPointPen: 2}, 40,
+                batch_size=20,
+                )
+
+        inserts = [
+            query for query in context.captured_queries if
+            'INSERT INTO' in query['sql']
+            ]
+        # Two batches, each of which writes the general table, the table of
+        # the pens and the tables of the three leaves:
+        eq_(len(inserts), 10)
+
+    def test_primary_keys(self):
+        """The instances created afterwards get new primary keys"""
+
+        generate_instances({Pencil: 1}, 3)
+
+        pencil = Pencil.objects.create(name='Pencil', length=10, lead='HB')
+        eq_(WritingImplement.objects.filter(pk=pencil.pk).count(), 1)
+        eq_(WritingImplement.objects.count(), 4)
+
+    def test_field_values(self):
+        """The values of the fields can be provided"""
+
+        generate_instances(
+            {Pencil: 1}, 2,
+            get_field_values=lambda model, index: dict(
+                get_default_field_values(model, index), lead='H%s' % index,
+                ),
+            )
+
+        eq_(
+            sorted(Pencil.objects.values_list('lead', flat=True)),
+            ['H0', 'H1'],
+            )
+
+    def test_invalid_distribution(self):
+        assert_raises(ValueError, generate_instances, {}, 10)
+        assert_raises(ValueError, generate_instances, {Pencil: 0}, 10)
+        assert_raises(
+            ValueError, generate_instances, {Pencil: 1, EcoProducer: 1}, 10,
+            )
+
+    def test_foreign_keys(self):
+        """The values of the foreign keys can't be made up"""
+
+        assert_raises(ValueError, get_default_field_values, EcoProducer, 0)
+        ok_('name' in get_default_field_values(Pencil, 0))
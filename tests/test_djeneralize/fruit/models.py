@@ -4,7 +4,8 @@ from djeneralize.manager import SpecializationManager
 from djeneralize.models import BaseGeneralizationModel
 
 __all__ = [
-    'FruitManager', 'SpecializedFruitManager', 'Fruit', 'Apple', 'Banana'
+    'FruitManager', 'SpecializedFruitManager', 'Fruit', 'Apple', 'Banana',
+    'Vegetable', 'Carrot', 'Potato', 'NewPotato', 'BakingPotato',
     ]
 
 class FruitManager(models.Manager):
@@ -54,4 +55,51 @@ class Banana(Fruit):
     curvature = models.DecimalField(max_digits=3, decimal_places=2)
 
     class Meta:
-        specialization = 'banana'
\ No newline at end of file
+        specialization = 'banana'
+
+
+class Vegetable(BaseGeneralizationModel):
+    """A vegetable, whose specialization type is stored as an integer code"""
+
+    name = models.CharField(max_length=30)
+
+    class Meta:
+        compact_specialization_type = True
+
+    def __unicode__(self):
+        return self.name
+
+
+class Carrot(Vegetable):
+    """A carrot"""
+
+    colour = models.CharField(max_length=30)
+
+    class Meta:
+        specialization = 'carrot'
+
+
+class Potato(Vegetable):
+    """A potato"""
+
+    variety = models.CharField(max_length=30)
+
+    class Meta:
+        specialization = 'potato'
+
+
+class NewPotato(Potato):
+    """A new potato"""
+
+    harvest_week = models.IntegerField()
+
+    class Meta:
+        specialization = 'new_potato'
+
+
+class BakingPotato(Potato):
+    """A baking potato, which is stored as any other potato"""
+
+    class Meta:
+        proxy = True
+        specialization = 'baking_potato'
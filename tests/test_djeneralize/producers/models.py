@@ -1,6 +1,7 @@
 from django.db import models
 
 from djeneralize.fields import SpecializedForeignKey
+from djeneralize.manager import SpecializedRelatedManager
 from djeneralize.models import BaseGeneralizationModel
 
 
@@ -9,6 +10,8 @@ class Shop(models.Model):
     name = models.CharField(max_length=30)
     producer = SpecializedForeignKey('FruitProducer', related_name='shops')
 
+    objects = SpecializedRelatedManager()
+
 
 class FruitProducer(BaseGeneralizationModel):
 
@@ -20,6 +23,9 @@ class FruitProducer(BaseGeneralizationModel):
 class EcoProducer(FruitProducer):
 
     fertilizer = models.CharField(max_length=30)
+    pencil = models.ForeignKey(
+        'writing.Pencil', null=True, related_name='eco_producers',
+        )
 
     class Meta:
         specialization = 'eco_producer'
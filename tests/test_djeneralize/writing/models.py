@@ -20,9 +20,11 @@ from djeneralize.models import BaseGeneralizationModel
 
 __all__ = [
     'WritingImplement', 'Pencil', 'Pen', 'FountainPen', 'BallPointPen',
+    'Sharpener',
     'no_meta_factory', 'no_specialization_factory',
     'invalid_specialization_factory', 'abstract_specialization_factory',
-    'base_generalization_with_specialization_factory'
+    'base_generalization_with_specialization_factory',
+    'specialized_compact_specialization_type_factory',
     ]
 
 #{ General model
@@ -73,6 +75,15 @@ class BallPointPen(Pen):
 
 #}
 
+#{ Models related to specializations
+
+class Sharpener(models.Model):
+
+    name = models.CharField(max_length=30)
+    pencil = models.ForeignKey(Pencil, related_name='sharpeners')
+
+#}
+
 #{ Factories which are needed for testing:
 
 def no_meta_factory():
@@ -135,4 +146,22 @@ def base_generalization_with_specialization_factory():
 
     return General
 
+def specialized_compact_specialization_type_factory():
+    """
+    Factory to make a specialized model which incorrectly declares
+    compact_specialization_type.
+
+    """
+
+    class General(BaseGeneralizationModel):
+        pass
+
+    class Specialized(General):
+
+        class Meta:
+            specialization = 'specialized'
+            compact_specialization_type = True
+
+    return Specialized
+
 #}
\ No newline at end of file
@@ -12,24 +12,117 @@
 # INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
 #
 ##############################################################################
+from django.core.exceptions import FieldError
 from fixture.django_testcase import FixtureTestCase
+from nose.tools import assert_raises
 from nose.tools import eq_
 
 from tests.fixtures import BananaData
 from tests.fixtures import EcoProducerData
 from tests.fixtures import PenData
 from tests.fixtures import ShopData
+from tests.fixtures import StandardProducerData
 from tests.test_djeneralize.fruit.models import Banana
 from tests.test_djeneralize.producers.models import EcoProducer
+from tests.test_djeneralize.producers.models import FruitProducer
+from tests.test_djeneralize.producers.models import Shop
+from tests.test_djeneralize.producers.models import StandardProducer
 from tests.test_djeneralize.writing.models import WritingImplement
 
 
 class TestForeignKey(FixtureTestCase):
 
-    datasets = [EcoProducerData, BananaData, PenData, ShopData]
+    datasets = [
+        EcoProducerData, StandardProducerData, BananaData, PenData, ShopData,
+        ]
 
     def test_specialized_foreign_key(self):
         """A SpecializedForeignKey field return the specialized counterpart"""
         eco = EcoProducer.objects.get(name=EcoProducerData.BananaProducer.name)
         eq_(eco.produce.__class__, Banana)
         eq_(eco.pen.__class__, WritingImplement)
+
+    def test_specialized_foreign_key_cache(self):
+        """
+        The specialized counterpart is cached until the foreign key is
+        reassigned.
+
+        """
+
+        shop = Shop.objects.get(name=ShopData.EcoMart.name)
+
+        # One query for the general instance and one for its specialization:
+        with self.assertNumQueries(2):
+            eq_(shop.producer.__class__, EcoProducer)
+        with self.assertNumQueries(0):
+            eq_(shop.producer.__class__, EcoProducer)
+            eq_(
+                shop.producer.fertilizer,
+                EcoProducerData.BananaProducer.fertilizer,
+                )
+
+        shop.producer = FruitProducer.objects.get(
+            name=EcoProducerData.BananaProducer.name
+            )
+
+        with self.assertNumQueries(1):
+            eq_(shop.producer.__class__, EcoProducer)
+        with self.assertNumQueries(0):
+            eq_(shop.producer.__class__, EcoProducer)
+
+    def test_select_specialized(self):
+        """
+        The specialized related objects are fetched with one query per
+        specialization.
+
+        """
+
+        shops = Shop.objects.select_specialized('producer').order_by('name')
+
+        # One query for the shops and the general producers and one for each
+        # specialization:
+        with self.assertNumQueries(3):
+            eq_(
+                [shop.producer.__class__ for shop in shops],
+                [EcoProducer, StandardProducer],
+                )
+
+    def test_select_specialized_all_fields(self):
+        """
+        All the SpecializedForeignKey fields are used if no field is given.
+
+        """
+
+        shops = Shop.objects.select_specialized().order_by('name')
+
+        with self.assertNumQueries(3):
+            eq_(
+                [shop.producer.name for shop in shops],
+                [
+                    EcoProducerData.BananaProducer.name,
+                    StandardProducerData.BananaProducer.name,
+                    ],
+                )
+
+    def test_select_specialized_invalid_field(self):
+        """Only SpecializedForeignKey fields can be used"""
+
+        assert_raises(FieldError, Shop.objects.select_specialized, 'name')
+
+    def test_select_specialized_on_specializations(self):
+        """
+        The specialized related objects of the specializations can also be
+        fetched in bulk.
+
+        """
+
+        producers = FruitProducer.specializations.order_by('name')\
+            .select_specialized('produce')
+
+        # One query for the types and ids, one for each specialization and one
+        # for the bananas:
+        with self.assertNumQueries(4):
+            eq_(
+                [producer.produce.__class__ for producer in producers],
+                [Banana, Banana],
+                )
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the identity map of specialized model instances"""
+
+from django.http import HttpRequest
+from django.http import HttpResponse
+from fixture.django_testcase import FixtureTestCase
+from nose.tools import assert_false
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.identity import IdentityMap
+from djeneralize.identity import get_current_identity_map
+from djeneralize.middleware import IdentityMapMiddleware
+from tests.fixtures import BallPointPenData
+from tests.fixtures import BananaData
+from tests.fixtures import EcoProducerData
+from tests.fixtures import FountainPenData
+from tests.fixtures import PenData
+from tests.fixtures import PencilData
+from tests.fixtures import ShopData
+from tests.fixtures import StandardProducerData
+from tests.test_djeneralize.producers.models import FruitProducer
+from tests.test_djeneralize.producers.models import Shop
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestIdentityMap(FixtureTestCase):
+
+    datasets = [
+        PenData, PencilData, FountainPenData, BallPointPenData, BananaData,
+        EcoProducerData, StandardProducerData, ShopData,
+        ]
+
+    def setUp(self):
+        super(TestIdentityMap, self).setUp()
+
+        self.mont_blanc_pk = \
+            WritingImplement.objects.get(name=FountainPenData.MontBlanc.name).pk
+
+    def test_get(self):
+        """Instances got by primary key are only loaded once"""
+
+        with IdentityMap():
+            mont_blanc = WritingImplement.specializations.get(
+                pk=self.mont_blanc_pk,
+                )
+
+            with self.assertNumQueries(0):
+                ok_(
+                    WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+                    is mont_blanc
+                    )
+                ok_(
+                    Pen.specializations.get(id=self.mont_blanc_pk) is
+                    mont_blanc
+                    )
+
+        with self.assertNumQueries(2):
+            ok_(
+                WritingImplement.specializations.get(pk=self.mont_blanc_pk) is
+                not mont_blanc
+                )
+
+    def test_get_other_lookups(self):
+        """Lookups on other fields than the primary key are still run"""
+
+        with IdentityMap():
+            mont_blanc = WritingImplement.specializations.get(
+                pk=self.mont_blanc_pk,
+                )
+
+            with self.assertNumQueries(2):
+                ok_(
+                    WritingImplement.specializations.get(
+                        name=FountainPenData.MontBlanc.name,
+                        ) is mont_blanc
+                    )
+
+            with self.assertNumQueries(2):
+                ok_(
+                    WritingImplement.specializations.filter(
+                        name=FountainPenData.MontBlanc.name,
+                        ).get(pk=self.mont_blanc_pk) is mont_blanc
+                    )
+
+    def test_iterator(self):
+        """
+        Instances which have already been loaded are not loaded again when
+        iterating over a queryset.
+
+        """
+
+        with IdentityMap():
+            writing_implements = list(
+                WritingImplement.specializations.order_by('name')
+                )
+
+            # Only the types and ids are fetched:
+            with self.assertNumQueries(1):
+                eq_(
+                    [id(wi) for wi in
+                     WritingImplement.specializations.order_by('name')],
+                    [id(wi) for wi in writing_implements],
+                    )
+
+            with self.assertNumQueries(0):
+                WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+
+    def test_direct(self):
+        """Direct specializations are not taken from the identity map"""
+
+        with IdentityMap():
+            WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+
+            mont_blanc = WritingImplement.specializations.direct().get(
+                pk=self.mont_blanc_pk,
+                )
+            eq_(mont_blanc.__class__, Pen)
+
+    def test_extra(self):
+        """Instances with extra selects are not taken from the identity map"""
+
+        with IdentityMap():
+            WritingImplement.specializations.get(pk=self.mont_blanc_pk)
+
+            mont_blanc = WritingImplement.specializations.extra(
+                select={'extra_field': 'SELECT 1'},
+                ).get(pk=self.mont_blanc_pk)
+            eq_(mont_blanc.extra_field, 1)
+
+    def test_get_as_specialization(self):
+        """get_as_specialization() returns the instances already loaded"""
+
+        general_mont_blanc = WritingImplement.objects.get(
+            pk=self.mont_blanc_pk,
+            )
+
+        with IdentityMap():
+            mont_blanc = general_mont_blanc.get_as_specialization()
+
+            with self.assertNumQueries(0):
+                ok_(general_mont_blanc.get_as_specialization() is mont_blanc)
+                ok_(
+                    WritingImplement.specialize_many([general_mont_blanc])[0] is
+                    mont_blanc
+                    )
+
+            eq_(
+                general_mont_blanc.get_as_specialization(False).__class__, Pen,
+                )
+
+    def test_foreign_key(self):
+        """
+        Specialized foreign keys return the related objects already loaded.
+
+        """
+
+        shop = Shop.objects.get(name=ShopData.EcoMart.name)
+
+        with IdentityMap():
+            producer = FruitProducer.specializations.get(pk=shop.producer_id)
+
+            with self.assertNumQueries(0):
+                ok_(shop.producer is producer)
+
+    def test_delete(self):
+        """Deleted instances are removed from the identity map"""
+
+        with IdentityMap() as identity_map:
+            mont_blanc = WritingImplement.specializations.get(
+                pk=self.mont_blanc_pk,
+                )
+            mont_blanc.delete()
+
+            eq_(identity_map.get(FountainPen, self.mont_blanc_pk), None)
+
+    def test_nesting(self):
+        """The innermost identity map is the active one"""
+
+        eq_(get_current_identity_map(), None)
+
+        with IdentityMap() as outer_identity_map:
+            with IdentityMap() as inner_identity_map:
+                ok_(get_current_identity_map() is inner_identity_map)
+
+            ok_(get_current_identity_map() is outer_identity_map)
+
+        eq_(get_current_identity_map(), None)
+
+
+class TestIdentityMapMiddleware(object):
+
+    def test_request(self):
+        """An identity map is active while the request is processed"""
+
+        middleware = IdentityMapMiddleware()
+        request = HttpRequest()
+
+        middleware.process_request(request)
+        ok_(get_current_identity_map() is not None)
+
+        middleware.process_response(request, HttpResponse())
+        eq_(get_current_identity_map(), None)
+
+    def test_exception(self):
+        """The identity map is discarded when the view raises an exception"""
+
+        middleware = IdentityMapMiddleware()
+        request = HttpRequest()
+
+        middleware.process_request(request)
+        middleware.process_exception(request, ValueError())
+        eq_(get_current_identity_map(), None)
+
+        # The response is still processed afterwards:
+        middleware.process_response(request, HttpResponse())
+        assert_false(hasattr(request, 'djeneralize_identity_map'))
+
+    def test_unprocessed_request(self):
+        """Responses to requests which weren't processed are left alone"""
+
+        response = HttpResponse()
+
+        ok_(
+            IdentityMapMiddleware().process_response(HttpRequest(), response) is
+            response
+            )
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the signals sent by the queries which specialize instances"""
+
+from fixture.django_testcase import FixtureTestCase
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.instrumentation import FetchCollector
+from djeneralize.instrumentation import record_iteration
+from djeneralize.instrumentation import specialization_types_fetched
+from tests.fixtures import BallPointPenData
+from tests.fixtures import FountainPenData
+from tests.fixtures import PenData
+from tests.fixtures import PencilData
+from tests.test_djeneralize.writing.models import BallPointPen
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import Pencil
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestFetchCollector(FixtureTestCase):
+
+    datasets = [PenData, PencilData, FountainPenData, BallPointPenData]
+
+    def test_iterator(self):
+        """
+        The query of the specialization types and the query of each
+        specialization are reported when iterating.
+
+        """
+
+        with FetchCollector() as collector:
+            list(WritingImplement.specializations.all())
+
+        types_stats = collector.get_stats(operation='types')
+        eq_(types_stats.query_count, 1)
+        eq_(types_stats.row_count, 7)
+        eq_(
+            collector.get_stats(model=WritingImplement).query_count, 1,
+            )
+
+        for model, row_count in (
+            (Pen, 1), (FountainPen, 2), (BallPointPen, 2), (Pencil, 2)):
+            stats = collector.get_stats(
+                specialization=model.model_specialization,
+                )
+            eq_(stats.model, None)
+            eq_(stats.query_count, 1)
+            eq_(stats.row_count, row_count)
+
+            eq_(
+                collector.get_stats(model=model, operation='in_bulk')
+                .query_count,
+                1,
+                )
+
+        ok_(all(stats.duration >= 0 for stats in collector.stats))
+
+    def test_reuse_general_rows(self):
+        """
+        The fetches of the fields of the specializations are reported as bulk
+        fetches.
+
+        """
+
+        with FetchCollector() as collector:
+            list(WritingImplement.specializations.reuse_general_rows())
+
+        eq_(collector.get_stats(operation='types').row_count, 7)
+        eq_(collector.get_stats(operation='in_bulk').row_count, 7)
+        eq_(collector.get_stats(operation='get').query_count, 0)
+
+    def test_joined(self):
+        """The joined query is reported as the query of the types"""
+
+        with FetchCollector() as collector:
+            list(WritingImplement.specializations.joined())
+
+        eq_(len(collector.stats), 1)
+        eq_(collector.get_stats(operation='types').row_count, 7)
+
+    def test_get(self):
+        """The specialized instance got is reported with its specialization"""
+
+        with FetchCollector() as collector:
+            WritingImplement.specializations.get(
+                name=FountainPenData.MontBlanc.name,
+                )
+
+        eq_(collector.get_stats(operation='types').query_count, 1)
+
+        stats = collector.get_stats(operation='get')
+        eq_(stats.query_count, 1)
+        eq_(stats.row_count, 1)
+        eq_(
+            collector.get_stats(
+                model=FountainPen,
+                specialization=FountainPen.model_specialization,
+                ).query_count,
+            1,
+            )
+
+    def test_get_joined(self):
+        """
+        The joined get is reported as a query of the specialization types,
+        like the iteration over a joined queryset.
+
+        """
+
+        with FetchCollector() as collector:
+            WritingImplement.specializations.joined().get(
+                name=FountainPenData.MontBlanc.name,
+                )
+
+        eq_(len(collector.stats), 1)
+        eq_(collector.stats[0].model, WritingImplement)
+        eq_(collector.stats[0].operation, 'types')
+        eq_(collector.stats[0].row_count, 1)
+
+    def test_get_missing_instance(self):
+        """Lookups matching no instance are reported without rows"""
+
+        with FetchCollector() as collector:
+            try:
+                WritingImplement.specializations.get(name='Quill')
+            except WritingImplement.DoesNotExist:
+                pass
+
+        stats = collector.get_stats(model=WritingImplement, operation='types')
+        eq_(stats.query_count, 1)
+        eq_(stats.row_count, 0)
+        eq_(collector.get_stats(operation='get').query_count, 0)
+
+    def test_get_as_specialization(self):
+        """get_as_specialization() is reported as a get"""
+
+        pencil = WritingImplement.objects.get(name=PencilData.Crayola.name)
+
+        with FetchCollector() as collector:
+            pencil.get_as_specialization()
+
+        eq_(collector.get_stats(model=Pencil, operation='get').query_count, 1)
+
+    def test_specialize_many(self):
+        """specialize_many() is reported as a bulk fetch per specialization"""
+
+        writing_implements = WritingImplement.objects.all()
+
+        with FetchCollector() as collector:
+            WritingImplement.specialize_many(writing_implements)
+
+        eq_(collector.get_stats(operation='in_bulk').query_count, 4)
+        eq_(collector.get_stats(operation='in_bulk').row_count, 7)
+
+    def test_stop(self):
+        """Nothing is collected once the collector is stopped"""
+
+        collector = FetchCollector()
+        collector.start()
+        list(WritingImplement.specializations.all())
+        collector.stop()
+
+        query_count = collector.get_stats().query_count
+        list(WritingImplement.specializations.all())
+        eq_(collector.get_stats().query_count, query_count)
+
+        collector.clear()
+        eq_(collector.stats, [])
+
+
+class TestRecordIteration(object):
+
+    def test_without_receivers(self):
+        """The iterable is returned as is if the signal has no receivers"""
+
+        iterable = [1, 2]
+        ok_(
+            record_iteration(iterable, specialization_types_fetched, Pen)
+            is iterable
+            )
+
+    def test_with_receivers(self):
+        """The signal is sent once the iterable is exhausted"""
+
+        with FetchCollector() as collector:
+            eq_(
+                list(record_iteration(
+                    [1, 2], specialization_types_fetched, Pen,
+                    )),
+                [1, 2],
+                )
+
+        eq_(collector.get_stats(model=Pen).row_count, 2)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the migration operations"""
+
+from django.apps import apps
+from django.db import connection
+from django.db.migrations.operations import CreateModel
+from django.db.migrations.state import ProjectState
+from django.db.models import AutoField
+from django.db.models import TextField
+from django.test.utils import CaptureQueriesContext
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.operations import CreateSpecializationTypePatternIndex
+from djeneralize.operations import EncodeSpecializationType
+from djeneralize.utils import get_specialization_code
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import Pencil
+
+
+class TestCreateSpecializationTypePatternIndex(object):
+
+    def setup(self):
+        self.operation = CreateSpecializationTypePatternIndex(
+            'WritingImplement',
+            )
+
+    def test_deconstruct(self):
+        eq_(
+            self.operation.deconstruct(),
+            (
+                'CreateSpecializationTypePatternIndex',
+                ('WritingImplement',),
+                {},
+                ),
+            )
+
+    def test_references_model(self):
+        ok_(self.operation.references_model('writingimplement', 'writing'))
+        ok_(not self.operation.references_model('pen', 'writing'))
+
+    def test_other_databases(self):
+        """The index is only created on PostgreSQL"""
+
+        project_state = ProjectState.from_apps(apps)
+
+        with connection.schema_editor() as schema_editor:
+            with CaptureQueriesContext(connection) as context:
+                self.operation.database_forwards(
+                    'writing', schema_editor, project_state, project_state,
+                    )
+
+            eq_(len(context.captured_queries), 0)
+            eq_(schema_editor.deferred_sql, [])
+
+
+class TestEncodeSpecializationType(object):
+
+    def setup(self):
+        self.operation = EncodeSpecializationType('WritingImplement')
+
+        # Use a copy of the table of the general model with paths in it:
+        self.create_model = CreateModel(
+            'WritingImplement',
+            [
+                ('id', AutoField(primary_key=True)),
+                ('specialization_type', TextField(db_index=True)),
+                ],
+            options={'db_table': 'writing_encodedwritingimplement'},
+            )
+
+        self.initial_state = ProjectState()
+        self.text_state = self.initial_state.clone()
+        self.create_model.state_forwards('writing', self.text_state)
+        with connection.schema_editor() as schema_editor:
+            self.create_model.database_forwards(
+                'writing', schema_editor, self.initial_state, self.text_state,
+                )
+
+        self.encoded_state = self.text_state.clone()
+        self.operation.state_forwards('writing', self.encoded_state)
+
+        self.paths = set(
+            model.model_specialization for model in (Pen, Pencil, FountainPen)
+            )
+        text_model = self.text_state.apps.get_model(
+            'writing', 'WritingImplement',
+            )
+        for path in self.paths:
+            text_model.objects.create(specialization_type=path)
+
+    def teardown(self):
+        with connection.schema_editor() as schema_editor:
+            self.create_model.database_backwards(
+                'writing', schema_editor, self.text_state, self.initial_state,
+                )
+
+    def test_deconstruct(self):
+        eq_(
+            self.operation.deconstruct(),
+            ('EncodeSpecializationType', ('WritingImplement',), {}),
+            )
+
+    def test_state(self):
+        """The field becomes an integer field"""
+
+        field = self.encoded_state.apps.get_model(
+            'writing', 'WritingImplement',
+            )._meta.get_field('specialization_type')
+
+        eq_(field.get_internal_type(), 'IntegerField')
+        ok_(field.db_index)
+
+    def test_forwards_and_backwards(self):
+        """The paths are converted to their codes and back"""
+
+        with connection.schema_editor() as schema_editor:
+            self.operation.database_forwards(
+                'writing', schema_editor, self.text_state, self.encoded_state,
+                )
+
+        encoded_model = self.encoded_state.apps.get_model(
+            'writing', 'WritingImplement',
+            )
+        eq_(
+            set(encoded_model.objects.values_list(
+                'specialization_type', flat=True,
+                )),
+            set(get_specialization_code(path) for path in self.paths),
+            )
+
+        with connection.schema_editor() as schema_editor:
+            self.operation.database_backwards(
+                'writing', schema_editor, self.encoded_state, self.text_state,
+                )
+
+        text_model = self.text_state.apps.get_model(
+            'writing', 'WritingImplement',
+            )
+        eq_(
+            set(text_model.objects.values_list(
+                'specialization_type', flat=True,
+                )),
+            self.paths,
+            )
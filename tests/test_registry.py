@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the registry of the hierarchies of specialized models"""
+
+from nose.tools import assert_false
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.models import specialized_model_prepared
+from djeneralize.registry import get_hierarchy
+from tests.test_djeneralize.fruit.models import BakingPotato
+from tests.test_djeneralize.fruit.models import NewPotato
+from tests.test_djeneralize.fruit.models import Potato
+from tests.test_djeneralize.fruit.models import Vegetable
+from tests.test_djeneralize.producers.models import FruitProducer
+from tests.test_djeneralize.writing.models import BallPointPen
+from tests.test_djeneralize.writing.models import FountainPen
+from tests.test_djeneralize.writing.models import Pen
+from tests.test_djeneralize.writing.models import Pencil
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestHierarchy(object):
+
+    def setup(self):
+        self.hierarchy = get_hierarchy(WritingImplement)
+
+    def test_get_hierarchy(self):
+        """The models of a hierarchy share the same hierarchy"""
+
+        eq_(self.hierarchy.general_model, WritingImplement)
+        ok_(get_hierarchy(FountainPen) is self.hierarchy)
+        ok_(get_hierarchy(FruitProducer) is not self.hierarchy)
+
+        ok_(Pen in self.hierarchy)
+        assert_false(FruitProducer in self.hierarchy)
+
+    def test_ancestors(self):
+        """The ancestors are ordered from the parent to the general model"""
+
+        eq_(self.hierarchy.get_ancestors(WritingImplement), ())
+        eq_(self.hierarchy.get_ancestors(Pencil), (WritingImplement,))
+        eq_(
+            self.hierarchy.get_ancestors(FountainPen), (Pen, WritingImplement),
+            )
+
+    def test_children(self):
+        eq_(self.hierarchy.get_children(WritingImplement), (Pen, Pencil))
+        eq_(self.hierarchy.get_children(Pen), (BallPointPen, FountainPen))
+        eq_(self.hierarchy.get_children(Pencil), ())
+
+    def test_descendants(self):
+        eq_(
+            self.hierarchy.get_descendants(WritingImplement),
+            frozenset([Pen, Pencil, FountainPen, BallPointPen]),
+            )
+        eq_(
+            self.hierarchy.get_descendants(Pen),
+            frozenset([FountainPen, BallPointPen]),
+            )
+        eq_(self.hierarchy.get_descendants(FountainPen), frozenset())
+
+    def test_depth(self):
+        eq_(self.hierarchy.get_depth(WritingImplement), 0)
+        eq_(self.hierarchy.get_depth(Pen), 1)
+        eq_(self.hierarchy.get_depth(BallPointPen), 2)
+
+    def test_leaves(self):
+        eq_(
+            self.hierarchy.leaves,
+            frozenset([Pencil, FountainPen, BallPointPen]),
+            )
+        ok_(self.hierarchy.is_leaf(Pencil))
+        assert_false(self.hierarchy.is_leaf(Pen))
+
+    def test_subtree(self):
+        """The subtree of a model includes the model itself"""
+
+        ok_(self.hierarchy.is_in_subtree(Pen, Pen))
+        ok_(self.hierarchy.is_in_subtree(FountainPen, Pen))
+        ok_(self.hierarchy.is_in_subtree(FountainPen, WritingImplement))
+        assert_false(self.hierarchy.is_in_subtree(Pencil, Pen))
+        assert_false(self.hierarchy.is_in_subtree(Pen, FountainPen))
+
+    def test_parent_link_lookups(self):
+        eq_(self.hierarchy.get_parent_link_lookups(WritingImplement), ())
+        eq_(self.hierarchy.get_parent_link_lookups(Pen), ('pen',))
+        eq_(
+            self.hierarchy.get_parent_link_lookups(FountainPen),
+            ('pen', 'fountainpen'),
+            )
+
+    def test_invalidation(self):
+        """The hierarchies are rebuilt when a specialized model is prepared"""
+
+        specialized_model_prepared.send(sender=Pen)
+
+        hierarchy = get_hierarchy(WritingImplement)
+        ok_(hierarchy is not self.hierarchy)
+        eq_(hierarchy.get_depth(FountainPen), 2)
+
+
+class TestProxySpecialization(object):
+    """Tests for the hierarchies with proxy specializations"""
+
+    def setup(self):
+        self.hierarchy = get_hierarchy(Vegetable)
+
+    def test_position(self):
+        eq_(self.hierarchy.get_ancestors(BakingPotato), (Potato, Vegetable))
+        eq_(self.hierarchy.get_children(Potato), (BakingPotato, NewPotato))
+        ok_(BakingPotato in self.hierarchy.leaves)
+
+    def test_parent_link_lookups(self):
+        """Proxy specializations are reached as their parent"""
+
+        eq_(self.hierarchy.get_parent_link_lookups(BakingPotato), ('potato',))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+# Copyright (c) 2011-2016, 2degrees Limited <2degrees-floss@googlegroups.com>.
+# All Rights Reserved.
+#
+# This file is part of djeneralize <https://github.com/2degrees/djeneralize>,
+# which is subject to the provisions of the BSD at
+# <http://dev.2degreesnetwork.com/p/2degrees-license.html>. A copy of the
+# license should accompany this distribution. THIS SOFTWARE IS PROVIDED "AS IS"
+# AND ANY AND ALL EXPRESS OR IMPLIED WARRANTIES ARE DISCLAIMED, INCLUDING, BUT
+# NOT LIMITED TO, THE IMPLIED WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST
+# INFRINGEMENT, AND FITNESS FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Tests for the assertions about the specialization queries"""
+
+from fixture.django_testcase import FixtureTestCase
+from nose.tools import assert_raises
+from nose.tools import eq_
+from nose.tools import ok_
+
+from djeneralize.testing import assert_max_specialization_queries
+from tests.fixtures import BananaData
+from tests.fixtures import EcoProducerData
+from tests.fixtures import PenData
+from tests.fixtures import ShopData
+from tests.fixtures import StandardProducerData
+from tests.test_djeneralize.producers.models import EcoProducer
+from tests.test_djeneralize.producers.models import FruitProducer
+from tests.test_djeneralize.producers.models import Shop
+from tests.test_djeneralize.producers.models import StandardProducer
+from tests.test_djeneralize.writing.models import WritingImplement
+
+
+class TestAssertMaxSpecializationQueries(FixtureTestCase):
+
+    datasets = [
+        EcoProducerData, StandardProducerData, BananaData, PenData, ShopData,
+        ]
+
+    def test_within_limits(self):
+        """Nothing is raised if the queries are within the limits"""
+
+        with assert_max_specialization_queries(
+            FruitProducer, max_queries=3, max_queries_per_specialization=1,
+            ) as collector:
+            list(FruitProducer.specializations.all())
+
+        eq_(collector.get_stats().query_count, 3)
+
+    def test_max_queries(self):
+        """
+        The queries of each specialized foreign key are counted, including the
+        query of the general model instance.
+
+        """
+
+        with assert_raises(AssertionError) as context_manager:
+            with assert_max_specialization_queries(
+                FruitProducer, max_queries=1,
+                ):
+                for shop in Shop.objects.all():
+                    shop.producer
+
+        message = str(context_manager.exception)
+        ok_(
+            message.startswith(
+                "4 queries were made to load FruitProducer instances, "
+                "expected at most 1"
+                )
+            )
+        ok_('Other queries of FruitProducer: 2 queries' in message)
+        ok_(
+            '%s (get): 1 queries, 1 rows' % EcoProducer.model_specialization
+            in message
+            )
+        ok_(
+            '%s (get): 1 queries, 1 rows' % StandardProducer.model_specialization
+            in message
+            )
+
+    def test_max_queries_per_specialization(self):
+        """The queries are limited for each specialization"""
+
+        shops = list(Shop.objects.all())
+
+        with assert_raises(AssertionError) as context_manager:
+            with assert_max_specialization_queries(
+                FruitProducer, max_queries_per_specialization=1,
+                ):
+                for producer in FruitProducer.objects.all():
+                    producer.get_as_specialization()
+                shops[0].producer
+
+        eq_(
+            str(context_manager.exception).splitlines()[0],
+            "2 queries were made for the specialization %s, expected at "
+            "most 1" % shops[0].producer.specialization_type,
+            )
+
+    def test_select_specialized(self):
+        """Selecting the specialized objects avoids the N+1 queries"""
+
+        with assert_max_specialization_queries(
+            FruitProducer, max_queries_per_specialization=1,
+            ):
+            for shop in Shop.objects.select_specialized('producer'):
+                shop.producer
+
+    def test_general_model_queries(self):
+        """The N+1 queries of the general model instances are caught"""
+
+        with assert_raises(AssertionError) as context_manager:
+            with assert_max_specialization_queries(
+                WritingImplement, max_queries=1,
+                ):
+                for producer in FruitProducer.specializations.all():
+                    producer.pen
+
+        eq_(
+            str(context_manager.exception).splitlines()[0],
+            "2 queries were made to load WritingImplement instances, expected "
+            "at most 1",
+            )
+
+        with assert_max_specialization_queries(
+            WritingImplement, max_queries=0,
+            ):
+            for producer in FruitProducer.specializations.select_related('pen'):
+                producer.pen
+
+    def test_other_hierarchies(self):
+        """The queries in other hierarchies aren't counted"""
+
+        with assert_max_specialization_queries(FruitProducer, max_queries=0):
+            list(WritingImplement.specializations.all())
+
+    def test_exception_in_block(self):
+        """The exceptions raised in the block are propagated"""
+
+        with assert_raises(ZeroDivisionError):
+            with assert_max_specialization_queries(
+                FruitProducer, max_queries=0,
+                ):
+                1 / 0